@@ -0,0 +1,347 @@
+"""
+Reproducible benchmarks of the spatial indexes.
+
+Every operation is timed with time.perf_counter_ns after a number of warmup runs. Builds are timed once per repeat,
+inserts, deletes and queries are timed one operation at a time, so the reported percentiles describe single operations,
+and the batch operation is timed one whole batch of --batch-size rectangles (10k by default) at a time.
+The data sets and query workloads are generated from a fixed seed, so two runs of the same version measure the same work.
+Results are written as JSON lines (or CSV), one record per structure, operation, distribution and size, together with
+the environment they were measured in, so results of different versions can be compared automatically.
+
+Usage, from the repository root:
+    python -m src.benchmark --sizes 1000 10000 100000 --output results.jsonl
+    python -m src.benchmark --compare --format csv
+"""
+from __future__ import annotations
+from typing import Callable
+from abc import ABC, abstractmethod
+import argparse
+import csv
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from .kdtree.kdtree import KDTree
+from .kdtree.array_kdtree import ArrayKDTree
+from .kdtree.kdforest import KDForest
+from .kdtree.util.geometry import Point as KDPoint
+from .quadtree.quadtree import Quadtree
+from .quadtree.linear_quadtree import LinearQuadtree
+from .quadtree.util.Geometry import Area, Point as QuadPoint
+
+# Coordinates of the generated points lie in [-EXTENT, EXTENT]^2, the same range as in data/compare.csv
+EXTENT = 1000.0
+DISTRIBUTIONS = ("uniform", "gaussian", "clustered")
+OPERATIONS = ("build", "insert", "delete", "range", "count", "knn", "batch")
+# Number of rectangles in one timed call of the batch operation
+BATCH_SIZE = 10000
+# Fraction of the side of the data extent covered by one side of a generated query rectangle
+QUERY_SIDE = 0.05
+PERCENTILES = (50, 90, 99)
+# Structures made of Python objects are skipped above this size unless --object-limit is raised
+OBJECT_LIMIT = 1000000
+
+# The scenarios of data/compare.csv: (set name, number of points, distribution, query areas)
+COMPARE_AREAS = [((0, 0), (10, 10)), ((-100, -100), (400, 800)), ((-500, -500), (500, 500)),
+                 ((-1000, -1000), (-700, 1000)), ((-1000, -1000), (1000, 1000))]
+COMPARE_SCENARIOS = [("Zestaw A", 100, "uniform"), ("Zestaw B", 2000, "uniform"), ("Zestaw C", 2000, "clustered"),
+                     ("Zestaw D", 10000, "uniform"), ("Zestaw E", 10000, "clustered")]
+
+def generate_points(distribution: str, size: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Generates an (size, 2) array of points of the given distribution
+    """
+    if distribution == "uniform":
+        points = rng.uniform(-EXTENT, EXTENT, (size, 2))
+    elif distribution == "gaussian":
+        points = rng.normal(0, EXTENT / 4, (size, 2))
+    elif distribution == "clustered":
+        centers = rng.uniform(-0.8 * EXTENT, 0.8 * EXTENT, (16, 2))
+        points = centers[rng.integers(0, len(centers), size)] + rng.normal(0, EXTENT / 100, (size, 2))
+    else:
+        raise ValueError(f"Unknown distribution {distribution}")
+    return np.clip(points, -EXTENT, EXTENT)
+
+def generate_rectangles(count: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Generates (count, 2, 2) query rectangles of a fixed size at uniformly random positions
+    """
+    side = 2 * EXTENT * QUERY_SIDE
+    lows = rng.uniform(-EXTENT, EXTENT - side, (count, 2))
+    return np.stack([lows, lows + side], axis=1)
+
+
+class Structure(ABC):
+    """
+    Uniform interface the benchmarks drive the indexes through. Every structure builds itself from an array of points,
+    the other operations are named in operations and implemented as methods of the same name taking plain coordinate tuples:
+    insert(point), delete(point), range(low, high), count(low, high) and knn(point, k), except for batch(rectangles),
+    which answers a whole (q, 2, 2) array of rectangles with one call of the batched range query
+    """
+    name = ""
+    operations = OPERATIONS
+    python_objects = True
+
+    @abstractmethod
+    def build(self, points: np.ndarray) -> None:
+        pass
+
+class KDTreeStructure(Structure):
+    name = "KDTree"
+
+    def build(self, points):
+        self.tree = KDTree()
+        self.tree.build_tree([KDPoint(x, y) for x, y in points.tolist()], method="select")
+
+    def insert(self, point):
+        self.tree.insert_point(KDPoint(*point))
+
+    def delete(self, point):
+        self.tree.delete_point(KDPoint(*point))
+
+    def range(self, low, high):
+        self.tree.get_points_in_rectangle(KDPoint(*low), KDPoint(*high))
+
+    def count(self, low, high):
+        self.tree.count_in_rectangle(KDPoint(*low), KDPoint(*high))
+
+    def knn(self, point, k):
+        self.tree.nearest(KDPoint(*point), k)
+
+    def batch(self, rectangles):
+        self.tree.get_points_in_rectangles(rectangles, return_ids=True)
+
+class ArrayKDTreeStructure(Structure):
+    name = "ArrayKDTree"
+    operations = ("build", "range", "count", "knn", "batch")
+    python_objects = False
+
+    def build(self, points):
+        self.tree = ArrayKDTree()
+        self.tree.build_tree(points)
+
+    def range(self, low, high):
+        self.tree.get_points_in_rectangle(low, high)
+
+    def count(self, low, high):
+        self.tree.count_in_rectangle(low, high)
+
+    def knn(self, point, k):
+        self.tree.nearest(point, k)
+
+    def batch(self, rectangles):
+        self.tree.get_points_in_rectangles(rectangles, return_ids=True)
+
+class KDForestStructure(ArrayKDTreeStructure):
+    name = "KDForest"
+    operations = ("build", "insert", "range", "count", "knn")
+
+    def build(self, points):
+        self.tree = KDForest()
+        self.tree.build_tree(points)
+
+    def insert(self, point):
+        self.tree.insert_point(point)
+
+class QuadtreeStructure(Structure):
+    name = "Quadtree"
+    max_cardinality = 16
+
+    def build(self, points):
+        self.tree = Quadtree.from_array(points, max_cardinality=self.max_cardinality)
+
+    def insert(self, point):
+        self.tree.insert([QuadPoint(*point)])
+
+    def delete(self, point):
+        self.tree.remove(QuadPoint(*point))
+
+    def range(self, low, high):
+        self.tree.find_points_in_area(Area.from_bounds(*low, *high))
+
+    def count(self, low, high):
+        self.tree.count_in_rectangle(Area.from_bounds(*low, *high))
+
+    def knn(self, point, k):
+        self.tree.nearest(QuadPoint(*point), k)
+
+    def batch(self, rectangles):
+        self.tree.find_points_in_areas([Area.from_bounds(*low, *high) for low, high in rectangles.tolist()])
+
+class LinearQuadtreeStructure(Structure):
+    name = "LinearQuadtree"
+    operations = ("build", "range")
+    python_objects = False
+
+    def build(self, points):
+        self.tree = LinearQuadtree.from_array(points)
+
+    def range(self, low, high):
+        self.tree.find_indices_in_area(Area.from_bounds(*low, *high))
+
+STRUCTURES = {structure.name: structure for structure in
+              (KDTreeStructure, ArrayKDTreeStructure, KDForestStructure, QuadtreeStructure, LinearQuadtreeStructure)}
+
+
+def time_calls(call: Callable, arguments: list, warmup: int) -> list[int]:
+    """
+    Times every call of the function on the given arguments separately, after calling it on the first warmup arguments untimed
+    Returns:
+    Durations of the timed calls in nanoseconds
+    """
+    for argument in arguments[:warmup]:
+        call(*argument)
+    durations = []
+    for argument in arguments[warmup:]:
+        start = time.perf_counter_ns()
+        call(*argument)
+        durations.append(time.perf_counter_ns() - start)
+    return durations
+
+def summarize(samples: list[int]) -> dict:
+    """
+    Reduces the samples to the statistics that are reported
+    """
+    array = np.array(samples, dtype=np.float64)
+    summary = {"samples": len(samples), "min_ns": int(array.min()), "mean_ns": float(array.mean()), "max_ns": int(array.max())}
+    for percentile, value in zip(PERCENTILES, np.percentile(array, PERCENTILES)):
+        summary[f"p{percentile}_ns"] = float(value)
+    return summary
+
+def run_operation(structure_type: type, operation: str, points: np.ndarray, repeats: int, warmup: int, queries: int,
+                  k: int, rng: np.random.Generator, batch_size: int=BATCH_SIZE) -> list[int]:
+    """
+    Measures one operation of one structure on the given points
+    Returns:
+    Durations of single builds, or of single inserts, deletes and queries, or of whole batches of batch_size rectangles, in nanoseconds
+    """
+    structure = structure_type()
+    if operation == "build":
+        return time_calls(structure.build, [(points,)] * (warmup + repeats), warmup)
+    samples = []
+    for _ in range(repeats):
+        # Every repeat works on a fresh tree, building it is not timed
+        structure.build(points)
+        if operation == "insert":
+            arguments = [(point,) for point in generate_points("uniform", warmup + queries, rng).tolist()]
+            samples.extend(time_calls(structure.insert, arguments, warmup))
+        elif operation == "delete":
+            chosen = rng.choice(len(points), min(len(points), warmup + queries), replace=False)
+            samples.extend(time_calls(structure.delete, [(point,) for point in points[chosen].tolist()], warmup))
+        elif operation in ("range", "count"):
+            rectangles = generate_rectangles(warmup + queries, rng).tolist()
+            samples.extend(time_calls(getattr(structure, operation), rectangles, warmup))
+        elif operation == "knn":
+            arguments = [(point, k) for point in generate_points("uniform", warmup + queries, rng).tolist()]
+            samples.extend(time_calls(structure.knn, arguments, warmup))
+        elif operation == "batch":
+            # The warmup batches also prepare the flattened arrays the batched queries of KDTree and Quadtree run on
+            samples.extend(time_calls(structure.batch, [(generate_rectangles(batch_size, rng),)] * (warmup + 1), warmup))
+    return samples
+
+def environment() -> dict:
+    """
+    Describes the interpreter, the libraries, the machine and the version of the code the benchmarks ran on
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "numpy": np.__version__,
+            "machine": platform.machine(), "processor": platform.processor(), "system": platform.system()}
+
+def run_suite(structures: list[str], operations: list[str], distributions: list[str], sizes: list[int], repeats: int,
+              warmup: int, queries: int, k: int, seed: int, object_limit: int, batch_size: int=BATCH_SIZE):
+    """
+    Runs every combination of the given structures, operations, distributions and sizes
+    Returns:
+    Iterator over the result records
+    """
+    for distribution in distributions:
+        for size in sizes:
+            points = generate_points(distribution, size, np.random.default_rng([seed, size]))
+            for name in structures:
+                structure_type = STRUCTURES[name]
+                if structure_type.python_objects and size > object_limit:
+                    print(f"Skipping {name} with {size} points, raise --object-limit to run it", file=sys.stderr)
+                    continue
+                for operation in operations:
+                    if operation not in structure_type.operations:
+                        continue
+                    # The workload of every measurement depends only on the seed and its own parameters
+                    rng = np.random.default_rng([seed, size, OPERATIONS.index(operation)])
+                    samples = run_operation(structure_type, operation, points, repeats, warmup, queries, k, rng, batch_size)
+                    yield {"benchmark": "suite", "structure": name, "operation": operation, "distribution": distribution,
+                           "size": size, **summarize(samples)}
+
+def run_compare(repeats: int, warmup: int, seed: int):
+    """
+    Reruns the range queries of data/compare.csv on regenerated sets of the same sizes
+    Returns:
+    Iterator over the result records
+    """
+    for scenario, size, distribution in COMPARE_SCENARIOS:
+        points = generate_points(distribution, size, np.random.default_rng([seed, size]))
+        for name in ("KDTree", "ArrayKDTree", "Quadtree", "LinearQuadtree"):
+            structure = STRUCTURES[name]()
+            structure.build(points)
+            for low, high in COMPARE_AREAS:
+                samples = time_calls(structure.range, [(low, high)] * (warmup + repeats), warmup)
+                inside = int(np.all((points >= low) & (points <= high), axis=1).sum())
+                yield {"benchmark": "compare", "structure": name, "operation": "range", "distribution": distribution,
+                       "size": size, "scenario": scenario, "area": f"{low}x{high}", "points_in_area": inside,
+                       **summarize(samples)}
+
+def write_results(records, output, fmt: str) -> None:
+    """
+    Writes the records as JSON lines or as CSV with a header, every record is extended by the environment
+    """
+    context = environment()
+    writer = None
+    for record in records:
+        record = {**record, **context}
+        if fmt == "jsonl":
+            output.write(json.dumps(record) + "\n")
+        else:
+            if writer is None:
+                writer = csv.DictWriter(output, fieldnames=list(record), extrasaction="ignore")
+                writer.writeheader()
+            writer.writerow(record)
+        output.flush()
+
+def main(argv: list[str]=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks of the spatial indexes")
+    parser.add_argument("--structures", nargs="+", default=list(STRUCTURES), choices=list(STRUCTURES))
+    parser.add_argument("--operations", nargs="+", default=list(OPERATIONS), choices=OPERATIONS)
+    parser.add_argument("--distributions", nargs="+", default=list(DISTRIBUTIONS), choices=DISTRIBUTIONS)
+    parser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000],
+                        help="numbers of points, up to 10000000")
+    parser.add_argument("--repeats", type=int, default=5, help="timed builds, or trees the operations are timed on")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed runs before every measurement")
+    parser.add_argument("--queries", type=int, default=200, help="timed operations per repeat")
+    parser.add_argument("--k", type=int, default=10, help="number of neighbours of the knn queries")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="rectangles per timed call of the batch operation")
+    parser.add_argument("--seed", type=int, default=2024)
+    parser.add_argument("--object-limit", type=int, default=OBJECT_LIMIT,
+                        help="largest size structures made of Python objects are run on")
+    parser.add_argument("--compare", action="store_true", help="run the scenarios of data/compare.csv instead of the suite")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default="jsonl")
+    parser.add_argument("--output", help="file the results are written to, standard output by default")
+    args = parser.parse_args(argv)
+    if args.compare:
+        records = run_compare(args.repeats, args.warmup, args.seed)
+    else:
+        records = run_suite(args.structures, args.operations, args.distributions, args.sizes, args.repeats, args.warmup,
+                            args.queries, args.k, args.seed, args.object_limit, args.batch_size)
+    if args.output:
+        with open(args.output, "w", newline="") as output:
+            write_results(records, output, args.format)
+    else:
+        write_results(records, sys.stdout, args.format)
+
+if __name__ == "__main__":
+    main()
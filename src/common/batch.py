@@ -0,0 +1,17 @@
+import numpy as np
+
+def group_by_query(query_ids: np.ndarray, values: np.ndarray, query_count: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Groups (query, value) pairs produced by a batched traversal into the offset/index form
+    Parameters:
+    query_ids - the query every value belongs to
+    values - integer values (point indices) found for the queries
+    query_count - number of queries in the batch
+    Returns:
+    offsets - array of length query_count + 1, the results of query i are values[offsets[i]:offsets[i+1]]
+    values - the values ordered by query and then by value
+    """
+    order = np.lexsort((values, query_ids))
+    offsets = np.zeros(query_count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(query_ids, minlength=query_count), out=offsets[1:])
+    return offsets, values[order]
@@ -0,0 +1,88 @@
+from typing import Iterator
+from itertools import islice
+import os
+import numpy as np
+
+# Number of points parsed at once, a chunk of 2-D points takes 1 MiB
+CHUNK_SIZE = 65536
+# File extensions of headerless little-endian float64 files
+RAW_EXTENSIONS = (".bin", ".raw", ".f64")
+
+def file_format(path: str) -> str:
+    """
+    Guesses the format of a point file from its extension
+    Returns:
+    "npy" for NumPy files, "raw" for headerless float64 files and "csv" for everything else
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npy":
+        return "npy"
+    if extension in RAW_EXTENSIONS:
+        return "raw"
+    return "csv"
+
+def _mapped_points(path: str, k: int, fmt: str) -> np.ndarray:
+    """
+    Maps a binary point file read-only, nothing is read before a slice of the result is accessed
+    """
+    if fmt == "npy":
+        array = np.load(path, mmap_mode="r")
+        if array.ndim != 2 or array.shape[1] != k:
+            raise ValueError(f"Expected an (n, {k}) array in {path}, got shape {array.shape}")
+        return array
+    size = os.path.getsize(path)
+    if size % (8 * k) != 0:
+        raise ValueError(f"The size of {path} is not a multiple of {k} float64 values")
+    if size == 0:
+        return np.empty((0, k), dtype=np.float64)
+    return np.memmap(path, dtype="<f8", mode="r").reshape(-1, k)
+
+def iter_point_chunks(path: str, k: int=2, chunk_size: int=CHUNK_SIZE, fmt: str=None, delimiter: str=",",
+                      skip_rows: int=0) -> Iterator[np.ndarray]:
+    """
+    Reads a point file in chunks of at most chunk_size points, so only one chunk is held in memory at a time.
+    Binary files are memory-mapped and sliced, text files are read chunk_size lines at a time and every chunk is parsed
+    at once by np.loadtxt, without creating a Python object per value.
+    Parameters:
+    path - path of the file
+    k - number of coordinates of a point
+    chunk_size - the maximal number of points in a chunk
+    fmt - "csv", "npy" or "raw" (headerless little-endian float64 values), guessed from the extension by default
+    delimiter - separator of the values in a text file
+    skip_rows - number of header lines of a text file
+    Returns:
+    Iterator over (m, k) float64 arrays
+    """
+    fmt = fmt or file_format(path)
+    if fmt in ("npy", "raw"):
+        array = _mapped_points(path, k, fmt)
+        for start in range(0, len(array), chunk_size):
+            yield np.array(array[start:start + chunk_size], dtype=np.float64)
+        return
+    if fmt != "csv":
+        raise ValueError(f"Unknown point file format {fmt}")
+    with open(path, "r") as f:
+        for _ in islice(f, skip_rows):
+            pass
+        while True:
+            lines = list(islice(f, chunk_size))
+            if not lines:
+                return
+            chunk = np.loadtxt(lines, delimiter=delimiter, dtype=np.float64, ndmin=2)
+            if chunk.size == 0:
+                continue
+            if chunk.shape[1] != k:
+                raise ValueError(f"Expected {k} values per line in {path}, got {chunk.shape[1]}")
+            yield chunk
+
+def read_points(path: str, k: int=2, chunk_size: int=CHUNK_SIZE, fmt: str=None, delimiter: str=",", skip_rows: int=0) -> np.ndarray:
+    """
+    Reads a whole point file into one (n, k) float64 array, ready for a bulk build.
+    Binary files are copied straight from their mapping, text files are parsed chunk by chunk.
+    Parameters: the same as for iter_point_chunks
+    """
+    fmt = fmt or file_format(path)
+    if fmt in ("npy", "raw"):
+        return np.array(_mapped_points(path, k, fmt), dtype=np.float64)
+    chunks = list(iter_point_chunks(path, k, chunk_size, fmt, delimiter, skip_rows))
+    return np.concatenate(chunks) if chunks else np.empty((0, k), dtype=np.float64)
@@ -0,0 +1,64 @@
+from typing import Self, Hashable, Any
+from collections import OrderedDict
+
+class QueryCache:
+    """
+    Bounded least-recently-used cache of query results, tagged with the mutation generation of the tree they were computed on.
+    Every mutation of a tree increases its generation, so a cached result is returned only while the tree has not changed since it was stored,
+    stale entries are dropped when they are looked up or evicted.
+    Attributes:
+        max_size - the largest number of stored results
+        hits - number of lookups answered from the cache
+        misses - number of lookups that had to be computed
+        evictions - number of results dropped to make room for new ones
+    """
+    def __init__(self: Self, max_size: int=256):
+        if max_size < 1:
+            raise ValueError("max_size has to be positive")
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[Hashable, tuple[int, Any]] = OrderedDict()
+
+    def __len__(self: Self) -> int:
+        return len(self._entries)
+
+    def get(self: Self, key: Hashable, generation: int) -> Any:
+        """
+        Looks up a result
+        Parameters:
+        key - the query, e.g. the corners of a rectangle
+        generation - the current mutation generation of the tree
+        Returns:
+        The stored result, or None when it is missing or was computed on an older generation
+        """
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != generation:
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self: Self, key: Hashable, generation: int, result: Any) -> None:
+        """
+        Stores a result, evicting the least recently used ones when the cache is full
+        Parameters:
+        key - the query
+        generation - the mutation generation of the tree the result was computed on
+        result - the result of the query
+        """
+        self._entries[key] = (generation, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self: Self) -> None:
+        """
+        Drops all stored results, the counters are kept
+        """
+        self._entries.clear()
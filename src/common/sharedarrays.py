@@ -0,0 +1,144 @@
+from multiprocessing import Pool, shared_memory
+from typing import Callable, Self
+import os
+import numpy as np
+
+# Description of a shared array that can be sent to another process: (block name, shape, dtype string)
+ArraySpec = tuple[str, tuple[int, ...], str]
+
+# Snapshot built by a worker process of a SnapshotPool from the shared arrays, kept for the lifetime of the worker
+_worker_snapshot = None
+_worker_blocks = []
+
+class SharedArrays:
+    """
+    Owns a group of NumPy arrays allocated in multiprocessing.shared_memory blocks.
+    Worker processes attach to the arrays by their specs, so the data is never pickled.
+    Use it as a context manager, the blocks are released when it exits.
+    """
+    def __init__(self: Self):
+        self.blocks: list[shared_memory.SharedMemory] = []
+
+    def create(self: Self, shape: tuple[int, ...], dtype) -> tuple[ArraySpec, np.ndarray]:
+        """
+        Allocates a new shared array
+        Parameters:
+        shape - shape of the array
+        dtype - NumPy dtype of the array
+        Returns:
+        spec - description of the array to be passed to attach
+        array - the array backed by the shared block
+        """
+        dtype = np.dtype(dtype)
+        size = int(np.prod(shape)) * dtype.itemsize
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.blocks.append(block)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        return (block.name, tuple(shape), dtype.str), array
+
+    def copy(self: Self, array: np.ndarray) -> tuple[ArraySpec, np.ndarray]:
+        """
+        Allocates a shared array holding a copy of the given array
+        """
+        spec, shared = self.create(array.shape, array.dtype)
+        shared[...] = array
+        return spec, shared
+
+    def close(self: Self) -> None:
+        """
+        Releases all blocks, arrays returned by create must not be used afterwards
+        """
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(self: Self, *exception) -> None:
+        self.close()
+
+def attach(spec: ArraySpec) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    """
+    Attaches to a shared array created in another process
+    Parameters:
+    spec - description returned by SharedArrays.create
+    Returns:
+    block - the shared memory block, it has to be closed when the array is no longer used
+    array - the array backed by the block
+    """
+    name, shape, dtype = spec
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+
+def _attach_snapshot(specs: dict[str, ArraySpec], factory: Callable) -> None:
+    """
+    Pool initializer, attaches the worker to the shared arrays without copying them and builds its snapshot
+    """
+    global _worker_snapshot
+    arrays = {}
+    for name, spec in specs.items():
+        block, arrays[name] = attach(spec)
+        _worker_blocks.append(block)
+    _worker_snapshot = factory(arrays)
+
+def worker_snapshot():
+    """
+    Returns the snapshot of the current worker process of a SnapshotPool, for the functions the pool runs
+    """
+    return _worker_snapshot
+
+class SnapshotPool:
+    """
+    A pool of worker processes sharing one read-only snapshot.
+    The arrays of the snapshot are published in shared memory blocks once, every worker attaches to them and
+    rebuilds the snapshot with factory, which worker_snapshot then returns, so only the tasks and their results
+    cross process boundaries. Use it as a context manager, or call close, to stop the workers and release the memory.
+    Attributes:
+        processes - number of worker processes
+    """
+    def __init__(self: Self, arrays: dict[str, np.ndarray], factory: Callable, processes: int=None):
+        """
+        Parameters:
+        arrays - the named arrays encoding the snapshot
+        factory - picklable callable building the snapshot from the dictionary of the attached arrays
+        processes - number of worker processes, os.cpu_count() by default
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self._shared = SharedArrays()
+        try:
+            specs = {name: self._shared.copy(array)[0] for name, array in arrays.items()}
+            self._pool = Pool(self.processes, initializer=_attach_snapshot, initargs=(specs, factory))
+        except BaseException:
+            self._pool = None
+            self._shared.close()
+            raise
+
+    def map(self: Self, function: Callable, tasks: list) -> list:
+        """
+        Runs a module-level function on every task in the workers, the results keep the order of the tasks
+        """
+        return self._pool.map(function, tasks)
+
+    def starmap(self: Self, function: Callable, tasks: list[tuple]) -> list:
+        """
+        Like map, but every task is a tuple of arguments
+        """
+        return self._pool.starmap(function, tasks)
+
+    def close(self: Self) -> None:
+        """
+        Stops the worker processes and releases the shared snapshot
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        self._shared.close()
+
+    def __enter__(self: Self) -> Self:
+        return self
+
+    def __exit__(self: Self, *exception) -> None:
+        self.close()
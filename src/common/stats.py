@@ -0,0 +1,47 @@
+from typing import Self
+from collections import Counter
+
+class TraversalStats:
+    """
+    Counters a tree fills during its operations while the collector is attached to it as tree.stats.
+    Trees check the attribute once per operation and skip all counting while it is None, so collection costs nothing when it is off.
+    Attributes:
+        builds - number of builds
+        inserts - number of inserted points
+        queries - number of queries
+        nodes_visited - nodes visited by queries and inserts, nodes created by builds
+        subtrees_accepted - subtrees reported or counted as a whole, because their region lies entirely inside the query region
+        points_tested - points compared with the query region one by one
+    """
+    __slots__ = ("builds", "inserts", "queries", "nodes_visited", "subtrees_accepted", "points_tested")
+
+    def __init__(self: Self):
+        self.reset()
+
+    def reset(self: Self) -> None:
+        """
+        Sets all counters to zero
+        """
+        self.builds = 0
+        self.inserts = 0
+        self.queries = 0
+        self.nodes_visited = 0
+        self.subtrees_accepted = 0
+        self.points_tested = 0
+
+    def as_dict(self: Self) -> dict[str, int]:
+        """
+        Returns the counters as a dictionary
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self: Self) -> str:
+        return f"TraversalStats({', '.join(f'{name}={value}' for name, value in self.as_dict().items())})"
+
+def histogram(values) -> dict[int, int]:
+    """
+    Counts the occurrences of every value
+    Returns:
+    Dictionary from value to the number of its occurrences, ordered by value
+    """
+    return dict(sorted(Counter(values).items()))
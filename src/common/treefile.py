@@ -0,0 +1,78 @@
+import json
+import struct
+import numpy as np
+
+# Layout of a tree file:
+#   MAGIC, then the format version and the length of the header as little-endian uint32,
+#   a UTF-8 JSON header with the kind of the tree, its metadata and the offset, shape and dtype of every array,
+#   then the raw little-endian C-ordered arrays, each starting at a multiple of ALIGNMENT bytes.
+# Every array can therefore be mapped straight from the file without parsing or copying it.
+MAGIC = b"GEOTREE\x00"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+_PREAMBLE = struct.Struct("<8sII")
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def write_tree_file(path: str, kind: str, arrays: dict[str, np.ndarray], meta: dict=None) -> None:
+    """
+    Writes the arrays of a tree into a versioned binary file
+    Parameters:
+    path - path of the file
+    kind - name of the tree class, checked when the file is read
+    arrays - the named arrays of the tree
+    meta - JSON-serialisable scalar attributes of the tree
+    """
+    arrays = {name: np.ascontiguousarray(array, dtype=np.asarray(array).dtype.newbyteorder("<")) for name, array in arrays.items()}
+    directory = {}
+    offset = 0
+    for name, array in arrays.items():
+        directory[name] = {"offset": offset, "shape": list(array.shape), "dtype": array.dtype.str}
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({"kind": kind, "meta": meta or {}, "arrays": directory}).encode("utf-8")
+    data_start = _aligned(_PREAMBLE.size + len(header))
+    with open(path, "wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        f.write(header)
+        for name, array in arrays.items():
+            f.seek(data_start + directory[name]["offset"])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+
+def read_tree_file(path: str, kind: str=None, mmap: bool=True) -> tuple[str, dict[str, np.ndarray], dict]:
+    """
+    Reads a file written by write_tree_file
+    Parameters:
+    path - path of the file
+    kind - when given, a ValueError is raised if the file holds a different kind of tree
+    mmap - map the arrays read-only from the file instead of reading them into memory,
+           opening is then independent of the file size and the pages are shared between processes
+    Returns:
+    kind - the kind of the stored tree
+    arrays - the named arrays of the tree
+    meta - the scalar attributes of the tree
+    """
+    with open(path, "rb") as f:
+        magic, version, header_size = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a tree file")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Unsupported tree file version {version}")
+        header = json.loads(f.read(header_size).decode("utf-8"))
+        if kind is not None and header["kind"] != kind:
+            raise ValueError(f"{path} holds a {header['kind']}, not a {kind}")
+        data_start = _aligned(_PREAMBLE.size + header_size)
+        arrays = {}
+        for name, entry in header["arrays"].items():
+            dtype = np.dtype(entry["dtype"])
+            shape = tuple(entry["shape"])
+            count = int(np.prod(shape))
+            if count == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            elif mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + entry["offset"], shape=shape)
+            else:
+                f.seek(data_start + entry["offset"])
+                arrays[name] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+    return header["kind"], arrays, header["meta"]
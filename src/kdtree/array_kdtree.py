@@ -0,0 +1,433 @@
+from typing import Self
+from multiprocessing import Pool
+import heapq
+import os
+import numpy as np
+from .util.geometry import Point
+from .util.kdtreeutil import points_to_array, point_to_array, select_median, rectangles_to_arrays
+from ..common.batch import group_by_query
+from ..common.sharedarrays import SharedArrays, ArraySpec, attach
+from ..common.treefile import write_tree_file, read_tree_file
+from ..common.ingest import read_points, CHUNK_SIZE
+
+# Subtrees with at most this many points are checked with a single vectorised mask instead of node by node
+LEAF_SIZE = 32
+# Below this many points a parallel build is not worth starting worker processes
+PARALLEL_MIN_SIZE = 100000
+# The parallel build hands every worker at least this many subtrees, so the work evens out when the process count is not a power of two
+RANGES_PER_PROCESS = 2
+
+def _build_ranges(data: np.ndarray, order: np.ndarray, split_dims: np.ndarray, stack: list[tuple[int, int, int]], k: int,
+                  limit: int=None) -> list[tuple[int, int, int]]:
+    """
+    Builds the subtrees over the ranges on the stack, writing the nodes of range [lo, hi) only into positions [lo, hi) of the arrays.
+    Ranges of at most LEAF_SIZE points are left unpartitioned, the queries test them as one block.
+    Parameters:
+    data - (n, k) array of coordinates
+    order - index array into data, it is partitioned in place
+    split_dims - the split dimensions being filled
+    stack - entries (lo, hi, depth) of the ranges still to be built
+    k - number of dimensions
+    limit - when given, the ranges are split level by level and the build stops at the first complete level with at least
+            this many ranges, which are returned
+    Returns:
+    The ranges that were not built
+    """
+    while stack:
+        # Breadth-first the pending ranges span at most two levels, equal first and last depths mean one complete level
+        if limit is not None and len(stack) >= limit and stack[0][2] == stack[-1][2]:
+            return stack
+        # Every entry is a range [lo, hi) of the order array, the median position of that range becomes the node
+        lo, hi, level = stack.pop(0) if limit is not None else stack.pop()
+        if hi - lo <= LEAF_SIZE:
+            continue
+        dimension = level % k
+        median = select_median(order, data, lo, hi, dimension)
+        split_dims[median] = dimension
+        if median > lo:
+            stack.append((lo, median, level + 1))
+        if hi > median + 1:
+            stack.append((median + 1, hi, level + 1))
+    return stack
+
+def _build_worker(specs: tuple[ArraySpec, ...], lo: int, hi: int, depth: int, k: int) -> None:
+    """
+    Builds one subtree in a worker process directly in the shared arrays of the parent
+    """
+    attached = [attach(spec) for spec in specs]
+    try:
+        _build_ranges(*(array for _, array in attached), [(lo, hi, depth)], k)
+    finally:
+        for block, _ in attached:
+            block.close()
+
+class ArrayKDTree:
+    """
+    KDTree variant that keeps the whole structure in flat NumPy arrays instead of Node and Point objects.
+    The points are stored in one contiguous (n, k) float64 array in the in-order layout of the tree, so the point of node i is points[i]
+    and every subtree occupies a contiguous slice of that array. The node of the slice [lo, hi) is (lo + hi) // 2 and its children
+    are the nodes of [lo, node) and [node + 1, hi), so only the split dimension of node i is kept in a small integer array.
+    Subtrees of at most LEAF_SIZE points are leaf buckets, their points are kept unordered in their slice and split_dims
+    carries no meaning there.
+    The splitting rule is the same as in KDTree - the median by the x-coordinate on the first level, then by y-coordinate and so on.
+    Attributes:
+        k - number of dimensions
+        root - index of the root node, -1 for an empty tree
+        points - (n, k) array of coordinates, row i is the point of node i
+        split_dims - dimension node i splits by
+        ids - row of the point of node i in the array the tree was built from, queries can return these instead of coordinates
+    """
+    def __init__(self: Self, K=2):
+        self.k = K
+        self.root = -1
+        self.points = np.empty((0, K), dtype=np.float64)
+        self.split_dims = np.empty(0, dtype=np.int8)
+        self.ids = np.empty(0, dtype=np.int64)
+
+    def __len__(self: Self) -> int:
+        return len(self.points)
+
+    def build_tree(self: Self, array, depth: int=0) -> None:
+        """
+        Build the tree from the given points.
+        Parameters:
+        array - (n, k) array of coordinates or a list of points
+        depth - the depth the root is placed on, it determines the first split dimension as dim = (depth % K)
+        """
+        data = points_to_array(array, self.k)
+        n = len(data)
+        order = np.arange(n, dtype=np.int64)
+        split_dims = np.zeros(n, dtype=np.int8)
+        _build_ranges(data, order, split_dims, [(0, n, depth)] if n else [], self.k)
+        self._set_arrays(data[order], split_dims, order)
+
+    def build_tree_parallel(self: Self, array, processes: int=None, depth: int=0) -> None:
+        """
+        Builds the same tree as build_tree using a pool of worker processes.
+        The parent process splits the top levels until there are RANGES_PER_PROCESS equal ranges for every worker, the workers
+        then take these disjoint ranges one at a time and build their subtrees directly in arrays placed in multiprocessing.shared_memory.
+        Thanks to the in-order layout the subtree of range [lo, hi) only writes positions [lo, hi) of the node arrays,
+        so no stitching or pickling of the results is needed.
+        Parameters:
+        array - (n, k) array of coordinates or a list of points
+        processes - number of worker processes, os.cpu_count() by default
+        depth - the depth the root is placed on
+        """
+        data = points_to_array(array, self.k)
+        n = len(data)
+        processes = processes or os.cpu_count() or 1
+        if processes <= 1 or n < PARALLEL_MIN_SIZE:
+            self.build_tree(data, depth)
+            return
+        with SharedArrays() as shared:
+            data_spec, _ = shared.copy(data)
+            order_spec, order = shared.copy(np.arange(n, dtype=np.int64))
+            split_spec, split_dims = shared.copy(np.zeros(n, dtype=np.int8))
+            # Splitting whole top levels gives ranges of equal size
+            ranges = _build_ranges(data, order, split_dims, [(0, n, depth)], self.k, limit=processes * RANGES_PER_PROCESS)
+            specs = (data_spec, order_spec, split_spec)
+            with Pool(processes) as pool:
+                pool.starmap(_build_worker, [(specs, lo, hi, level, self.k) for lo, hi, level in ranges], chunksize=1)
+            self._set_arrays(data[order], split_dims.copy(), order.copy())
+
+    def build_tree_from_file(self: Self, path: str, chunk_size: int=CHUNK_SIZE, fmt: str=None, delimiter: str=",",
+                             skip_rows: int=0, depth: int=0) -> None:
+        """
+        Builds the tree from a CSV, .npy or raw float64 point file. The file is parsed in chunks straight into one
+        coordinate array, so no Point objects are created, see common.ingest.read_points for the parameters
+        """
+        self.build_tree(read_points(path, self.k, chunk_size, fmt, delimiter, skip_rows), depth)
+
+    def to_arrays(self: Self) -> dict[str, np.ndarray]:
+        """
+        Returns the arrays the tree consists of, from_arrays restores the tree from them
+        """
+        return {"points": self.points, "split_dims": self.split_dims, "ids": self.ids}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> Self:
+        """
+        Creates a tree over existing node arrays without copying them, so they can live in shared or memory-mapped buffers
+        Parameters:
+        arrays - the arrays returned by to_arrays, without ids the rows are numbered in node order
+        """
+        tree = cls(K=arrays["points"].shape[1])
+        tree._set_arrays(arrays["points"], arrays["split_dims"], arrays.get("ids"))
+        return tree
+
+    def save(self: Self, path: str) -> None:
+        """
+        Writes the built tree into a binary tree file, see common.treefile for the layout
+        Parameters:
+        path - path of the file
+        """
+        write_tree_file(path, "ArrayKDTree", self.to_arrays(), {"k": self.k})
+
+    @classmethod
+    def load(cls, path: str, mmap: bool=True) -> Self:
+        """
+        Opens a tree written by save without rebuilding it
+        Parameters:
+        path - path of the file
+        mmap - map the node arrays read-only from the file, so opening takes constant time and the pages are shared
+               between all processes that open the same file, otherwise the arrays are read into memory
+        """
+        _, arrays, meta = read_tree_file(path, "ArrayKDTree", mmap)
+        tree = cls.from_arrays(arrays)
+        tree.k = meta["k"]
+        return tree
+
+    def _set_arrays(self: Self, points: np.ndarray, split_dims: np.ndarray, ids: np.ndarray=None) -> None:
+        """
+        Replaces the node arrays of the tree
+        """
+        self.points = np.ascontiguousarray(points)
+        self.split_dims = split_dims
+        self.ids = ids if ids is not None else np.arange(len(points), dtype=np.int64)
+        self.root = len(points) // 2 if len(points) else -1
+
+    def get_points_in_rectangle(self: Self, lowerLeftPoint: Point, upperRightPoint: Point, return_ids: bool=False) -> tuple[int, np.ndarray]:
+        """
+        Searches the given area and returns how many and what points are in the given region.
+        Small subtrees are tested with one vectorised mask over their contiguous slice of the points array.
+        Parameters:
+            lowerLeftPoint - the lower-left point of the rectangle, a Point or a sequence of coordinates
+            upperRightPoint - the upper-right point of the rectangle, a Point or a sequence of coordinates
+            return_ids - return the rows of the points in the array the tree was built from instead of their coordinates
+        Returns:
+            count - number of points in the rectangle
+            points - (count, k) array with their coordinates, or an int64 array with their rows
+        """
+        nodes = self._nodes_in_rectangle(point_to_array(lowerLeftPoint, self.k), point_to_array(upperRightPoint, self.k))
+        return len(nodes), self.ids[nodes] if return_ids else self.points[nodes]
+
+    def _nodes_in_rectangle(self: Self, low: np.ndarray, high: np.ndarray) -> np.ndarray:
+        """
+        Finds the indices of the nodes whose points lie in the rectangle [low, high]
+        """
+        found = []
+        points = self.points
+        # Stack entries are the ranges [lo, hi) of the subtrees still to be checked
+        stack = [(0, len(points))] if self.root >= 0 else []
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                block = points[lo:hi]
+                mask = np.all((block >= low) & (block <= high), axis=1)
+                if mask.any():
+                    found.append(np.flatnonzero(mask) + lo)
+                continue
+            node = (lo + hi) // 2
+            dimension = self.split_dims[node]
+            value = points[node, dimension]
+            left_side = value >= low[dimension]
+            right_side = value <= high[dimension]
+            if left_side and right_side and np.all((points[node] >= low) & (points[node] <= high)):
+                found.append(np.array([node]))
+            if left_side:
+                stack.append((lo, node))
+            if right_side:
+                stack.append((node + 1, hi))
+        return np.concatenate(found).astype(np.int64, copy=False) if found else np.empty(0, dtype=np.int64)
+
+    def count_in_rectangle(self: Self, lowerLeftPoint: Point, upperRightPoint: Point) -> int:
+        """
+        Counts the points in the given area without collecting them.
+        The region of every subtree is tracked during the descent, when it lies entirely inside the rectangle the size of its slice is added at once.
+        Parameters:
+            lowerLeftPoint - the lower-left point of the rectangle, a Point or a sequence of coordinates
+            upperRightPoint - the upper-right point of the rectangle, a Point or a sequence of coordinates
+        """
+        low = point_to_array(lowerLeftPoint, self.k)
+        high = point_to_array(upperRightPoint, self.k)
+        points = self.points
+        count = 0
+        # Stack entries hold a subtree range [lo, hi) with the lower and upper bounds of its region
+        stack = [(0, len(points), np.full(self.k, -np.inf), np.full(self.k, np.inf))] if self.root >= 0 else []
+        while stack:
+            lo, hi, region_low, region_high = stack.pop()
+            if np.all(low <= region_low) and np.all(region_high <= high):
+                count += hi - lo
+                continue
+            if hi - lo <= LEAF_SIZE:
+                block = points[lo:hi]
+                count += int(np.count_nonzero(np.all((block >= low) & (block <= high), axis=1)))
+                continue
+            node = (lo + hi) // 2
+            dimension = self.split_dims[node]
+            value = points[node, dimension]
+            left_side = value >= low[dimension]
+            right_side = value <= high[dimension]
+            if left_side and right_side and np.all((points[node] >= low) & (points[node] <= high)):
+                count += 1
+            if left_side:
+                left_high = region_high.copy()
+                left_high[dimension] = value
+                stack.append((lo, node, region_low, left_high))
+            if right_side:
+                right_low = region_low.copy()
+                right_low[dimension] = value
+                stack.append((node + 1, hi, right_low, region_high))
+        return count
+
+    def get_points_in_radius(self: Self, center: Point, radius: float, return_ids: bool=False) -> tuple[int, np.ndarray]:
+        """
+        Searches the points whose Euclidean distance from the center is at most radius.
+        Subtrees whose region does not reach the circle are pruned, subtrees whose region lies entirely inside it are reported as whole slices.
+        Parameters:
+            center - the center of the circle, a Point or a sequence of coordinates
+            radius - the radius of the circle
+            return_ids - return the rows of the points in the array the tree was built from instead of their coordinates
+        Returns:
+            count - number of points in the circle
+            points - (count, k) array with their coordinates, or an int64 array with their rows
+        """
+        query = point_to_array(center, self.k)
+        squared_radius = radius * radius
+        points = self.points
+        found = []
+        stack = [(0, len(points), np.full(self.k, -np.inf), np.full(self.k, np.inf))] if self.root >= 0 else []
+        while stack:
+            lo, hi, region_low, region_high = stack.pop()
+            if np.sum(np.maximum(np.maximum(region_low - query, query - region_high), 0) ** 2) > squared_radius:
+                continue
+            if np.sum(np.maximum(query - region_low, region_high - query) ** 2) <= squared_radius:
+                found.append(np.arange(lo, hi))
+                continue
+            if hi - lo <= LEAF_SIZE:
+                block = points[lo:hi]
+                found.append(np.flatnonzero(np.sum((block - query) ** 2, axis=1) <= squared_radius) + lo)
+                continue
+            node = (lo + hi) // 2
+            if np.sum((points[node] - query) ** 2) <= squared_radius:
+                found.append(np.array([node]))
+            dimension = self.split_dims[node]
+            value = points[node, dimension]
+            left_high = region_high.copy()
+            left_high[dimension] = value
+            stack.append((lo, node, region_low, left_high))
+            right_low = region_low.copy()
+            right_low[dimension] = value
+            stack.append((node + 1, hi, right_low, region_high))
+        nodes = np.concatenate(found).astype(np.int64, copy=False) if found else np.empty(0, dtype=np.int64)
+        return len(nodes), self.ids[nodes] if return_ids else points[nodes]
+
+    def get_points_in_rectangles(self: Self, rectangles, return_ids: bool=False) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Answers a whole batch of rectangle queries in one traversal of the tree.
+        The set of queries that can still reach a node is pushed down the tree together and pruned per node,
+        so every node is visited at most once for the batch and its tests are vectorised over the active queries.
+        Parameters:
+            rectangles - (q, 2, k) array of [lower-left, upper-right] corners, or a list of (lowerLeftPoint, upperRightPoint) pairs
+            return_ids - return the rows of the points in the array the tree was built from instead of node indices
+        Returns:
+            offsets - array of length q + 1, the answer to query i is indices[offsets[i]:offsets[i+1]]
+            indices - node indices of the found points, their coordinates are points[indices]
+        """
+        lows, highs = rectangles_to_arrays(rectangles, self.k)
+        query_count = len(lows)
+        found_queries = []
+        found_nodes = []
+        points = self.points
+        # Stack entries are subtree ranges [lo, hi) with the indices of the queries that intersect them
+        stack = [(0, len(points), np.arange(query_count))] if self.root >= 0 and query_count else []
+        while stack:
+            lo, hi, active = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                block = points[lo:hi]
+                mask = np.all((block[None, :, :] >= lows[active, None, :]) & (block[None, :, :] <= highs[active, None, :]), axis=2)
+                queries, nodes = np.nonzero(mask)
+                found_queries.append(active[queries])
+                found_nodes.append(nodes + lo)
+                continue
+            node = (lo + hi) // 2
+            dimension = self.split_dims[node]
+            value = points[node, dimension]
+            inside = np.all((points[node] >= lows[active]) & (points[node] <= highs[active]), axis=1)
+            if inside.any():
+                found_queries.append(active[inside])
+                found_nodes.append(np.full(np.count_nonzero(inside), node, dtype=np.int64))
+            left_active = active[value >= lows[active, dimension]]
+            right_active = active[value <= highs[active, dimension]]
+            if len(left_active):
+                stack.append((lo, node, left_active))
+            if len(right_active):
+                stack.append((node + 1, hi, right_active))
+        if not found_queries:
+            return np.zeros(query_count + 1, dtype=np.int64), np.empty(0, dtype=np.int64)
+        offsets, nodes = group_by_query(np.concatenate(found_queries), np.concatenate(found_nodes).astype(np.int64), query_count)
+        return offsets, self.ids[nodes] if return_ids else nodes
+
+    def nearest(self: Self, point, k: int=1, return_ids: bool=False) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k points closest to the given point (Euclidean distance) by branch-and-bound descent with a max-heap bounded to k elements.
+        Subtrees whose region is farther than the current k-th distance are skipped, small subtrees are measured with one vectorised call.
+        Parameters:
+            point - the query point, a Point or a sequence of coordinates, or an (m, k) array of query points
+            k - the number of neighbours
+            return_ids - return the rows of the neighbours in the array the tree was built from instead of node indices
+        Returns:
+            distances - the distances ordered ascending, shape (k,) or (m, k) for a batch, padded with inf when the tree has fewer than k points
+            indices - node indices of the neighbours, their coordinates are points[indices], padded with -1
+        """
+        if isinstance(point, np.ndarray) and point.ndim == 2:
+            distances = np.full((len(point), k), np.inf)
+            indices = np.full((len(point), k), -1, dtype=np.int64)
+            for row, query in enumerate(points_to_array(point, self.k)):
+                distances[row], indices[row] = self._nearest(query, k)
+        else:
+            distances, indices = self._nearest(point_to_array(point, self.k), k)
+        if return_ids and len(self.ids):
+            indices = np.where(indices >= 0, self.ids[indices], -1)
+        return distances, indices
+
+    def _nearest(self: Self, query: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Single query of the nearest method
+        Parameters:
+            query - (k,) array with coordinates of the query point
+            k - the number of neighbours
+        """
+        points = self.points
+        # Max-heap of (-squared distance, node index)
+        heap = []
+        # Stack entries hold a subtree range, the squared distance from the query to its region and the per-dimension offsets of that distance
+        stack = [(0, len(points), 0.0, np.zeros(self.k))] if self.root >= 0 and k > 0 else []
+        while stack:
+            lo, hi, region_distance, offsets = stack.pop()
+            if len(heap) == k and region_distance >= -heap[0][0]:
+                continue
+            if hi - lo <= LEAF_SIZE:
+                distances = np.sum((points[lo:hi] - query) ** 2, axis=1)
+                for index in np.argsort(distances)[:k].tolist():
+                    distance = float(distances[index])
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-distance, lo + index))
+                    elif distance < -heap[0][0]:
+                        heapq.heapreplace(heap, (-distance, lo + index))
+                    else:
+                        break
+                continue
+            node = (lo + hi) // 2
+            distance = float(np.sum((points[node] - query) ** 2))
+            if len(heap) < k:
+                heapq.heappush(heap, (-distance, node))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, node))
+            dimension = self.split_dims[node]
+            difference = float(query[dimension] - points[node, dimension])
+            near, far = ((lo, node), (node + 1, hi)) if difference < 0 else ((node + 1, hi), (lo, node))
+            if far[1] > far[0]:
+                far_offsets = offsets.copy()
+                far_offsets[dimension] = difference
+                far_distance = region_distance - offsets[dimension] ** 2 + difference ** 2
+                if len(heap) < k or far_distance < -heap[0][0]:
+                    stack.append((*far, far_distance, far_offsets))
+            if near[1] > near[0]:
+                stack.append((*near, region_distance, offsets))
+        distances = np.full(k, np.inf)
+        indices = np.full(k, -1, dtype=np.int64)
+        for position, (distance, index) in enumerate(sorted(heap, reverse=True)):
+            distances[position] = (-distance) ** 0.5
+            indices[position] = index
+        return distances, indices
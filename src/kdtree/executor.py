@@ -0,0 +1,88 @@
+from typing import Self
+import numpy as np
+from .array_kdtree import ArrayKDTree
+from .kdtree import KDTree
+from .util.kdtreeutil import rectangles_to_arrays, points_to_array
+from ..common.sharedarrays import SnapshotPool, worker_snapshot
+
+def _rectangles_chunk(rectangles: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    return worker_snapshot().get_points_in_rectangles(rectangles)
+
+def _counts_chunk(rectangles: np.ndarray) -> np.ndarray:
+    tree = worker_snapshot()
+    return np.array([tree.count_in_rectangle(low, high) for low, high in rectangles], dtype=np.int64)
+
+def _nearest_chunk(points: np.ndarray, k: int) -> tuple[np.ndarray, np.ndarray]:
+    return worker_snapshot().nearest(points, k)
+
+class QueryExecutor(SnapshotPool):
+    """
+    Answers batches of queries on a pool of worker processes sharing one read-only tree snapshot.
+    The tree is encoded as an ArrayKDTree and its arrays are published in multiprocessing.shared_memory once,
+    every worker attaches to them, so only the query batches and the resulting index arrays cross process boundaries.
+    The worker pool and the shared memory are managed by SnapshotPool, use it as a context manager, or call close.
+    Attributes:
+        snapshot - the ArrayKDTree the queries run on, the returned indices point into snapshot.points
+        processes - number of worker processes
+    """
+    def __init__(self: Self, tree: ArrayKDTree | KDTree, processes: int=None, chunk_size: int=1024):
+        """
+        Parameters:
+        tree - the tree to be queried, a KDTree is converted into an ArrayKDTree snapshot first
+        processes - number of worker processes, os.cpu_count() by default
+        chunk_size - number of queries sent to a worker at once
+        """
+        self.snapshot = tree.to_array_tree() if isinstance(tree, KDTree) else tree
+        self.chunk_size = chunk_size
+        super().__init__(self.snapshot.to_arrays(), ArrayKDTree.from_arrays, processes)
+
+    def _chunks(self: Self, array: np.ndarray) -> list[np.ndarray]:
+        return [array[start:start + self.chunk_size] for start in range(0, len(array), self.chunk_size)]
+
+    def get_points_in_rectangles(self: Self, rectangles) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Searches a batch of rectangles in parallel
+        Parameters:
+            rectangles - (q, 2, k) array of [lower-left, upper-right] corners, or a list of (lowerLeftPoint, upperRightPoint) pairs
+        Returns:
+            offsets - array of length q + 1, the answer to query i is indices[offsets[i]:offsets[i+1]]
+            indices - indices of the found points in snapshot.points
+        """
+        lows, highs = rectangles_to_arrays(rectangles, self.snapshot.k)
+        results = self.map(_rectangles_chunk, self._chunks(np.stack([lows, highs], axis=1)))
+        offsets = [np.zeros(1, dtype=np.int64)]
+        indices = []
+        total = 0
+        for chunk_offsets, chunk_indices in results:
+            offsets.append(chunk_offsets[1:] + total)
+            indices.append(chunk_indices)
+            total += len(chunk_indices)
+        return np.concatenate(offsets), np.concatenate(indices) if indices else np.empty(0, dtype=np.int64)
+
+    def count_in_rectangles(self: Self, rectangles) -> np.ndarray:
+        """
+        Counts the points of a batch of rectangles in parallel
+        Parameters:
+            rectangles - (q, 2, k) array of corners, or a list of (lowerLeftPoint, upperRightPoint) pairs
+        Returns:
+            Array with the number of points in every rectangle
+        """
+        lows, highs = rectangles_to_arrays(rectangles, self.snapshot.k)
+        results = self.map(_counts_chunk, self._chunks(np.stack([lows, highs], axis=1)))
+        return np.concatenate(results) if results else np.empty(0, dtype=np.int64)
+
+    def nearest(self: Self, points, k: int=1) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k nearest neighbours of a batch of points in parallel
+        Parameters:
+            points - (m, k) array of query points or a list of points
+            k - the number of neighbours
+        Returns:
+            distances - (m, k) array of distances ordered ascending
+            indices - (m, k) array of indices into snapshot.points, padded with -1
+        """
+        queries = points_to_array(points, self.snapshot.k)
+        results = self.starmap(_nearest_chunk, [(chunk, k) for chunk in self._chunks(queries)])
+        if not results:
+            return np.empty((0, k)), np.empty((0, k), dtype=np.int64)
+        return np.concatenate([distances for distances, _ in results]), np.concatenate([indices for _, indices in results])
@@ -0,0 +1,160 @@
+from typing import Self, List
+import numpy as np
+from .array_kdtree import ArrayKDTree
+from .util.geometry import Point
+from .util.kdtreeutil import points_to_array, point_to_array
+from ..common.ingest import iter_point_chunks, CHUNK_SIZE
+
+class KDForest:
+    """
+    Dynamic point index built with the logarithmic method (Bentley-Saxe).
+    The points are kept in a series of static, perfectly balanced ArrayKDTrees, where the tree on level i holds at most 2^i points.
+    New points are merged with the smallest levels only and the result is rebuilt as one tree on the first level it fits in,
+    so every point takes part in O(log n) rebuilds, which gives amortised O(log^2 n) insertion.
+    Queries are answered by every tree of the forest and the results are combined.
+    Attributes:
+        k - number of dimensions
+        levels - the trees of the forest, None marks an empty level
+        next_id - id the next inserted point gets, points are numbered in the order of insertion and keep their ids in the ids of the trees
+    """
+    def __init__(self: Self, K=2):
+        self.k = K
+        self.levels: List[ArrayKDTree] = []
+        self.next_id = 0
+
+    def __len__(self: Self) -> int:
+        return sum(len(tree) for tree in self.trees())
+
+    def trees(self: Self) -> List[ArrayKDTree]:
+        """
+        Returns the non-empty trees of the forest
+        """
+        return [tree for tree in self.levels if tree is not None]
+
+    def insert_point(self: Self, point: Point) -> None:
+        """
+        Inserts a single point
+        Parameters:
+        point - a Point or a sequence of coordinates
+        """
+        self.insert_points(point_to_array(point, self.k).reshape(1, self.k))
+
+    def insert_points(self: Self, points) -> None:
+        """
+        Inserts a batch of points. The batch is merged with all levels below the first empty level that can hold it
+        together with them, and the merged points are built into one balanced tree on that level.
+        Parameters:
+        points - (m, k) array of coordinates or a list of points
+        """
+        batch = points_to_array(points, self.k)
+        if len(batch) == 0:
+            return
+        merged = [batch]
+        merged_ids = [np.arange(self.next_id, self.next_id + len(batch), dtype=np.int64)]
+        self.next_id += len(batch)
+        total = len(batch)
+        level = 0
+        while True:
+            if level == len(self.levels):
+                self.levels.append(None)
+            tree = self.levels[level]
+            if tree is None and total <= 2 ** level:
+                break
+            if tree is not None:
+                merged.append(tree.points)
+                merged_ids.append(tree.ids)
+                total += len(tree)
+                self.levels[level] = None
+            level += 1
+        tree = ArrayKDTree(K=self.k)
+        tree.build_tree(np.concatenate(merged))
+        tree.ids = np.concatenate(merged_ids)[tree.ids]
+        self.levels[level] = tree
+
+    def insert_file(self: Self, path: str, chunk_size: int=CHUNK_SIZE, fmt: str=None, delimiter: str=",", skip_rows: int=0) -> None:
+        """
+        Streams the points of a CSV, .npy or raw float64 file into the forest one chunk at a time,
+        so only a single chunk of the file is held in memory next to the trees, see common.ingest.iter_point_chunks for the parameters
+        """
+        for chunk in iter_point_chunks(path, self.k, chunk_size, fmt, delimiter, skip_rows):
+            self.insert_points(chunk)
+
+    def build_tree(self: Self, points) -> None:
+        """
+        Replaces the content of the forest with a single tree built from the given points
+        Parameters:
+        points - (n, k) array of coordinates or a list of points
+        """
+        self.levels = []
+        self.next_id = 0
+        self.insert_points(points)
+
+    def get_points_in_rectangle(self: Self, lowerLeftPoint: Point, upperRightPoint: Point, return_ids: bool=False) -> tuple[int, np.ndarray]:
+        """
+        Searches the given area in every tree of the forest
+        Parameters:
+            lowerLeftPoint - the lower-left point of the rectangle
+            upperRightPoint - the upper-right point of the rectangle
+            return_ids - return the insertion ids of the points instead of their coordinates
+        Returns:
+            count - number of points in the rectangle
+            points - (count, k) array with their coordinates, or an int64 array with their ids
+        """
+        found = [tree.get_points_in_rectangle(lowerLeftPoint, upperRightPoint, return_ids)[1] for tree in self.trees()]
+        return self._combine(found, return_ids)
+
+    def _combine(self: Self, found: List[np.ndarray], return_ids: bool) -> tuple[int, np.ndarray]:
+        """
+        Concatenates the results of the trees
+        """
+        if found:
+            result = np.concatenate(found)
+        else:
+            result = np.empty(0, dtype=np.int64) if return_ids else np.empty((0, self.k), dtype=np.float64)
+        return len(result), result
+
+    def count_in_rectangle(self: Self, lowerLeftPoint: Point, upperRightPoint: Point) -> int:
+        """
+        Counts the points in the given area using the subtree counting of every tree
+        Parameters:
+            lowerLeftPoint - the lower-left point of the rectangle
+            upperRightPoint - the upper-right point of the rectangle
+        """
+        return sum(tree.count_in_rectangle(lowerLeftPoint, upperRightPoint) for tree in self.trees())
+
+    def get_points_in_radius(self: Self, center: Point, radius: float, return_ids: bool=False) -> tuple[int, np.ndarray]:
+        """
+        Searches the points whose distance from the center is at most radius in every tree of the forest
+        Parameters:
+            center - the center of the circle
+            radius - the radius of the circle
+            return_ids - return the insertion ids of the points instead of their coordinates
+        Returns:
+            count - number of points in the circle
+            points - (count, k) array with their coordinates, or an int64 array with their ids
+        """
+        found = [tree.get_points_in_radius(center, radius, return_ids)[1] for tree in self.trees()]
+        return self._combine(found, return_ids)
+
+    def nearest(self: Self, point, k: int=1, return_ids: bool=False) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Finds the k points closest to the given point by merging the k nearest neighbours found in every tree
+        Parameters:
+            point - the query point, a Point or a sequence of coordinates
+            k - the number of neighbours
+            return_ids - return the insertion ids of the neighbours instead of their coordinates
+        Returns:
+            distances - the distances ordered ascending, padded with inf when the forest has fewer than k points
+            points - (k, K) array with the coordinates of the neighbours, padded with nan, or an int64 array of their ids padded with -1
+        """
+        distances = [np.full(k, np.inf)]
+        coordinates = [np.full(k, -1, dtype=np.int64) if return_ids else np.full((k, self.k), np.nan)]
+        for tree in self.trees():
+            tree_distances, indices = tree.nearest(point, k)
+            found = indices >= 0
+            distances.append(tree_distances[found])
+            coordinates.append(tree.ids[indices[found]] if return_ids else tree.points[indices[found]])
+        distances = np.concatenate(distances)
+        coordinates = np.concatenate(coordinates)
+        best = np.argsort(distances, kind="stable")[:k]
+        return distances[best], coordinates[best]
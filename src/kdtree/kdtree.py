@@ -1,7 +1,13 @@
-from typing import Self, List
-from .util.kdtreeutil import partition_array
+from typing import Self, List, Iterator
+import heapq
+from .util.kdtreeutil import partition_array, points_to_array, select_median, rectangles_to_arrays
 import numpy as np
 from .util.geometry import Point
+from .array_kdtree import ArrayKDTree, LEAF_SIZE
+from ..common.batch import group_by_query
+from ..common.treefile import write_tree_file, read_tree_file
+from ..common.stats import TraversalStats, histogram
+from ..common.querycache import QueryCache
 class Node:
     """
     Tree node class
@@ -9,12 +15,22 @@ class Node:
         value - stores a value of node
         left - pointer to the left node on the tree
         right - pointer to the right node on the tree
+        size - number of points in the subtree rooted at this node
+        index - position of the point in the array the tree was built from, points inserted later continue the numbering
     
     """
-    def __init__(self: Self,value: tuple=None):
+    def __init__(self: Self,value: tuple=None, index: int=-1):
         self.value = value
+        self.index = index
         self.left = None
         self.right = None
+        self.size = 1
+
+    def update_size(self: Self) -> None:
+        """
+        Recomputes the subtree size from the sizes of the children
+        """
+        self.size = 1 + (self.left.size if self.left else 0) + (self.right.size if self.right else 0)
     def __str__(self: Self) -> str:
         return str(self.value)
 
@@ -23,26 +39,64 @@ class KDTree:
     KDTree data structure that holds given points in a binary tree. The dimension can be adjusted, however currently it's used for 2-D application.
     On the first level it takes the median point by the x-coordinate, on the second it takes the median point by y-coordinate, loops back to the first coordinate 
     when it runs out of dimensions
+    Attributes:
+        root - the root node
+        k - number of dimensions
+        balance - None for plain insertion, otherwise a factor from (0.5, 1) that turns on the balanced dynamic mode:
+                  after an insert no child may hold more than balance * size points of its parent's subtree,
+                  the highest subtree breaking this rule is rebuilt with the median build (scapegoat tree),
+                  which keeps the height and the amortised insert cost logarithmic
+        max_size - the largest number of points since the tree was last built, used to rebuild it after many deletions in the balanced mode
+        stats - a TraversalStats collector filled by builds, inserts and all queries, None turns collection off
+        generation - mutation counter increased by every build, insert and successful delete
+        cache - a QueryCache for the results of get_points_in_rectangle, None turns caching off
+        next_id - index the next inserted point gets, queries can return the indices of the points instead of the points
     """
-    def __init__(self: Self, K=2):
+    def __init__(self: Self, K=2, balance: float=None, stats: TraversalStats=None, cache: QueryCache=None):
+        if balance is not None and not 0.5 < balance < 1:
+            raise ValueError("balance has to be between 0.5 and 1")
         self.root = None
         self.k = K
+        self.balance = balance
+        self.max_size = 0
+        self.stats = stats
+        self.generation = 0
+        self.cache = cache
+        self.next_id = 0
+        # Preorder arrays of the tree tagged with the generation they were made on, see _preorder
+        self._flat = None
     
-    def build_tree(self: Self, array: List[Point], depth: int=0) -> None:
+    def build_tree(self: Self, array: List[Point], depth: int=0, method: str="sort") -> None:
         """
         Build the KDTree from the given array of points.
         Parameters:
         array - list of points to be split
         depth - the depth of tree that determines the dimension of tree, given the K dimensions of a point, the current dimension points in array will be sorted by is dim = (depth % K) 
+        method - "sort" sorts every sublist by the current dimension, which takes O(n log^2 n) time,
+                 "select" copies the coordinates into one array once and finds every median in place with introselect,
+                 which takes O(n log n) time and does not copy the sublists
         """
-        def _build_tree(array: List[Point], depth: int) -> Node:
+        self.max_size = len(array)
+        self.next_id = len(array)
+        self.generation += 1
+        if self.stats is not None:
+            self.stats.builds += 1
+            self.stats.nodes_visited += len(array)
+        if method == "select":
+            self.root = self._build_tree_select(array, depth)
+            return
+        if method != "sort":
+            raise ValueError(f"Unknown build method {method}")
+
+        # Entries are (index, point) pairs, so every node remembers the position of its point in the given array
+        def _build_tree(array: List[tuple[int, Point]], depth: int) -> Node:
             if not array:
                 return None
             if len(array) == 1:
-                return Node(array[0])
+                return Node(array[0][1], array[0][0])
 
             dimension = depth % self.k 
-            array.sort(key=lambda point: point[dimension])
+            array.sort(key=lambda entry: entry[1][dimension])
             median_index = len(array) // 2
             
             # L,R,pivot = partition_array(array,dimension)
@@ -51,81 +105,399 @@ class KDTree:
             # current.left = _build_tree(L, depth + 1)
             # current.right = _build_tree(R, depth + 1)
 
-            current = Node(array[median_index])
+            current = Node(array[median_index][1], array[median_index][0])
 
             current.left = _build_tree(array[:median_index], depth + 1)
             current.right = _build_tree(array[median_index + 1:], depth + 1)
+            current.update_size()
+
+            return current
+
+        self.root = _build_tree(list(enumerate(array)), depth)
+
+    def _build_tree_select(self: Self, array: List[Point], depth: int, ids: List[int]=None) -> Node:
+        """
+        Builds the tree over an index array, partitioning its ranges in place around the median of the current dimension
+        Parameters:
+        array - list of points to be split
+        depth - the depth of the root
+        ids - indices of the points stored in the nodes, their positions in array by default
+        Returns:
+        The root node
+        """
+        coordinates = points_to_array(array, self.k)
+        order = np.arange(len(array), dtype=np.int64)
+        # Below this size a NumPy call costs more than sorting a short list of indices
+        small_size = 16
+        rows = coordinates.tolist()
+        if ids is None:
+            ids = range(len(array))
+
+        def _build_small(indices: List[int], depth: int) -> Node:
+            if not indices:
+                return None
+            if len(indices) == 1:
+                return Node(array[indices[0]], ids[indices[0]])
+            dimension = depth % self.k
+            indices.sort(key=lambda index: rows[index][dimension])
+            median = len(indices) // 2
+            current = Node(array[indices[median]], ids[indices[median]])
+            current.left = _build_small(indices[:median], depth + 1)
+            current.right = _build_small(indices[median + 1:], depth + 1)
+            current.update_size()
+            return current
 
+        def _build(lo: int, hi: int, depth: int) -> Node:
+            if hi - lo <= small_size:
+                return _build_small(order[lo:hi].tolist(), depth)
+            median = select_median(order, coordinates, lo, hi, depth % self.k)
+            current = Node(array[order[median]], ids[order[median]])
+            current.left = _build(lo, median, depth + 1)
+            current.right = _build(median + 1, hi, depth + 1)
+            current.update_size()
             return current
 
-        self.root = _build_tree(array, depth)
+        return _build(0, len(array), depth)
     
     def insert_point(self: Self, point: Point):
-        
-        def insertRec(node: Node, point: Point, depth: int = 0):
-            
-            if not node:
-                return Node(point)
-
+        """
+        Inserts a point as a new leaf. The descent is iterative, so degenerate trees do not hit the recursion limit.
+        In the balanced mode the highest subtree on the path that lost its balance is rebuilt afterwards.
+        Parameters:
+        point - the point to be inserted
+        Returns:
+        The index given to the point
+        """
+        self.generation += 1
+        index = self.next_id
+        self.next_id += 1
+        if self.stats is not None:
+            self.stats.inserts += 1
+        if self.root is None:
+            self.root = Node(point, index)
+            self.max_size = max(self.max_size, 1)
+            return index
+        # Nodes on the path from the root with their depths
+        path = []
+        current = self.root
+        depth = 0
+        while current is not None:
+            path.append((current, depth))
+            current.size += 1
             cd = depth % self.k
-
-            if point[cd] < node.value[cd]:
-                node.left = insertRec(node.left, point, depth + 1)
+            if point[cd] < current.value[cd]:
+                if current.left is None:
+                    current.left = Node(point, index)
+                    break
+                current = current.left
             else:
-                node.right = insertRec(node.right, point, depth + 1)
+                if current.right is None:
+                    current.right = Node(point, index)
+                    break
+                current = current.right
+            depth += 1
+        self.max_size = max(self.max_size, self.root.size)
+        if self.stats is not None:
+            self.stats.nodes_visited += len(path)
 
-            return node
-        
-        self.root = insertRec(self.root, point, 0)
+        if self.balance is None:
+            return index
+        for position, (node, depth) in enumerate(path):
+            heavier = max(node.left.size if node.left else 0, node.right.size if node.right else 0)
+            if heavier > self.balance * node.size:
+                self._rebuild_subtree(node, depth, path[position - 1][0] if position > 0 else None)
+                break
+        return index
 
-    def copyPoint(self: Self,p1: Point, p2: Point):
+    def _rebuild_subtree(self: Self, node: Node, depth: int, parent: Node) -> None:
+        """
+        Replaces the subtree rooted at node with a perfectly balanced one built from the same points
+        Parameters:
+        node - the root of the subtree
+        depth - the depth of node, it determines the split dimensions of the rebuilt subtree
+        parent - the parent of node, None for the root
         """
-        Writes values from one point to another
+        points = []
+        ids = []
+        self._collect_subtree(node, points, ids)
+        rebuilt = self._build_tree_select(points, depth, ids)
+        if parent is None:
+            self.root = rebuilt
+        elif parent.left is node:
+            parent.left = rebuilt
+        else:
+            parent.right = rebuilt
 
+    def min_value_node(self: Self, node: Node, dimension: int, depth: int) -> Node:
         """
-        for i in range(self.k):
-            p1[i] = p2[i]
+        Finds the node with the smallest value in the given dimension within a subtree.
+        On levels split by that dimension only the left subtree can hold smaller values, on the other levels both subtrees are searched.
+        Parameters:
+        node - the root of the subtree
+        dimension - the dimension to be minimised
+        depth - the depth of node
+        """
+        best = node
+        stack = [(node, depth)]
+        while stack:
+            current, level = stack.pop()
+            if current.value[dimension] < best.value[dimension]:
+                best = current
+            if current.left is not None:
+                stack.append((current.left, level + 1))
+            if current.right is not None and level % self.k != dimension:
+                stack.append((current.right, level + 1))
+        return best
     
-    def min_value_node(self: Self,node: Node):
+    def delete_node_rec(self: Self, node: Node, point: Point, depth: int) -> Node:
         """
-        
+        Deletes one node holding the given point from the subtree
+        Parameters:
+        node - the root of the subtree
+        point - a point value to be deleted
+        depth - the depth of node
+        Returns:
+        The new root of the subtree
         """
-        currentNode = node
-        while currentNode.left:
-            currentNode = currentNode.left
-        return currentNode
-    
-    def delete_node_rec(self: Self, node: Node, point: Point, depth: int):
+        return self._delete_node(node, point, depth)[0]
+
+    def _find_path(self: Self, node: Node, point: Point, depth: int, target: Node=None) -> List[tuple[Node, int]]:
         """
+        Finds a node holding the given point in the subtree with an explicit stack, so degenerate trees do not hit the recursion limit.
+        Points equal to the split value can lie on both sides of a node built by the median build, so both sides are searched then, the left one first.
+        When target is given only that node is accepted, so it is found even among points with equal coordinates.
+        Returns:
+        The (node, depth) pairs on the path from node to the found node, None when the point is not in the subtree
         """
-        if not node:
-            return None
-    
-        dimension = depth % self.k
-        if point[dimension] < node.value[dimension]:
-            node.left = self.delete_node_rec(node.left, point, depth + 1)
-        elif point[dimension] > node.value[dimension]:
-            node.right = self.delete_node_rec(node.right, point, depth + 1)
-        else:
-            if not node.left:
-                return node.right
-            elif not node.right:
-                return node.left
+        # Stack entries link back to the entry of their parent, so the path is only assembled for the found node
+        stack = [(node, depth, None)] if node is not None else []
+        while stack:
+            entry = stack.pop()
+            current, level, _ = entry
+            dimension = level % self.k
+            if point[dimension] < current.value[dimension]:
+                children = (current.left,)
+            elif point[dimension] > current.value[dimension]:
+                children = (current.right,)
+            elif (target is None or current is target) and all(point[i] == current.value[i] for i in range(self.k)):
+                path = []
+                while entry is not None:
+                    path.append((entry[0], entry[1]))
+                    entry = entry[2]
+                return path[::-1]
             else:
-                temp: Node = self.min_value_node(node.right)
-                self.copyPoint(node.value, temp.value)
-                node.right = self.delete_node_rec(node.right, temp.value, depth + 1)
-        return node
+                children = (current.right, current.left)
+            stack.extend((child, level + 1, entry) for child in children if child is not None)
+        return None
+
+    def _delete_node(self: Self, node: Node, point: Point, depth: int) -> tuple[Node, bool]:
+        """
+        Iterative deletion returning the new root of the subtree and whether a node was removed.
+        A removed inner node takes the point with the minimum value of its split dimension from the right subtree,
+        when there is only a left subtree the minimum is taken from it and the subtree becomes the right one.
+        The node of the replacement is removed the same way, until a leaf is reached and cut off.
+        The stored Point objects are never modified.
+        """
+        path = self._find_path(node, point, depth)
+        if path is None:
+            return node, False
+        current, level = path[-1]
+        while current.left is not None or current.right is not None:
+            if current.right is None:
+                current.right, current.left = current.left, None
+            replacement = self.min_value_node(current.right, level % self.k, level + 1)
+            current.value, current.index = replacement.value, replacement.index
+            path.extend(self._find_path(current.right, replacement.value, level + 1, replacement))
+            current, level = path[-1]
+        if len(path) == 1:
+            return None, True
+        parent = path[-2][0]
+        if parent.left is current:
+            parent.left = None
+        else:
+            parent.right = None
+        for ancestor, _ in path[:-1]:
+            ancestor.size -= 1
+        return node, True
     
-    def delete_point(self: Self, point: Point):
+    def delete_point(self: Self, point: Point) -> bool:
         """
-        Deletes node using recursive function defined above
+        Deletes one node holding the given point
         Arguments:
-        node - a starting node
         point - a point value to be deleted
+        Returns:
+        Whether the point was found
+        """
+        self.root, deleted = self._delete_node(self.root, point, 0)
+        if deleted:
+            self.generation += 1
+        self._rebalance_after_delete()
+        return deleted
+
+    def delete_points(self: Self, points: List[Point]) -> int:
         """
-        self.node = self.delete_node_rec(self.root, point, 0)
+        Deletes many points at once. When more than a quarter of the tree is deleted it is cheaper to rebuild it from the remaining points,
+        so the query performance after large deletions is the same as after a fresh build.
+        Arguments:
+        points - point values to be deleted
+        Returns:
+        Number of deleted points
+        """
+        if self.root is None or not points:
+            return 0
+        if 4 * len(points) < self.root.size:
+            deleted = 0
+            for point in points:
+                self.root, removed = self._delete_node(self.root, point, 0)
+                deleted += removed
+            if deleted:
+                self.generation += 1
+            self._rebalance_after_delete()
+            return deleted
+        # Count the points to remove by their coordinates, so that every occurrence is deleted only once
+        pending = {}
+        for point in points:
+            key = tuple(point[i] for i in range(self.k))
+            pending[key] = pending.get(key, 0) + 1
+        remaining = []
+        remaining_ids = []
+        stored = []
+        stored_ids = []
+        self._collect_subtree(self.root, stored, stored_ids)
+        for value, index in zip(stored, stored_ids):
+            key = tuple(value[i] for i in range(self.k))
+            if pending.get(key, 0) > 0:
+                pending[key] -= 1
+            else:
+                remaining.append(value)
+                remaining_ids.append(index)
+        deleted = self.root.size - len(remaining)
+        self.generation += 1
+        self.root = self._build_tree_select(remaining, 0, remaining_ids)
+        self.max_size = len(remaining)
+        return deleted
+
+    def _rebalance_after_delete(self: Self) -> None:
+        """
+        In the balanced mode rebuilds the whole tree once it shrank below balance times its largest size since the last rebuild
+        """
+        if self.balance is None:
+            return
+        size = self.root.size if self.root else 0
+        if size < self.balance * self.max_size:
+            points = []
+            ids = []
+            if self.root is not None:
+                self._collect_subtree(self.root, points, ids)
+            self.root = self._build_tree_select(points, 0, ids)
+            self.max_size = size
     
+    def to_array_tree(self: Self) -> ArrayKDTree:
+        """
+        Creates an immutable array-encoded snapshot of the points, a balanced ArrayKDTree built from them that keeps their indices as ids
+        """
+        points = []
+        ids = []
+        if self.root is not None:
+            self._collect_subtree(self.root, points, ids)
+        tree = ArrayKDTree(K=self.k)
+        tree.build_tree(points)
+        tree.ids = np.array(ids, dtype=np.int64)[tree.ids]
+        return tree
+
+    def save(self: Self, path: str) -> None:
+        """
+        Writes the tree with its exact structure into a binary tree file, see common.treefile for the layout.
+        The nodes are stored in preorder as flat arrays - the coordinates of node i, the indices of its children (-1 when missing),
+        its subtree size and the index of its point, so loading the tree needs no comparisons and no rebuild.
+        Parameters:
+        path - path of the file
+        """
+        _, arrays = self._preorder()
+        write_tree_file(path, "KDTree", arrays, {"k": self.k, "balance": self.balance, "max_size": self.max_size, "next_id": self.next_id})
+
+    def _preorder(self: Self) -> tuple[List[Node], dict[str, np.ndarray]]:
+        """
+        Flattens the tree into preorder arrays, every subtree then occupies a contiguous range of them.
+        The result is kept until the next mutation of the tree.
+        Returns:
+        nodes - the nodes in preorder
+        arrays - points, left, right, sizes and ids of the nodes as described in save
+        """
+        if self._flat is not None and self._flat[0] == self.generation:
+            return self._flat[1], self._flat[2]
+        nodes = []
+        left = []
+        right = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            position = len(nodes)
+            nodes.append(node)
+            # In preorder the left child follows its parent and the right child follows the left subtree
+            left.append(position + 1 if node.left is not None else -1)
+            right.append(position + 1 + (node.left.size if node.left is not None else 0) if node.right is not None else -1)
+            if node.right is not None:
+                stack.append(node.right)
+            if node.left is not None:
+                stack.append(node.left)
+        arrays = {
+            "points": points_to_array([node.value for node in nodes], self.k),
+            "left": np.array(left, dtype=np.int64),
+            "right": np.array(right, dtype=np.int64),
+            "sizes": np.array([node.size for node in nodes], dtype=np.int64),
+            "ids": np.array([node.index for node in nodes], dtype=np.int64),
+        }
+        self._flat = (self.generation, nodes, arrays)
+        return nodes, arrays
+
+    @classmethod
+    def load(cls, path: str, cache: QueryCache=None) -> Self:
+        """
+        Restores a tree written by save with the same structure
+        Parameters:
+        path - path of the file
+        cache - a QueryCache for the restored tree
+        """
+        _, arrays, meta = read_tree_file(path, "KDTree")
+        tree = cls(K=meta["k"], balance=meta["balance"], cache=cache)
+        tree.max_size = meta["max_size"]
+        ids = arrays["ids"].tolist() if "ids" in arrays else range(len(arrays["points"]))
+        tree.next_id = meta.get("next_id", len(ids))
+        nodes = [Node(Point.from_coordinates(coordinates), index) for coordinates, index in zip(arrays["points"].tolist(), ids)]
+        for node, left, right, size in zip(nodes, arrays["left"].tolist(), arrays["right"].tolist(), arrays["sizes"].tolist()):
+            node.left = nodes[left] if left >= 0 else None
+            node.right = nodes[right] if right >= 0 else None
+            node.size = size
+        tree.root = nodes[0] if nodes else None
+        return tree
+
+    def shape(self: Self) -> dict:
+        """
+        Measures the shape of the tree
+        Returns:
+        Dictionary with
+            height - number of levels, 0 for an empty tree
+            nodes - number of nodes
+            leaves - number of nodes without children
+            depths - histogram of the node depths, every node holds one point so it is also the depth distribution of the points
+            leaf_depths - histogram of the leaf depths
+        """
+        depths = []
+        leaf_depths = []
+        stack = [(self.root, 0)] if self.root is not None else []
+        while stack:
+            current, depth = stack.pop()
+            depths.append(depth)
+            if current.left is None and current.right is None:
+                leaf_depths.append(depth)
+            if current.left is not None:
+                stack.append((current.left, depth + 1))
+            if current.right is not None:
+                stack.append((current.right, depth + 1))
+        return {"height": max(depths) + 1 if depths else 0, "nodes": len(depths), "leaves": len(leaf_depths),
+                "depths": histogram(depths), "leaf_depths": histogram(leaf_depths)}
+
     def bst_to_list(self: Self):
         """
         Converts the whole tree int an array of form [left child]<-[parent]->[right child]
@@ -133,36 +505,312 @@ class KDTree:
         def transform(current: Node) -> List[Point]:
             if(current == None):
                 return []
-            return transform(current.left) + ([current.value] if current.value != None else [])   + transform(current.right)
+            return transform(current.left) + ([current.value] if current.value is not None else [])   + transform(current.right)
         return transform(self.root)
     
-    def get_points_in_rectangle(self: Self, lowerLeftPoint: Point, upperRightPoint: Point) -> tuple[int,List[Point]]:
+    def get_points_in_rectangle(self: Self, lowerLeftPoint: Point, upperRightPoint: Point, return_ids: bool=False) -> tuple[int,List[Point]]:
         """
         Searches the given area and calculates how many and what points are in the given region in O(P) time, where P is the amounts of points in the rectangle
         On average this time would be O(h), where h is the height of the tree, where h = log(n), where n is the amount of all points
+        With a cache attached, a rectangle asked again before the next mutation of the tree is answered from the cache.
+        Parameters:
+            lowerLeftPoint - the lower-left point of the rectangle
+            upperRightPoint - the upper-right point of the rectangle
+            return_ids - return an int64 array with the indices of the points instead of the list of points
+        """
+        if self.cache is not None:
+            key = (tuple(lowerLeftPoint[i] for i in range(self.k)), tuple(upperRightPoint[i] for i in range(self.k)), return_ids)
+            cached = self.cache.get(key, self.generation)
+            if cached is None:
+                cached = self._get_points_in_rectangle(lowerLeftPoint, upperRightPoint, return_ids)[1]
+                self.cache.put(key, self.generation, cached)
+            # The cached result is copied so that callers can not change it
+            return len(cached), cached.copy()
+        return self._get_points_in_rectangle(lowerLeftPoint, upperRightPoint, return_ids)
+
+    def _get_points_in_rectangle(self: Self, lowerLeftPoint: Point, upperRightPoint: Point, return_ids: bool=False) -> tuple[int,List[Point]]:
+        """
+        Searches the given area without the cache
+        """
+        nodes = self._iter_nodes_in_area(lowerLeftPoint, upperRightPoint)
+        if return_ids:
+            ids = np.fromiter((node.index for node in nodes), dtype=np.int64)
+            return len(ids), ids
+        points = [node.value for node in nodes]
+        return len(points), points
+
+    def iter_points_in_area(self: Self, lowerLeftPoint: Point, upperRightPoint: Point) -> Iterator[Point]:
+        """
+        Lazily yields the points in the given area, in the same order as get_points_in_rectangle returns them.
+        The traversal keeps its own stack instead of recursing, so degenerate trees can not hit the recursion limit,
+        and the caller can stop early, e.g. after the first hits, without the rest of the tree being searched.
+        The tree must not be changed while the iteration is in progress.
         Parameters:
             lowerLeftPoint - the lower-left point of the rectangle
             upperRightPoint - the upper-right point of the rectangle
         """
+        return (node.value for node in self._iter_nodes_in_area(lowerLeftPoint, upperRightPoint))
+
+    def _iter_nodes_in_area(self: Self, lowerLeftPoint: Point, upperRightPoint: Point) -> Iterator[Node]:
+        """
+        Yields the nodes whose points lie in the given area, see iter_points_in_area
+        """
+        low = [lowerLeftPoint[i] for i in range(self.k)]
+        high = [upperRightPoint[i] for i in range(self.k)]
+        stats = self.stats
+        if stats is not None:
+            stats.queries += 1
+        stack = [(self.root, 0)] if self.root is not None else []
+        while stack:
+            current, depth = stack.pop()
+            if stats is not None:
+                stats.nodes_visited += 1
+            dimension = depth % self.k
+            left_side = current.value[dimension] >= low[dimension]
+            right_side = current.value[dimension] <= high[dimension]
+            if left_side and right_side:
+                if stats is not None:
+                    stats.points_tested += 1
+                if all(low[i] <= current.value[i] <= high[i] for i in range(self.k)):
+                    yield current
+            # The left subtree is pushed last, so it is searched first just like in a preorder walk
+            if right_side and current.right is not None:
+                stack.append((current.right, depth + 1))
+            if left_side and current.left is not None:
+                stack.append((current.left, depth + 1))
+
+    def count_in_rectangle(self: Self, lowerLeftPoint: Point, upperRightPoint: Point) -> int:
+        """
+        Counts the points in the given area without collecting them.
+        The region of every node is tracked during the descent, when it lies entirely inside the rectangle
+        the whole subtree size is added at once, so the time does not depend on how many points are inside - O(sqrt(n)) for a balanced 2-D tree.
+        Parameters:
+            lowerLeftPoint - the lower-left point of the rectangle
+            upperRightPoint - the upper-right point of the rectangle
+        """
+        low = [lowerLeftPoint[i] for i in range(self.k)]
+        high = [upperRightPoint[i] for i in range(self.k)]
         count = 0
-        points = []
-        def inside(checked: Point):
-            for i in range(self.k):
-                if checked[i] < lowerLeftPoint[i] or checked[i] > upperRightPoint[i]:
-                    return False
-            return True  
-        def recursive(current: Node, depth: int=0):
-            if current is None:
-                return
-            nonlocal count, points
-            left_side = current.value[depth%self.k] >= lowerLeftPoint[depth%self.k]
-            right_side = current.value[depth%self.k] <= upperRightPoint[depth%self.k]
-            if left_side and right_side and inside(current.value):
+        stats = self.stats
+        if stats is not None:
+            stats.queries += 1
+        # Stack entries hold a node with the lower and upper bounds of its region
+        stack = [(self.root, 0, [-np.inf] * self.k, [np.inf] * self.k)] if self.root is not None else []
+        while stack:
+            current, depth, region_low, region_high = stack.pop()
+            if stats is not None:
+                stats.nodes_visited += 1
+            if all(low[i] <= region_low[i] and region_high[i] <= high[i] for i in range(self.k)):
+                if stats is not None:
+                    stats.subtrees_accepted += 1
+                count += current.size
+                continue
+            dimension = depth % self.k
+            value = current.value[dimension]
+            left_side = value >= low[dimension]
+            right_side = value <= high[dimension]
+            if stats is not None and left_side and right_side:
+                stats.points_tested += 1
+            if left_side and right_side and all(low[i] <= current.value[i] <= high[i] for i in range(self.k)):
                 count += 1
+            if left_side and current.left is not None:
+                left_high = list(region_high)
+                left_high[dimension] = value
+                stack.append((current.left, depth + 1, region_low, left_high))
+            if right_side and current.right is not None:
+                right_low = list(region_low)
+                right_low[dimension] = value
+                stack.append((current.right, depth + 1, right_low, region_high))
+        return count
+
+    def get_points_in_radius(self: Self, center: Point, radius: float, return_ids: bool=False) -> tuple[int, List[Point]]:
+        """
+        Searches the points whose Euclidean distance from the center is at most radius.
+        The region of every node is tracked during the descent, subtrees whose region does not reach the circle are pruned
+        and subtrees whose region lies entirely inside the circle are reported without testing their points.
+        Parameters:
+            center - the center of the circle
+            radius - the radius of the circle
+            return_ids - return an int64 array with the indices of the points instead of the list of points
+        """
+        query = [center[i] for i in range(self.k)]
+        squared_radius = radius * radius
+        points = []
+        ids = [] if return_ids else None
+        stats = self.stats
+        if stats is not None:
+            stats.queries += 1
+        stack = [(self.root, 0, [-np.inf] * self.k, [np.inf] * self.k)] if self.root is not None else []
+        while stack:
+            current, depth, region_low, region_high = stack.pop()
+            if stats is not None:
+                stats.nodes_visited += 1
+            if sum(max(region_low[i] - query[i], 0, query[i] - region_high[i]) ** 2 for i in range(self.k)) > squared_radius:
+                continue
+            if sum(max(query[i] - region_low[i], region_high[i] - query[i]) ** 2 for i in range(self.k)) <= squared_radius:
+                if stats is not None:
+                    stats.subtrees_accepted += 1
+                self._collect_subtree(current, points, ids)
+                continue
+            if stats is not None:
+                stats.points_tested += 1
+            if sum((current.value[i] - query[i]) ** 2 for i in range(self.k)) <= squared_radius:
                 points.append(current.value)
-            if left_side:
-                recursive(current.left,depth+1)
-            if right_side:
-                recursive(current.right,depth+1)
-        recursive(self.root)
-        return count, points
+                if return_ids:
+                    ids.append(current.index)
+            dimension = depth % self.k
+            value = current.value[dimension]
+            if current.left is not None:
+                left_high = list(region_high)
+                left_high[dimension] = value
+                stack.append((current.left, depth + 1, region_low, left_high))
+            if current.right is not None:
+                right_low = list(region_low)
+                right_low[dimension] = value
+                stack.append((current.right, depth + 1, right_low, region_high))
+        if return_ids:
+            return len(ids), np.array(ids, dtype=np.int64)
+        return len(points), points
+
+    def _collect_subtree(self: Self, node: Node, result: List[Point], ids: List[int]=None) -> None:
+        """
+        Appends every point of the subtree rooted at node to the result list, and their indices to ids when it is given
+        """
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            result.append(current.value)
+            if ids is not None:
+                ids.append(current.index)
+            if current.left is not None:
+                stack.append(current.left)
+            if current.right is not None:
+                stack.append(current.right)
+
+    def get_points_in_rectangles(self: Self, rectangles, return_ids: bool=False) -> tuple[np.ndarray, List[Point] | np.ndarray]:
+        """
+        Answers a batch of rectangle queries in one traversal instead of walking the tree from the root for every rectangle.
+        The traversal runs over the preorder arrays of the tree, which are made once per mutation generation.
+        The queries that can still reach a node are pushed down the tree together and pruned at every split with vectorised tests,
+        so each node is visited at most once for the whole batch, and subtrees of at most LEAF_SIZE points are tested as one block.
+        Parameters:
+            rectangles - list of (lowerLeftPoint, upperRightPoint) pairs or a (q, 2, k) array of corners
+            return_ids - return the indices of the points instead of the points
+        Returns:
+            offsets - array of length q + 1, the answer to rectangle i is points[offsets[i]:offsets[i+1]]
+            points - the found points of all rectangles grouped by rectangle, or an int64 array with their indices
+        """
+        lows, highs = rectangles_to_arrays(rectangles, self.k)
+        query_count = len(lows)
+        stats = self.stats
+        if stats is not None:
+            # Every rectangle counts as a query and the tests of a node as a visit for every rectangle still reaching it
+            stats.queries += query_count
+        nodes, arrays = self._preorder()
+        points = arrays["points"]
+        left, right, sizes = arrays["left"].tolist(), arrays["right"].tolist(), arrays["sizes"].tolist()
+        found_queries = [np.empty(0, dtype=np.int64)]
+        found_nodes = [np.empty(0, dtype=np.int64)]
+        stack = [(0, 0, np.arange(query_count, dtype=np.int64))] if nodes and query_count else []
+        while stack:
+            node, depth, active = stack.pop()
+            if stats is not None:
+                stats.nodes_visited += len(active)
+                # A small subtree is tested as one block, otherwise only the point of the node is tested
+                stats.points_tested += len(active) * (sizes[node] if sizes[node] <= LEAF_SIZE else 1)
+            if sizes[node] <= LEAF_SIZE:
+                block = points[node:node + sizes[node]]
+                mask = np.all((block[None, :, :] >= lows[active, None, :]) & (block[None, :, :] <= highs[active, None, :]), axis=2)
+                queries, positions = np.nonzero(mask)
+                found_queries.append(active[queries])
+                found_nodes.append(positions + node)
+                continue
+            dimension = depth % self.k
+            value = points[node, dimension]
+            inside = np.all((points[node] >= lows[active]) & (points[node] <= highs[active]), axis=1)
+            if inside.any():
+                found_queries.append(active[inside])
+                found_nodes.append(np.full(np.count_nonzero(inside), node, dtype=np.int64))
+            if right[node] >= 0:
+                right_active = active[value <= highs[active, dimension]]
+                if len(right_active):
+                    stack.append((right[node], depth + 1, right_active))
+            if left[node] >= 0:
+                left_active = active[value >= lows[active, dimension]]
+                if len(left_active):
+                    stack.append((left[node], depth + 1, left_active))
+        offsets, positions = group_by_query(np.concatenate(found_queries), np.concatenate(found_nodes).astype(np.int64), query_count)
+        if return_ids:
+            return offsets, arrays["ids"][positions]
+        return offsets, [nodes[position].value for position in positions.tolist()]
+
+    def nearest(self: Self, point, k: int=1, return_ids: bool=False):
+        """
+        Finds the k points closest to the given point (Euclidean distance) by branch-and-bound descent.
+        The best candidates are kept in a max-heap bounded to k elements, a subtree is skipped when the distance from the query
+        to its region is not smaller than the current k-th distance, so on average only O(log n) nodes are visited.
+        Parameters:
+            point - the query point, or a batch of query points given as a list of points or an (m, k) array
+            k - the number of neighbours
+            return_ids - return arrays of distances and point indices instead of the pairs
+        Returns:
+            List of (distance, point) pairs ordered by distance, or a list of such lists for a batch of query points.
+            With return_ids, an array of distances padded with inf and an int64 array of indices padded with -1,
+            of shape (k,) or (m, k) for a batch.
+        """
+        batch = isinstance(point, np.ndarray) and point.ndim == 2 or isinstance(point, list) and point and not np.isscalar(point[0])
+        queries = points_to_array(point, self.k).tolist() if batch else [[point[i] for i in range(self.k)]]
+        if not return_ids:
+            results = [[(distance, node.value) for distance, node in self._nearest(query, k)] for query in queries]
+            return results if batch else results[0]
+        distances = np.full((len(queries), k), np.inf)
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for row, query in enumerate(queries):
+            for position, (distance, node) in enumerate(self._nearest(query, k)):
+                distances[row, position] = distance
+                ids[row, position] = node.index
+        return (distances, ids) if batch else (distances[0], ids[0])
+
+    def _nearest(self: Self, query: List[float], k: int) -> List[tuple[float, Node]]:
+        """
+        Single query of the nearest method
+        Parameters:
+            query - coordinates of the query point
+            k - the number of neighbours
+        """
+        stats = self.stats
+        if stats is not None:
+            stats.queries += 1
+        if self.root is None or k <= 0:
+            return []
+        # Max-heap by squared distance, the counter keeps points from being compared with each other
+        heap = []
+        counter = 0
+        # Stack entries hold a node, its depth, the squared distance from the query to the node region and the per-dimension offsets of that distance
+        stack = [(self.root, 0, 0.0, [0.0] * self.k)]
+        while stack:
+            current, depth, region_distance, offsets = stack.pop()
+            if len(heap) == k and region_distance >= -heap[0][0]:
+                continue
+            if stats is not None:
+                stats.nodes_visited += 1
+                stats.points_tested += 1
+            coordinates = [current.value[i] for i in range(self.k)]
+            distance = sum((query[i] - coordinates[i]) ** 2 for i in range(self.k))
+            if len(heap) < k:
+                heapq.heappush(heap, (-distance, counter, current))
+            elif distance < -heap[0][0]:
+                heapq.heapreplace(heap, (-distance, counter, current))
+            counter += 1
+            dimension = depth % self.k
+            difference = query[dimension] - coordinates[dimension]
+            near, far = (current.left, current.right) if difference < 0 else (current.right, current.left)
+            if far is not None:
+                far_offsets = list(offsets)
+                far_offsets[dimension] = difference
+                far_distance = region_distance - offsets[dimension] ** 2 + difference ** 2
+                if len(heap) < k or far_distance < -heap[0][0]:
+                    stack.append((far, depth + 1, far_distance, far_offsets))
+            if near is not None:
+                stack.append((near, depth + 1, region_distance, offsets))
+        return [((-distance) ** 0.5, node) for distance, _, node in sorted(heap, reverse=True)]
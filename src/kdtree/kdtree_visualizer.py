@@ -1,5 +1,6 @@
 import matplotlib.pyplot as plt
 from .kdtree import KDTree, Point, Node
+from ..common.ingest import read_points
 from typing import Self, List
 import numpy as np
 from matplotlib.patches import Rectangle
@@ -150,10 +151,7 @@ class KDTreeVisualizer:
         self.clear_plot(None)
         self.points = []
         try:
-            with open(self.loadFilename, "r") as f:
-                for line in f:
-                    x, y = map(float, line.strip().split(","))
-                    self.points.append(Point(x, y))
+            self.points = [Point(x, y) for x, y in read_points(self.loadFilename).tolist()]
         except FileNotFoundError:
             return
             # print("File not found!")
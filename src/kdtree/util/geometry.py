@@ -2,11 +2,15 @@ from typing import Self, List
 
 class Point:
     """
-    Represents a K-dimensional point in space
+    Represents an immutable K-dimensional point in space
     
-    Arguments:
+    The class uses __slots__, so a point carries no __dict__. x and y are plain slots, so reading them costs no
+    Python call, the coordinates beyond the second are kept in the tuple _rest, which is the shared empty tuple
+    for 2-D points.
 
     """
+    __slots__ = ("x", "y", "_rest")
+
     def __init__(self, x: float,y: float,z: float = None,higher_dimensions: List[float] = None):
         """
         Initializes a Point object with the given coordinates.
@@ -18,25 +22,57 @@ class Point:
         - higher_dimensions (List[float], optional): Additional dimensions for K-dimensional points.
 
         """
+        if z is None:
+            rest = ()
+        elif higher_dimensions:
+            rest = (z, *higher_dimensions)
+        else:
+            rest = (z,)
+        object.__setattr__(self, "x", x)
+        object.__setattr__(self, "y", y)
+        object.__setattr__(self, "_rest", rest)
+
+    @classmethod
+    def from_coordinates(cls, coordinates) -> Self:
+        """
+        Creates a point from any sequence of at least two coordinates
+        """
+        coordinates = tuple(coordinates)
+        point = cls.__new__(cls)
+        object.__setattr__(point, "x", coordinates[0])
+        object.__setattr__(point, "y", coordinates[1])
+        object.__setattr__(point, "_rest", coordinates[2:])
+        return point
+
+    def __setattr__(self: Self, name: str, value) -> None:
+        raise AttributeError("Point is immutable")
+
+    def __delattr__(self: Self, name: str) -> None:
+        raise AttributeError("Point is immutable")
 
-        self.values = [x,y,z]
-        if higher_dimensions:
-            for element in higher_dimensions:
-                self.values.append(element) # To avoid adding None or errors when using *higher_dimensions
-        self.x = x
-        self.y = y
-        self.dimensions = len(self.values) if self.values[2] != None else 2
+    def __reduce__(self: Self):
+        # __setattr__ is blocked, so pickle and copy have to recreate the point through the constructor
+        return (self.__class__.from_coordinates, (self.values,))
+
+    @property
+    def dimensions(self: Self) -> int:
+        return 2 + len(self._rest)
+
+    @property
+    def values(self: Self) -> tuple:
+        """
+        The coordinates of the point as a tuple
+        """
+        return (self.x, self.y, *self._rest)
 
     def __str__(self: Self) -> str:
         """
         Returns a string representation of the point.
         """
-        if self.values[2] != None:
-            result = "("
-            for index, element in enumerate(self.values):
-                result = result + str(element) + ("," if index < self.dimensions-1 else ")")
-            return result 
-        return f"({self.x},{self.y})"
+        return "(" + ",".join(str(element) for element in self.values) + ")"
+
+    def __repr__(self: Self) -> str:
+        return self.__str__()
 
     def __eq__(self: Self, other: Self) -> bool:
         """
@@ -48,16 +84,12 @@ class Point:
         Returns:
         - Boolean if the points are equal or not
         """
-
-        if other.dimensions != self.dimensions or other is None or not isinstance(other,type(self)):
+        if not isinstance(other, Point):
             return False
-        if self.values[2] != None:
-            for index, value in enumerate(other.values):
-                if self.values[index] != value:
-                    return False
-            return True
-        else:
-            return self.x == other.x and self.y == other.y
+        return self.x == other.x and self.y == other.y and self._rest == other._rest
+
+    def __hash__(self: Self) -> int:
+        return hash(self.values)
     
     def __lt__(self: Self, other: Self) -> bool:
         """
@@ -78,15 +110,15 @@ class Point:
 
         """
         return self.x > other.x
+
+    def __len__(self: Self) -> int:
+        return 2 + len(self._rest)
     
-    def __iter__(self: Self) -> List[float]:
+    def __iter__(self: Self):
         """
         Allows iteration over the point's coordinates.
         """
-
-        if self.values[2] != None:
-            return self.values
-        return [self.x,self.y]
+        return iter(self.values)
     
     def __getitem__(self: Self,index: int) -> float:
         """
@@ -98,43 +130,14 @@ class Point:
         Returns:
         - value 
         """
-
-        if self.values[2] != None:
-            if index >= self.dimensions:
-                raise ValueError("Point index out of range")
+        if index == 0:
+            return self.x
+        if index == 1:
+            return self.y
+        try:
             return self.values[index]
-        else:
-            match index:
-                case 0:
-                    return self.x
-                case 1:
-                    return self.y
-                case _:
-                    raise ValueError("Point index out of range")
-    
-    def __setitem__(self: Self, index: int, value: float):
-        """
-        Modifies a specific coordinate by index.
-
-        Arguments:
-        - index - The index of the coordinate to modify.
-        - value - The new value for the coordinate.
-
-        """
-        if self.values[2] != None:
-            if index >= self.dimensions:
-                raise ValueError("Point index out of range")
-            self.values[index] = value
-        else:
-            match index:
-                case 0:
-                    self.x = value
-                    self.values[0] = value
-                case 1:
-                    self.y = value
-                    self.values[1] = value
-                case _:
-                    raise ValueError("Point index out of range")
+        except IndexError:
+            raise ValueError("Point index out of range")
 
               
 # class Area:
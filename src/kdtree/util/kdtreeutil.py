@@ -1,5 +1,7 @@
 from random import choice
 from typing import List
+import numpy as np
+from .geometry import Point
 
 def quickselect_median(l, dimension, pivot_function=choice):
     n = len(l)
@@ -142,4 +144,76 @@ def partition_array(array: List[tuple[float, float]], dimension: int):
     left = array[:i]  
     right = array[i+1:] 
 
-    return left, right, array[i]
\ No newline at end of file
+    return left, right, array[i]
+
+def point_to_array(point: Point, k: int) -> np.ndarray:
+    """
+    Converts a single point into a float64 vector of its first k coordinates
+    Parameters:
+    point - a Point object or any sequence of coordinates
+    k - the number of dimensions
+    Returns:
+    Array of shape (k,)
+    """
+    if isinstance(point, Point):
+        return np.array([point[i] for i in range(k)], dtype=np.float64)
+    return np.asarray(point, dtype=np.float64)[:k]
+
+def points_to_array(points, k: int) -> np.ndarray:
+    """
+    Converts a set of points into one contiguous float64 array without keeping any per-point objects
+    Parameters:
+    points - an (n, k) array, a list of Point objects or a list of coordinate tuples
+    k - the number of dimensions
+    Returns:
+    Array of shape (n, k)
+    """
+    if isinstance(points, np.ndarray):
+        array = np.ascontiguousarray(points, dtype=np.float64)
+    elif len(points) == 0:
+        return np.empty((0, k), dtype=np.float64)
+    elif isinstance(points[0], Point):
+        # Plain slot reads for the common 2-D case, one tuple per point otherwise
+        array = np.array([(point.x, point.y) for point in points] if k == 2 else [point.values[:k] for point in points], dtype=np.float64)
+    else:
+        array = np.asarray(points, dtype=np.float64)
+    if array.ndim != 2 or array.shape[1] < k:
+        raise ValueError(f"Expected an array of shape (n, {k}), got {array.shape}")
+    return np.ascontiguousarray(array[:, :k])
+
+def select_median(order: np.ndarray, coordinates: np.ndarray, lo: int, hi: int, dimension: int) -> int:
+    """
+    Rearranges order[lo:hi] in place, so that the point at the median position has the median value in the given dimension,
+    every point before it is less than or equal and every point after it is greater than or equal to it.
+    It uses introselect (np.argpartition), so it runs in O(hi - lo) time instead of sorting the whole range.
+    Parameters:
+    order - array of indices into coordinates, only the range [lo, hi) is modified
+    coordinates - (n, k) array of point coordinates
+    lo, hi - the range of order to be partitioned
+    dimension - the index of dimension from [0,k-1], which the points should be compared by
+    Returns:
+    The median position, (lo + hi) // 2
+    """
+    segment = order[lo:hi]
+    median = (hi - lo) // 2
+    order[lo:hi] = segment[np.argpartition(coordinates[segment, dimension], median)]
+    return lo + median
+
+def rectangles_to_arrays(rectangles, k: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Converts a batch of axis-aligned rectangles into arrays of their corners
+    Parameters:
+    rectangles - (q, 2, k) array, or a list of (lowerLeftPoint, upperRightPoint) pairs
+    k - the number of dimensions
+    Returns:
+    lows - (q, k) array of lower-left corners
+    highs - (q, k) array of upper-right corners
+    """
+    if isinstance(rectangles, np.ndarray):
+        array = np.asarray(rectangles, dtype=np.float64)
+        if array.ndim != 3 or array.shape[1] != 2 or array.shape[2] < k:
+            raise ValueError(f"Expected an array of shape (q, 2, {k}), got {array.shape}")
+        return np.ascontiguousarray(array[:, 0, :k]), np.ascontiguousarray(array[:, 1, :k])
+    lows = points_to_array([rectangle[0] for rectangle in rectangles], k)
+    highs = points_to_array([rectangle[1] for rectangle in rectangles], k)
+    return lows, highs
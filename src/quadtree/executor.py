@@ -0,0 +1,52 @@
+from __future__ import annotations
+from .util.Geometry import Area
+from ..common.sharedarrays import SnapshotPool, worker_snapshot
+from .linear_quadtree import LinearQuadtree
+from .quadtree import Quadtree
+from typing import Self
+import numpy as np
+
+def _areas_chunk(bounds: list[tuple[float, float, float, float]]) -> list[np.ndarray]:
+    tree = worker_snapshot()
+    return [tree.find_indices_in_area(Area.from_bounds(*area)) for area in bounds]
+
+
+class QuadtreeQueryExecutor(SnapshotPool):
+    """Answers batches of area queries on a pool of processes sharing one read-only snapshot.
+    
+    The points are encoded as a LinearQuadtree whose flat arrays are published in
+    multiprocessing.shared_memory once. Every worker attaches to them, so only the query
+    batches and the resulting index arrays cross process boundaries. The worker pool and the
+    shared memory are managed by SnapshotPool, use it as a context manager, or call close.
+    
+    Attributes:
+        snapshot: LinearQuadtree the queries run on, returned indices point into snapshot.xs and snapshot.ys
+        processes: Number of worker processes
+    """
+    def __init__(self, tree: Quadtree | LinearQuadtree, processes: int | None = None, chunk_size: int = 1024) -> None:
+        """
+        Args:
+            tree: Tree to be queried, a Quadtree is converted into a LinearQuadtree snapshot first
+            processes: Number of worker processes, os.cpu_count() by default
+            chunk_size: Number of areas sent to a worker at once
+        """
+        self.snapshot = tree.to_linear() if isinstance(tree, Quadtree) else tree
+        self.chunk_size = chunk_size
+        super().__init__(self.snapshot.to_arrays(), LinearQuadtree.from_arrays, processes)
+
+    def find_points_in_areas(self: Self, areas: list[Area]) -> tuple[np.ndarray, np.ndarray]:
+        """Find the points of a batch of areas in parallel.
+        
+        Args:
+            areas: Areas to search for points
+            
+        Returns:
+            offsets: Array of length len(areas) + 1, the answer to areas[i] is indices[offsets[i]:offsets[i+1]]
+            indices: Positions of the found points in the snapshot
+        """
+        bounds = [(area.bottom_left.x, area.bottom_left.y, area.upper_right.x, area.upper_right.y) for area in areas]
+        chunks = [bounds[start:start + self.chunk_size] for start in range(0, len(bounds), self.chunk_size)]
+        results = [indices for chunk in self.map(_areas_chunk, chunks) for indices in chunk]
+        offsets = np.zeros(len(results) + 1, dtype=np.int64)
+        np.cumsum([len(indices) for indices in results], out=offsets[1:])
+        return offsets, np.concatenate(results) if results else np.empty(0, dtype=np.int64)
@@ -0,0 +1,314 @@
+from __future__ import annotations
+from .util.Geometry import Area, Point
+from ..common.treefile import write_tree_file, read_tree_file
+from typing import Self
+import math
+import numpy as np
+
+# Number of bits per axis of the quantisation grid, the Morton codes take 2 * DEFAULT_BITS bits
+DEFAULT_BITS = 16
+# Maximum number of partially covered cells a query area is decomposed into before the remaining cells are filtered exactly
+MAX_PARTIAL_CELLS = 64
+# Number of levels a query area is refined below the coarsest level whose cells are at least as large as the area
+MAX_REFINE_LEVELS = 2
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Insert a zero bit between every two bits of 32-bit integers.
+
+    Args:
+        values: Array of non-negative integers smaller than 2**32
+
+    Returns:
+        uint64 array with the bits of values on even positions
+    """
+    values = values.astype(np.uint64) & np.uint64(0x00000000FFFFFFFF)
+    values = (values | (values << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    values = (values | (values << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    values = (values | (values << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    values = (values | (values << np.uint64(2))) & np.uint64(0x3333333333333333)
+    values = (values | (values << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return values
+
+def _interleave(column: int, row: int) -> int:
+    """Morton code of a single cell, the scalar counterpart of morton_codes."""
+    code = 0
+    bit = 0
+    while(column >> bit or row >> bit):
+        code |= ((column >> bit & 1) << 2 * bit) | ((row >> bit & 1) << 2 * bit + 1)
+        bit += 1
+    return code
+
+def morton_codes(cells_x: np.ndarray, cells_y: np.ndarray) -> np.ndarray:
+    """Calculate Z-order (Morton) codes of grid cells.
+
+    Args:
+        cells_x: Column indices of the cells
+        cells_y: Row indices of the cells
+
+    Returns:
+        uint64 array of codes with the x bits on even and the y bits on odd positions
+    """
+    return _spread_bits(cells_x) | (_spread_bits(cells_y) << np.uint64(1))
+
+
+class LinearQuadtree:
+    """A pointer-free quadtree that keeps points sorted by their Morton code in flat arrays.
+
+    The bounding area is divided into a 2**bits x 2**bits grid and every point is keyed by the
+    Z-order code of its cell. Every quadtree node then corresponds to a contiguous range of codes,
+    so a range query decomposes the searched area into code intervals and resolves each of them
+    with a binary search over the sorted keys.
+
+    Attributes:
+        area: Area covered by the quantisation grid
+        bits: Number of bits per axis of the grid
+        codes: Sorted Morton codes of the points
+        xs: x-coordinates of the points in code order
+        ys: y-coordinates of the points in code order
+        ids: Rows of the points in the array or positions in the list the tree was built from,
+            in code order, duplicates keep the row of their first occurrence
+    """
+    def __init__(self, points: list[Point] = [], default_area: Area = None, bits: int = DEFAULT_BITS) -> None:
+        coordinates = np.array([(point.x, point.y) for point in points], dtype=np.float64).reshape(-1, 2)
+        self._build(coordinates, default_area, bits)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray, default_area: Area = None, bits: int = DEFAULT_BITS) -> LinearQuadtree:
+        """Build a linear quadtree directly from an (n, 2) array of coordinates.
+
+        Args:
+            array: (n, 2) array of point coordinates
+            default_area: Area to build the grid over, it is extended to cover all points
+            bits: Number of bits per axis of the grid
+
+        Returns:
+            The built tree
+        """
+        tree = cls.__new__(cls)
+        tree._build(np.asarray(array, dtype=np.float64).reshape(-1, 2), default_area, bits)
+        return tree
+
+    def _build(self: Self, coordinates: np.ndarray, default_area: Area | None, bits: int) -> None:
+        """Quantise the points, compute their codes and sort all arrays by code.
+
+        Args:
+            coordinates: (n, 2) array of point coordinates
+            default_area: Area to build the grid over
+            bits: Number of bits per axis of the grid
+        """
+        if(not 1 <= bits <= 31):
+            raise ValueError("bits has to be between 1 and 31")
+        # Duplicates are stored once, the same way as in the point sets of Quadtree
+        coordinates, rows = np.unique(coordinates, axis=0, return_index=True)
+        self.bits = bits
+        if(len(coordinates) == 0 and default_area is None):
+            self.area = None
+        else:
+            low = coordinates.min(axis=0) if len(coordinates) else np.full(2, np.inf)
+            high = coordinates.max(axis=0) if len(coordinates) else np.full(2, -np.inf)
+            if(default_area is not None):
+                low = np.minimum(low, [default_area.bottom_left.x, default_area.bottom_left.y])
+                high = np.maximum(high, [default_area.upper_right.x, default_area.upper_right.y])
+            self.area = Area(Point(float(low[0]), float(low[1])), Point(float(high[0]), float(high[1])))
+        cells_x, cells_y = self._cells(coordinates[:, 0], coordinates[:, 1])
+        codes = morton_codes(cells_x, cells_y)
+        order = np.argsort(codes, kind="stable")
+        self.codes = codes[order]
+        self.xs = np.ascontiguousarray(coordinates[order, 0])
+        self.ys = np.ascontiguousarray(coordinates[order, 1])
+        self.ids = rows[order].astype(np.int64)
+
+    def __len__(self: Self) -> int:
+        return len(self.codes)
+
+    def to_arrays(self: Self) -> dict[str, np.ndarray]:
+        """Return the flat arrays the tree consists of.
+        
+        Returns:
+            Dictionary of arrays, from_arrays restores the tree from it
+        """
+        bounds = (np.full(4, np.nan) if self.area is None else
+                  np.array([self.area.bottom_left.x, self.area.bottom_left.y, self.area.upper_right.x, self.area.upper_right.y]))
+        return {"codes": self.codes, "xs": self.xs, "ys": self.ys, "ids": self.ids, "bounds": bounds,
+                "bits": np.array([self.bits], dtype=np.int64)}
+
+    @classmethod
+    def from_arrays(cls, arrays: dict[str, np.ndarray]) -> LinearQuadtree:
+        """Create a tree over existing arrays without copying them.
+        
+        The arrays can live in shared or memory-mapped buffers.
+        
+        Args:
+            arrays: Arrays returned by to_arrays
+            
+        Returns:
+            The restored tree
+        """
+        tree = cls.__new__(cls)
+        bounds = [float(value) for value in arrays["bounds"]]
+        tree.area = None if np.isnan(bounds[0]) else Area(Point(bounds[0], bounds[1]), Point(bounds[2], bounds[3]))
+        tree.bits = int(arrays["bits"][0])
+        tree.codes = arrays["codes"]
+        tree.xs = arrays["xs"]
+        tree.ys = arrays["ys"]
+        ids = arrays.get("ids")
+        tree.ids = np.arange(len(tree.codes), dtype=np.int64) if ids is None else ids
+        return tree
+
+    def save(self: Self, path: str) -> None:
+        """Write the tree into a binary tree file, see common.treefile for the layout.
+        
+        Args:
+            path: Path of the file
+        """
+        write_tree_file(path, "LinearQuadtree", self.to_arrays())
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> LinearQuadtree:
+        """Open a tree written by save without rebuilding it.
+        
+        Args:
+            path: Path of the file
+            mmap: Map the arrays read-only from the file, so opening takes constant time and the
+                pages are shared between processes, instead of reading them into memory
+            
+        Returns:
+            The restored tree
+        """
+        _, arrays, _ = read_tree_file(path, "LinearQuadtree", mmap)
+        return cls.from_arrays(arrays)
+
+    def _cell_size(self: Self) -> tuple[float, float]:
+        """Width and height of one grid cell."""
+        side = float(1 << self.bits)
+        width = (self.area.upper_right.x - self.area.bottom_left.x) / side
+        height = (self.area.upper_right.y - self.area.bottom_left.y) / side
+        return (width if width > 0 else 1.0), (height if height > 0 else 1.0)
+
+    def _cells(self: Self, xs: np.ndarray, ys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Grid cells of the given coordinates, points on the upper edge belong to the last cell.
+
+        Args:
+            xs: x-coordinates
+            ys: y-coordinates
+
+        Returns:
+            Column and row indices of the cells
+        """
+        if(len(xs) == 0):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        width, height = self._cell_size()
+        last = (1 << self.bits) - 1
+        cells_x = np.clip(np.floor((xs - self.area.bottom_left.x) / width), 0, last).astype(np.int64)
+        cells_y = np.clip(np.floor((ys - self.area.bottom_left.y) / height), 0, last).astype(np.int64)
+        return cells_x, cells_y
+
+    def _decompose(self: Self, area: Area) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Decompose the searched area into Z-order code intervals.
+
+        Grid cells strictly between the cells of the area edges contain only points inside the
+        area. Quadtree cells covered by them become exact intervals, cells crossing the edges are
+        refined level by level and have to be filtered. The refinement starts at the coarsest level
+        whose cells are at least as large as the area, at most four of them overlap it, and stops
+        after MAX_REFINE_LEVELS levels or once MAX_PARTIAL_CELLS is reached. The cells crossing the
+        edges are then about 1/2**MAX_REFINE_LEVELS of the area wide, and the intervals are built
+        from a bounded number of cells whatever the size of the area and the number of bits.
+
+        Args:
+            area: Area to decompose
+
+        Returns:
+            starts: First codes of the intervals
+            ends: Last codes of the intervals
+            exact: Whether all points of an interval lie inside the area
+        """
+        width, height = self._cell_size()
+        side = 1 << self.bits
+
+        def cell(value: float, origin: float, size: float, last: int) -> int:
+            # Plain floats, a query touches only a handful of scalars and NumPy calls would dominate its cost
+            return math.floor(min(max((value - origin) / size, -1.0), float(last)))
+
+        # Clamping keeps the indices small and does not change which cells are inside,
+        # the lower edge can not pass the last cell since points on the upper grid edge are clamped into it
+        low_x = cell(area.bottom_left.x, self.area.bottom_left.x, width, side - 1)
+        low_y = cell(area.bottom_left.y, self.area.bottom_left.y, height, side - 1)
+        high_x = cell(area.upper_right.x, self.area.bottom_left.x, width, side)
+        high_y = cell(area.upper_right.y, self.area.bottom_left.y, height, side)
+        # Points at the upper edge of the grid are clamped into the last cell
+        if(area.upper_right.x >= self.area.upper_right.x):
+            high_x = side
+        if(area.upper_right.y >= self.area.upper_right.y):
+            high_y = side
+
+        intervals = []
+        # Cells are (code prefix, column, row), a cell on level L spans 2**(bits - L) grid cells per axis
+        extent = max(min(high_x, side - 1) - max(low_x, 0), min(high_y, side - 1) - max(low_y, 0)) + 1
+        first_level = max(self.bits - (extent - 1).bit_length(), 0)
+        shift = self.bits - first_level
+        level_cells = [(_interleave(column, row), column, row)
+                       for column in range(max(low_x, 0) >> shift, (min(high_x, side - 1) >> shift) + 1)
+                       for row in range(max(low_y, 0) >> shift, (min(high_y, side - 1) >> shift) + 1)]
+        for level in range(first_level, self.bits + 1):
+            partial = []
+            span = 1 << (self.bits - level)
+            for prefix, column, row in level_cells:
+                first_x, last_x = column * span, (column + 1) * span - 1
+                first_y, last_y = row * span, (row + 1) * span - 1
+                if(last_x < low_x or first_x > high_x or last_y < low_y or first_y > high_y):
+                    continue
+                shift = 2 * (self.bits - level)
+                interval = (prefix << shift, ((prefix + 1) << shift) - 1)
+                if(low_x < first_x and last_x < high_x and low_y < first_y and last_y < high_y):
+                    intervals.append((*interval, True))
+                else:
+                    partial.append((prefix, column, row))
+            if(level == self.bits or level - first_level == MAX_REFINE_LEVELS or 4 * len(partial) > MAX_PARTIAL_CELLS):
+                shift = 2 * (self.bits - level)
+                intervals.extend(((prefix << shift), ((prefix + 1) << shift) - 1, False) for prefix, _, _ in partial)
+                break
+            level_cells = [(4 * prefix + quadrant, 2 * column + (quadrant & 1), 2 * row + (quadrant >> 1))
+                           for prefix, column, row in partial for quadrant in range(4)]
+        intervals.sort()
+        starts = np.array([interval[0] for interval in intervals], dtype=np.uint64)
+        ends = np.array([interval[1] for interval in intervals], dtype=np.uint64)
+        exact = np.array([interval[2] for interval in intervals], dtype=bool)
+        return starts, ends, exact
+
+    def find_indices_in_area(self: Self, area: Area) -> np.ndarray:
+        """Find the positions of all points contained within the given area.
+
+        Args:
+            area: Area to search for points
+
+        Returns:
+            int64 array of positions into xs, ys and codes
+        """
+        if(self.area is None or len(self.codes) == 0 or not self.area.intersects_with_area(area)):
+            return np.empty(0, dtype=np.int64)
+        starts, ends, exact = self._decompose(area)
+        firsts = np.searchsorted(self.codes, starts, side="left")
+        lengths = np.searchsorted(self.codes, ends, side="right") - firsts
+        # Concatenate the ranges [first, first + length) of all intervals without a Python loop
+        shifts = firsts - (np.cumsum(lengths) - lengths)
+        indices = np.arange(lengths.sum(), dtype=np.int64) + np.repeat(shifts, lengths)
+        check = np.repeat(~exact, lengths)
+        xs, ys = self.xs[indices[check]], self.ys[indices[check]]
+        check[check] = ~((xs >= area.bottom_left.x) & (xs <= area.upper_right.x) &
+                         (ys >= area.bottom_left.y) & (ys <= area.upper_right.y))
+        return indices[~check]
+
+    def find_points_in_area(self: Self, area: Area, return_ids: bool = False) -> list[Point] | np.ndarray:
+        """Find all points contained within the given area.
+
+        Args:
+            area: Area to search for points
+            return_ids: Return the rows of the points instead of the points, see ids
+
+        Returns:
+            List of points contained within the area, or an int64 array of their rows
+        """
+        indices = self.find_indices_in_area(area)
+        if(return_ids):
+            return self.ids[indices]
+        return list(map(Point, self.xs[indices].tolist(), self.ys[indices].tolist()))
@@ -1,7 +1,32 @@
 from __future__ import annotations
 # Deleted . from util
-from .util.Geometry import Area, Point
-from typing import Self
+from .util.Geometry import Area, Point, PointArray, areas_to_array
+from .linear_quadtree import LinearQuadtree, DEFAULT_BITS
+from ..common.batch import group_by_query
+from ..common.treefile import write_tree_file, read_tree_file
+from ..common.ingest import iter_point_chunks, CHUNK_SIZE
+from ..common.stats import TraversalStats, histogram
+from ..common.querycache import QueryCache
+from typing import Self, Iterator
+import heapq
+import sys
+import numpy as np
+
+# Depth at which nodes stop being split. The leaves there are overflow buckets holding any number
+# of points, so clusters of nearly coincident points can not build long chains of nodes.
+DEFAULT_MAX_DEPTH = 32
+# Subtrees with at most this many points are tested by find_points_in_areas as one block instead of node by node
+BATCH_BLOCK_SIZE = 32
+# Leaf capacities tried by tune_max_cardinality
+AUTO_CANDIDATES = (1, 2, 4, 8, 16, 32, 64)
+# Number of points tune_max_cardinality builds its trial trees from
+AUTO_SAMPLE_SIZE = 4096
+# Fraction of the bounding area covered by a trial query of tune_max_cardinality
+AUTO_QUERY_FRACTION = 0.01
+# Cost of visiting a node relative to testing a single point, measured on uniform and clustered data
+AUTO_NODE_COST = 4
+# A larger capacity is preferred while its query cost is at most this much above the cheapest one
+AUTO_TOLERANCE = 0.1
 
 class QuadtreeNode:
     """A node in the quadtree data structure.
@@ -14,13 +39,25 @@ class QuadtreeNode:
         children: List of four child nodes (NW, NE, SW, SE)
         has_children: Whether this node has been subdivided
         max_cardinality: Maximum number of points before subdivision
+        size: Number of points in the subtree rooted at this node
+        leaf_only: Whether only leaves store points. By default every node keeps the points
+            of its whole subtree, which costs O(n * depth) memory but lets a fully covered
+            node report its points at once.
+        depth: Depth of this node, the root has depth 0
+        max_depth: Depth at which nodes are no longer subdivided, a leaf there keeps every
+            point that reaches it regardless of max_cardinality
     """
-    def __init__(self: Self, max_cardinality: int, area: Area | None = None, points: list[Point] = []) -> None:
+    def __init__(self: Self, max_cardinality: int, area: Area | None = None, points: list[Point] = [],
+                 leaf_only: bool = False, depth: int = 0, max_depth: int = DEFAULT_MAX_DEPTH) -> None:
         self.points: set[Point] = set()
+        self.size: int = 0
         self.area: Area | None = area
         self.children: list[QuadtreeNode] = [[] for _ in range(4)]
         self.has_children: bool = False
         self.max_cardinality: int = max_cardinality
+        self.leaf_only: bool = leaf_only
+        self.depth: int = depth
+        self.max_depth: int = max_depth
         self.insert(points) 
 
     def insert(self: Self, points: set[Point]) -> None:
@@ -31,14 +68,106 @@ class QuadtreeNode:
         """
         
         if(self.area == None): self.area = self._get_minimal_area(points)
+        if(self.leaf_only and self.has_children):
+            self._distribute_points(points)
+            self._update_size()
+            return
         self.points.update(points)
-        if(len(self.points) <= self.max_cardinality):
+        self.size = len(self.points)
+        if(len(self.points) <= self.max_cardinality or self.depth >= self.max_depth):
             return
 
         if(not self.has_children):
             self._subdivide()
+            if(self.leaf_only):
+                # Every point has been handed down to the children
+                self.points = set()
+                self._update_size()
+                return
         self._distribute_points(points)
 
+    def remove(self: Self, point: Point) -> bool:
+        """Remove a point from the subtree of this node.
+        
+        The point is removed from every node on its path. Subtrees that fall to at most
+        max_cardinality points are merged back into a single leaf.
+        
+        Args:
+            point: Point to remove
+            
+        Returns:
+            True if the point was stored in the subtree
+        """
+        if(not self.leaf_only and point not in self.points):
+            return False
+        path = []
+        node = self
+        while node is not None and node.has_children:
+            path.append(node)
+            node = node._child_containing(point)
+        if(node is not None):
+            if(point not in node.points):
+                return False
+            node.points.discard(point)
+            node.size = len(node.points)
+        elif(self.leaf_only):
+            return False
+        for ancestor in reversed(path):
+            if(self.leaf_only):
+                ancestor._update_size()
+            else:
+                ancestor.points.discard(point)
+                ancestor.size = len(ancestor.points)
+            if(ancestor.size <= ancestor.max_cardinality):
+                ancestor._merge()
+        return True
+
+    def _child_containing(self: Self, point: Point) -> QuadtreeNode | None:
+        """Find the child a point belongs to, using the same order as _distribute_points.
+        
+        Args:
+            point: Point to locate
+            
+        Returns:
+            The child node or None if the point lies outside of this node
+        """
+        for child in self.children:
+            if child.area.contains_point(point):
+                return child
+        return None
+
+    def _merge(self: Self) -> None:
+        """Turn an internal node back into a leaf holding all points of its subtree."""
+        if(not self.has_children):
+            return
+        self.points = set(self.all_points())
+        self.size = len(self.points)
+        self.children = [[] for _ in range(4)]
+        self.has_children = False
+
+    def _update_size(self: Self) -> None:
+        """Recompute the subtree size of an internal node from its children."""
+        self.size = sum(child.size for child in self.children)
+
+    def all_points(self: Self) -> set[Point] | list[Point]:
+        """Return every point stored in the subtree of this node.
+        
+        Returns:
+            The point set of the node, or the points collected from its leaves when
+            internal nodes do not store points
+        """
+        if(not self.leaf_only or not self.has_children):
+            return self.points
+        result = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if(node.has_children):
+                stack.extend(node.children)
+            else:
+                result.extend(node.points)
+        return result
+
     def _subdivide(self: Self) -> None:
         """Create four child nodes by subdividing current area.
         
@@ -47,21 +176,28 @@ class QuadtreeNode:
         if self.has_children:
             return
         
+        # Initialize child nodes with incremented depth
+        self.children = [QuadtreeNode(self.max_cardinality, area, leaf_only=self.leaf_only,
+                                      depth=self.depth + 1, max_depth=self.max_depth) for area in self._child_areas()]
+        self._distribute_points(self.points)
+        self.has_children = True
+
+    def _child_areas(self: Self) -> list[Area]:
+        """Split the area of this node into four equal quadrants.
+        
+        Returns:
+            Areas of the children in the order SW, NW, SE, NE
+        """
         x_mid = (self.area.bottom_left.x + self.area.upper_right.x) / 2
         y_mid = (self.area.bottom_left.y + self.area.upper_right.y) / 2
         
         # Create areas for children (NW, NE, SW, SE)
-        areas = [
+        return [
             Area(self.area.bottom_left, Point(x_mid, y_mid)),                                    # SW
             Area(Point(self.area.bottom_left.x, y_mid), Point(x_mid, self.area.upper_right.y)),  # NW
             Area(Point(x_mid, self.area.bottom_left.y), Point(self.area.upper_right.x, y_mid)),   # SE
             Area(Point(x_mid, y_mid), self.area.upper_right)                                    # NE
         ]
-        
-        # Initialize child nodes with incremented depth
-        self.children = [QuadtreeNode(self.max_cardinality, area) for area in areas]
-        self._distribute_points(self.points)
-        self.has_children = True
     
     def _distribute_points(self: Self, points: list[Point]) -> None:
         """Distribute points among child nodes.
@@ -97,47 +233,749 @@ class Quadtree:
     """A quadtree data structure for efficient 2D point lookup.
     
     Attributes:
-        max_cardinality: Maximum number of points in a node before subdivision
+        max_cardinality: Maximum number of points in a node before subdivision, "auto" picks it
+            from a sample of the points with tune_max_cardinality
+        max_depth: Depth at which nodes are no longer subdivided, see QuadtreeNode
         root: Root node of the quadtree
         base_area: A default 2D area, where points of Quadtree can be distributed. If not provided,
         Quadtree will determine it by selecting the minimal area spanned by points.
+        leaf_only: Store points only in leaves instead of in every node on their path
+        stats: TraversalStats collector filled by builds, inserts and all queries, None turns
+            collection off
+        generation: Mutation counter increased by insert and by every successful removal. Changes
+            made directly through root bypass it.
+        cache: QueryCache for the results of find_points_in_area, None turns caching off
+        ids: Row of every stored point in the array or list the tree was built from, points inserted
+            later continue the numbering and moved points keep their row. Queries can return these
+            rows instead of Points.
+        next_id: Row the next inserted point gets
     """
-    def __init__(self, points: list[Point] = [], max_cardinality: int = 1, default_area: Area=None) -> None:
+    def __init__(self, points: list[Point] = [], max_cardinality: int | str = 1, default_area: Area=None,
+                 leaf_only: bool = False, stats: TraversalStats | None = None, cache: QueryCache | None = None,
+                 max_depth: int = DEFAULT_MAX_DEPTH) -> None:
+        if(max_depth < 0):
+            raise ValueError("max_depth can not be negative")
+        if(max_cardinality == "auto"):
+            coordinates = np.array([(point.x, point.y) for point in points], dtype=np.float64).reshape(-1, 2)
+            max_cardinality = tune_max_cardinality(coordinates, max_depth=max_depth, leaf_only=leaf_only)
         self.max_cardinality = max_cardinality
-        self.root = QuadtreeNode(points=points, max_cardinality=max_cardinality, area=default_area)
+        self.max_depth = max_depth
+        self.leaf_only = leaf_only
+        self.root = QuadtreeNode(points=points, max_cardinality=max_cardinality, area=default_area, leaf_only=leaf_only,
+                                 max_depth=max_depth)
+        self.stats = stats
+        self.generation = 0
+        self.cache = cache
+        # Duplicates are stored once and keep the row of their first occurrence
+        self.ids: dict[Point, int] = {}
+        for row, point in enumerate(points):
+            self.ids.setdefault(point, row)
+        self.next_id = len(points)
+        # Flattened node arrays tagged with the generation they were made on, see _flatten
+        self._flat = None
+        self._record_build()
 
-    def find_points_in_area(self: Self, area: Area) -> list[Point]:
-        """Find all points contained within the given area.
+    def _record_build(self: Self) -> None:
+        """Count a finished build and the nodes it created."""
+        if(self.stats is not None):
+            self.stats.builds += 1
+            self.stats.nodes_visited += sum(1 for _ in self._iter_nodes())
+
+    def _iter_nodes(self: Self):
+        """Iterate over all nodes of the tree together with their depths.
+        
+        Yields:
+            Pairs of (node, depth)
+        """
+        stack = [(self.root, 0)]
+        while stack:
+            node, depth = stack.pop()
+            yield node, depth
+            if(node.has_children):
+                stack.extend((child, depth + 1) for child in node.children)
+
+    def insert(self: Self, points: list[Point]) -> None:
+        """Insert points into the quadtree.
+        
+        Points outside of the root area make the tree grow until they are covered, see _grow.
         
         Args:
-            area: Area to search for points
+            points: Points to insert
+        """
+        if(self.root.area is not None):
+            outside = [point for point in points if not self.root.area.contains_point(point)]
+            if(outside):
+                self._grow(outside)
+        for point in points:
+            if(point not in self.ids):
+                self.ids[point] = self.next_id
+                self.next_id += 1
+        self.root.insert(points)
+        self.generation += 1
+        if(self.stats is not None):
+            # The nodes on the path of every point are the nodes its insertion has visited
+            self.stats.inserts += len(points)
+            for point in points:
+                node = self.root
+                while node is not None:
+                    self.stats.nodes_visited += 1
+                    node = node._child_containing(point) if node.has_children else None
+
+    def _grow(self: Self, points: list[Point]) -> None:
+        """Enlarge the root area until it covers the given points and rebuild the tree over it.
+        
+        The area is doubled toward the points, so objects drifting away from the initial
+        area trigger only logarithmically many rebuilds. The stored Point objects are reused,
+        so their rows stay the same.
+        
+        Args:
+            points: Points outside of the root area
+        """
+        area = self.root.area
+        low_x, low_y = area.bottom_left.x, area.bottom_left.y
+        high_x, high_y = area.upper_right.x, area.upper_right.y
+        target_low_x, target_high_x = min(point.x for point in points), max(point.x for point in points)
+        target_low_y, target_high_y = min(point.y for point in points), max(point.y for point in points)
+        # A side of zero length, e.g. of a root around a single point, takes the length of the
+        # other side or the distance to the points
+        span = (max(high_x - low_x, high_y - low_y) or
+                max(low_x - target_low_x, target_high_x - high_x, low_y - target_low_y, target_high_y - high_y))
+        width = high_x - low_x or span
+        height = high_y - low_y or span
+        while(target_low_x < low_x or target_high_x > high_x or target_low_y < low_y or target_high_y > high_y):
+            if(target_low_x < low_x):
+                low_x -= width
+            else:
+                high_x += width
+            if(target_low_y < low_y):
+                low_y -= height
+            else:
+                high_y += height
+            width, height = 2 * width, 2 * height
+        stored = list(self.root.all_points())
+        self.root = QuadtreeNode(self.max_cardinality, Area.from_bounds(low_x, low_y, high_x, high_y),
+                                 leaf_only=self.leaf_only, max_depth=self.max_depth)
+        self._bulk_load(stored, np.array([(point.x, point.y) for point in stored], dtype=np.float64).reshape(-1, 2))
+        self._record_build()
+
+    def remove(self: Self, point: Point) -> bool:
+        """Remove a point from the quadtree.
+        
+        Args:
+            point: Point to remove
             
         Returns:
-            List of points contained within the area
+            True if the point was found and removed
         """
-        result = []
-        self._find_points_in_area(area,result,self.root)
-        return result
-    
-    def _find_points_in_area(self: Self, search_area: Area, result: list[Point], 
-                            node: QuadtreeNode) -> None:
-        """Recursive helper function for finding points in an area.
+        if(self.root.area is None or not self.root.remove(point)):
+            return False
+        self.generation += 1
+        self.ids.pop(point, None)
+        return True
+
+    def move(self: Self, old: Point, new: Point) -> bool:
+        """Move a stored point to a new position without rebuilding the tree.
+        
+        A new position outside of the root area makes the tree grow, see insert.
         
         Args:
-            search_area: Area to search within
-            result: List to store found points
-            node: Current node being searched
+            old: Current position of the point
+            new: New position of the point
+            
+        Returns:
+            True if the old point was found and moved
         """
-        if(search_area.contains_area(node.area)):
-            result.extend(node.points)
+        return self.move_points([(old, new)]) == 1
+
+    def remove_points(self: Self, points: list[Point]) -> int:
+        """Remove many points from the quadtree.
+        
+        Args:
+            points: Points to remove
+            
+        Returns:
+            Number of removed points
+        """
+        return sum(self.remove(point) for point in points)
+
+    def move_points(self: Self, moves: list[tuple[Point, Point]]) -> int:
+        """Move many points, e.g. all tracked objects after one simulation tick.
+        
+        All old positions are removed before the new ones are inserted, so points
+        swapping positions do not interfere with each other.
+        
+        Args:
+            moves: Pairs of (old, new) positions
+            
+        Returns:
+            Number of moved points
+        """
+        moved = []
+        kept_ids = []
+        for old, new in moves:
+            index = self.ids.get(old)
+            if(self.remove(old)):
+                moved.append(new)
+                kept_ids.append((new, index))
+        # A moved point keeps its row unless it lands on a point that is already stored
+        for new, index in kept_ids:
+            self.ids.setdefault(new, index)
+        if(moved):
+            self.insert(moved)
+        return len(moved)
+
+    @classmethod
+    def from_array(cls, array: np.ndarray, max_cardinality: int | str = 1, default_area: Area = None,
+                   leaf_only: bool = False, stats: TraversalStats | None = None,
+                   max_depth: int = DEFAULT_MAX_DEPTH, cache: QueryCache | None = None) -> Quadtree:
+        """Bulk-load a quadtree from an (n, 2) array of coordinates.
+        
+        Instead of inserting the points one by one, the tree is built breadth-first and the
+        points of every node are split into quadrants with vectorised masks over an index
+        array. The resulting tree has the same shape as the one built by the constructor.
+        
+        Args:
+            array: (n, 2) array of point coordinates
+            max_cardinality: Maximum number of points in a node before subdivision, or "auto"
+            default_area: Area of the root node, the minimal bounding area of the points if not given
+            leaf_only: Store points only in leaves
+            stats: TraversalStats collector of the tree
+            max_depth: Depth at which nodes are no longer subdivided
+            cache: QueryCache of the tree
+            
+        Returns:
+            The built quadtree
+        """
+        array = np.asarray(array, dtype=np.float64).reshape(-1, 2)
+        # Duplicates are stored once and keep the row of their first occurrence
+        coordinates, rows = np.unique(array, axis=0, return_index=True)
+        if(max_cardinality == "auto"):
+            max_cardinality = tune_max_cardinality(coordinates, max_depth=max_depth, leaf_only=leaf_only)
+        tree = cls([], max_cardinality=max_cardinality, default_area=default_area, leaf_only=leaf_only,
+                   max_depth=max_depth, cache=cache)
+        tree.stats = stats
+        points = [Point(x, y) for x, y in coordinates.tolist()]
+        tree.ids = dict(zip(points, rows.tolist()))
+        tree.next_id = len(array)
+        tree._bulk_load(points, coordinates)
+        tree._record_build()
+        return tree
+
+    def _bulk_load(self: Self, points: list[Point], coordinates: np.ndarray) -> None:
+        """Fill the empty root with distinct points breadth-first.
+        
+        The points of every node are split into quadrants with vectorised masks over an
+        index array, which gives the same tree as inserting them one by one.
+        
+        Args:
+            points: Points to store, without duplicates
+            coordinates: (n, 2) array with the coordinates of the points
+        """
+        if(len(points) == 0):
+            return
+        xs, ys = coordinates[:, 0], coordinates[:, 1]
+        root = self.root
+        max_cardinality, max_depth, leaf_only = self.max_cardinality, self.max_depth, self.leaf_only
+        if(root.area is None):
+            root.area = Area(Point(xs.min(), ys.min()), Point(xs.max(), ys.max()))
+            inside = np.arange(len(points))
+        else:
+            inside = np.flatnonzero((xs >= root.area.bottom_left.x) & (xs <= root.area.upper_right.x) &
+                                    (ys >= root.area.bottom_left.y) & (ys <= root.area.upper_right.y))
+        # The root keeps even the points outside of its area, just as QuadtreeNode.insert does
+        root.points = set(points)
+        root.size = len(points)
+        level = [(root, inside)] if len(points) > max_cardinality and max_depth > 0 else []
+        while level:
+            next_level = []
+            for node, indices in level:
+                children = [QuadtreeNode(max_cardinality, area, leaf_only=leaf_only, depth=node.depth + 1, max_depth=max_depth)
+                            for area in node._child_areas()]
+                x_mid = children[0].area.upper_right.x
+                y_mid = children[0].area.upper_right.y
+                # Points on a split line belong to the first matching child of the order SW, NW, SE, NE
+                west = xs[indices] <= x_mid
+                south = ys[indices] <= y_mid
+                masks = [west & south, west & ~south, ~west & south, ~west & ~south]
+                for child, mask in zip(children, masks):
+                    child_indices = indices[mask]
+                    child.size = len(child_indices)
+                    split = child.size > max_cardinality and child.depth < max_depth
+                    if(split):
+                        next_level.append((child, child_indices))
+                    if(not leaf_only or not split):
+                        child.points = {points[index] for index in child_indices.tolist()}
+                node.children = children
+                node.has_children = True
+                if(leaf_only):
+                    node.points = set()
+                    node._update_size()
+            level = next_level
+
+    @classmethod
+    def from_file(cls, path: str, max_cardinality: int | str = 1, default_area: Area = None, leaf_only: bool = False,
+                  chunk_size: int = CHUNK_SIZE, fmt: str = None, delimiter: str = ",", skip_rows: int = 0,
+                  max_depth: int = DEFAULT_MAX_DEPTH, cache: QueryCache | None = None) -> Quadtree:
+        """Build a quadtree by streaming the points of a CSV, .npy or raw float64 file chunk by chunk.
+        
+        Only one parsed chunk is held next to the tree at a time. Without a default area the
+        file is read twice, first to find the bounding area of all points, so that no point
+        falls outside of the root.
+        
+        Args:
+            path: Path of the file
+            max_cardinality: Maximum number of points in a node before subdivision, "auto" tunes
+                it on the first chunk of the file
+            default_area: Area of the root node
+            leaf_only: Store points only in leaves
+            chunk_size: Maximal number of points parsed at once
+            fmt: "csv", "npy" or "raw", guessed from the extension by default
+            delimiter: Separator of the values in a text file
+            skip_rows: Number of header lines of a text file
+            max_depth: Depth at which nodes are no longer subdivided
+            cache: QueryCache of the tree
+            
+        Returns:
+            The built quadtree
+        """
+        def chunks():
+            return iter_point_chunks(path, 2, chunk_size, fmt, delimiter, skip_rows)
+        if(default_area is None):
+            low, high = np.full(2, np.inf), np.full(2, -np.inf)
+            for chunk in chunks():
+                low = np.minimum(low, chunk.min(axis=0))
+                high = np.maximum(high, chunk.max(axis=0))
+            if(low[0] <= high[0]):
+                default_area = Area.from_bounds(*low.tolist(), *high.tolist())
+        if(max_cardinality == "auto"):
+            first = next(iter(chunks()), np.empty((0, 2)))
+            max_cardinality = tune_max_cardinality(first, max_depth=max_depth, leaf_only=leaf_only)
+        tree = cls([], max_cardinality=max_cardinality, default_area=default_area, leaf_only=leaf_only,
+                   max_depth=max_depth, cache=cache)
+        # Points are numbered by their line or row in the file, duplicates keep the row of their first occurrence
+        tree.ids = {}
+        offset = 0
+        for chunk in chunks():
+            # One Point object per point, shared by all nodes on its path
+            points = list(PointArray(chunk))
+            for row, point in enumerate(points, offset):
+                tree.ids.setdefault(point, row)
+            offset += len(points)
+            tree.next_id = offset
+            tree.insert(points)
+        return tree
+
+    def to_linear(self: Self, bits: int = DEFAULT_BITS) -> LinearQuadtree:
+        """Create an immutable array-encoded snapshot of the stored points.
         
-        elif(node.area.intersects_with_area(search_area)):
+        Args:
+            bits: Number of bits per axis of the Morton grid
+            
+        Returns:
+            LinearQuadtree holding the same points over the area of the root
+        """
+        return LinearQuadtree(list(self.root.all_points()), default_area=self.root.area, bits=bits)
+
+    def save(self: Self, path: str) -> None:
+        """Write the tree with its exact structure into a binary tree file.
+        
+        The nodes are stored in breadth-first order as flat arrays: the bounds of every node,
+        the index of its first child (the four children are consecutive, -1 for a leaf) and
+        the range of its subtree in the point array. The points are ordered so that every
+        subtree occupies a contiguous range, points outside of the root area come last.
+        The rows of the points are stored next to them. See common.treefile for the file layout.
+        
+        Args:
+            path: Path of the file
+        """
+        _, arrays = self._flatten()
+        write_tree_file(path, "Quadtree", arrays,
+                        {"max_cardinality": self.max_cardinality, "max_depth": self.max_depth, "leaf_only": self.leaf_only,
+                         "next_id": self.next_id})
+
+    def _flatten(self: Self) -> tuple[list[Point], dict[str, np.ndarray]]:
+        """Flatten the tree into the node arrays described in save.
+        
+        The result is kept until the next mutation of the tree, so batch queries do not
+        flatten it again.
+        
+        Returns:
+            points: The stored points in the order of the point array
+            arrays: points, bounds, first_child, ranges and ids of the nodes
+        """
+        if(self._flat is not None and self._flat[0] == self.generation):
+            return self._flat[1], self._flat[2]
+        nodes = [self.root]
+        first_child = []
+        for node in nodes:
+            first_child.append(len(nodes) if node.has_children else -1)
+            if(node.has_children):
+                nodes.extend(node.children)
+        ranges = np.zeros((len(nodes), 2), dtype=np.int64)
+        points = []
+        stack = [(0, False)]
+        while stack:
+            index, finished = stack.pop()
+            node = nodes[index]
+            if(finished):
+                if(index == 0 and not self.leaf_only and node.has_children):
+                    inside = set().union(*(child.points for child in node.children))
+                    points.extend(point for point in node.points if point not in inside)
+                ranges[index, 1] = len(points)
+                continue
+            ranges[index, 0] = len(points)
             if(node.has_children):
+                stack.append((index, True))
+                stack.extend((first_child[index] + quadrant, False) for quadrant in reversed(range(4)))
+            else:
+                points.extend(node.points)
+                ranges[index, 1] = len(points)
+        bounds = np.array([(node.area.bottom_left.x, node.area.bottom_left.y, node.area.upper_right.x, node.area.upper_right.y)
+                           if node.area is not None else (np.nan,) * 4 for node in nodes], dtype=np.float64)
+        arrays = {
+            "points": np.array([(point.x, point.y) for point in points], dtype=np.float64).reshape(-1, 2),
+            "bounds": bounds,
+            "first_child": np.array(first_child, dtype=np.int64),
+            "ranges": ranges,
+            "ids": np.fromiter((self.ids[point] for point in points), dtype=np.int64, count=len(points)),
+        }
+        self._flat = (self.generation, points, arrays)
+        return points, arrays
+
+    @classmethod
+    def load(cls, path: str, cache: QueryCache | None = None) -> Quadtree:
+        """Restore a tree written by save with the same structure, without inserting the points again.
+        
+        Args:
+            path: Path of the file
+            cache: QueryCache of the tree
+            
+        Returns:
+            The restored quadtree
+        """
+        _, arrays, meta = read_tree_file(path, "Quadtree")
+        max_cardinality, leaf_only = meta["max_cardinality"], meta["leaf_only"]
+        max_depth = meta.get("max_depth", DEFAULT_MAX_DEPTH)
+        tree = cls([], max_cardinality=max_cardinality, leaf_only=leaf_only, max_depth=max_depth, cache=cache)
+        points = [Point(x, y) for x, y in arrays["points"].tolist()]
+        if("ids" in arrays):
+            tree.ids = dict(zip(points, arrays["ids"].tolist()))
+            tree.next_id = meta["next_id"]
+        else:
+            tree.ids = {point: row for row, point in enumerate(points)}
+            tree.next_id = len(points)
+        nodes = []
+        for bounds, first_child, (start, end) in zip(arrays["bounds"].tolist(), arrays["first_child"].tolist(),
+                                                     arrays["ranges"].tolist()):
+            area = None if np.isnan(bounds[0]) else Area.from_bounds(*bounds)
+            node = QuadtreeNode(max_cardinality, area, leaf_only=leaf_only, max_depth=max_depth)
+            node.has_children = first_child >= 0
+            node.size = end - start
+            if(not leaf_only or not node.has_children):
+                node.points = set(points[start:end])
+            nodes.append(node)
+        for node, first_child in zip(nodes, arrays["first_child"].tolist()):
+            if(first_child >= 0):
+                node.children = nodes[first_child:first_child + 4]
+                # Nodes are in breadth-first order, so the depth of the parent is already set
                 for child in node.children:
-                    if(search_area.intersects_with_area(child.area)):
-                        self._find_points_in_area(search_area, result, child)
+                    child.depth = node.depth + 1
+        tree.root = nodes[0]
+        return tree
+
+    def find_points_in_area(self: Self, area: Area, return_ids: bool = False) -> list[Point] | np.ndarray:
+        """Find all points contained within the given area.
+        
+        With a cache attached, an area asked again before the next mutation of the tree is
+        answered from the cache.
+        
+        Args:
+            area: Area to search for points
+            return_ids: Return the rows of the points instead of the points, see ids
+            
+        Returns:
+            List of points contained within the area, or an int64 array of their rows
+        """
+        if(self.cache is not None):
+            key = (area.bottom_left.x, area.bottom_left.y, area.upper_right.x, area.upper_right.y, return_ids)
+            cached = self.cache.get(key, self.generation)
+            if(cached is None):
+                cached = self._search_area(area)
+                cached = self._to_ids(cached) if return_ids else cached
+                self.cache.put(key, self.generation, cached)
+            # The cached result is copied so that callers can not change it
+            return cached.copy()
+        points = self._search_area(area)
+        return self._to_ids(points) if return_ids else points
+
+    def _to_ids(self: Self, points) -> np.ndarray:
+        """Look up the rows of stored points.
+        
+        Args:
+            points: Stored points
+            
+        Returns:
+            int64 array with the row of every point
+        """
+        ids = self.ids
+        return np.fromiter((ids[point] for point in points), dtype=np.int64)
+
+    def _search_area(self: Self, area: Area) -> list[Point]:
+        """Find all points contained within the given area without the cache."""
+        return list(self.iter_points_in_area(area))
+
+    def iter_points_in_area(self: Self, area: Area) -> Iterator[Point]:
+        """Lazily yield the points contained within the given area.
+        
+        The traversal keeps its own stack instead of recursing, so deep trees can not hit the
+        recursion limit, and the caller can stop early, e.g. after the first hits, without the
+        rest of the tree being searched. The points come in the same order as from
+        find_points_in_area. The tree must not be changed while the iteration is in progress.
+        
+        Args:
+            area: Area to search for points
+            
+        Yields:
+            Points contained within the area
+        """
+        stats = self.stats
+        if(stats is not None):
+            stats.queries += 1
+        stack = [self.root] if self.root.area is not None else []
+        while stack:
+            node = stack.pop()
+            if(stats is not None):
+                stats.nodes_visited += 1
+            if(area.contains_area(node.area)):
+                if(stats is not None):
+                    stats.subtrees_accepted += 1
+                yield from node.all_points()
+            elif(node.area.intersects_with_area(area)):
+                if(node.has_children):
+                    # Reversed, so the children are searched in their own order
+                    stack.extend(child for child in reversed(node.children) if area.intersects_with_area(child.area))
+                else:
+                    if(stats is not None):
+                        stats.points_tested += len(node.points)
+                    yield from (point for point in node.points if area.contains_point(point))
+            
+    def count_in_rectangle(self: Self, area: Area) -> int:
+        """Count the points contained within the given area without collecting them.
+        
+        Subtrees whose area lies entirely inside the searched area contribute their
+        stored size at once, so the cost does not depend on how many points are inside.
+        
+        Args:
+            area: Area to count points in
+            
+        Returns:
+            Number of points contained within the area
+        """
+        count = 0
+        stats = self.stats
+        if(stats is not None):
+            stats.queries += 1
+        stack = [self.root] if self.root.area is not None else []
+        while stack:
+            node = stack.pop()
+            if(stats is not None):
+                stats.nodes_visited += 1
+            if(area.contains_area(node.area)):
+                if(stats is not None):
+                    stats.subtrees_accepted += 1
+                count += node.size
+            elif(node.area.intersects_with_area(area)):
+                if(node.has_children):
+                    stack.extend(child for child in node.children if area.intersects_with_area(child.area))
+                else:
+                    if(stats is not None):
+                        stats.points_tested += len(node.points)
+                    count += sum(1 for point in node.points if area.contains_point(point))
+        return count
+
+    def find_points_in_radius(self: Self, center: Point, radius: float, return_ids: bool = False) -> list[Point] | np.ndarray:
+        """Find all points within the given distance from a point.
+        
+        Nodes whose area does not reach the circle are pruned and nodes whose area
+        lies entirely inside the circle are accepted without testing their points.
+        
+        Args:
+            center: Center of the circle
+            radius: Radius of the circle
+            return_ids: Return the rows of the points instead of the points, see ids
+            
+        Returns:
+            List of points whose distance from center is at most radius, or an int64 array of their rows
+        """
+        result = []
+        squared_radius = radius * radius
+        stats = self.stats
+        if(stats is not None):
+            stats.queries += 1
+        stack = [self.root] if self.root.area is not None else []
+        while stack:
+            node = stack.pop()
+            if(stats is not None):
+                stats.nodes_visited += 1
+            if(node.area.min_distance_to_point(center) > squared_radius):
+                continue
+            if(node.area.max_distance_to_point(center) <= squared_radius):
+                if(stats is not None):
+                    stats.subtrees_accepted += 1
+                result.extend(node.all_points())
+            elif(node.has_children):
+                stack.extend(node.children)
             else:
-                result.extend(point for point in node.points if search_area.contains_point(point))
+                if(stats is not None):
+                    stats.points_tested += len(node.points)
+                result.extend(point for point in node.points 
+                              if (point.x - center.x) ** 2 + (point.y - center.y) ** 2 <= squared_radius)
+        return self._to_ids(result) if return_ids else result
+
+    def nearest(self: Self, point: Point, k: int = 1, return_ids: bool = False) -> list[tuple[float, Point]] | tuple[np.ndarray, np.ndarray]:
+        """Find the k points closest to the given point.
+        
+        Nodes are visited best-first, ordered by the minimal distance from the point
+        to their area, and the search stops as soon as the closest unvisited node is
+        farther than the current k-th neighbour.
+        
+        Args:
+            point: Point to search around
+            k: Number of neighbours to find
+            return_ids: Return arrays of distances and rows instead of the pairs, see ids
+            
+        Returns:
+            List of (distance, point) pairs ordered by distance. With return_ids, an array of
+            k distances padded with inf and an int64 array of k rows padded with -1.
+        """
+        if(return_ids):
+            pairs = self.nearest(point, k)
+            distances = np.full(max(k, 0), np.inf)
+            ids = np.full(max(k, 0), -1, dtype=np.int64)
+            distances[:len(pairs)] = [distance for distance, _ in pairs]
+            ids[:len(pairs)] = self._to_ids(candidate for _, candidate in pairs)
+            return distances, ids
+        stats = self.stats
+        if(stats is not None):
+            stats.queries += 1
+        if self.root.area is None or k <= 0:
+            return []
+        best = []
+        counter = 0
+        # Min-heap of (squared distance to the node area, tie breaker, node)
+        queue = [(self.root.area.min_distance_to_point(point), counter, self.root)]
+        while queue:
+            distance, _, node = heapq.heappop(queue)
+            if len(best) == k and distance >= -best[0][0]:
+                break
+            if(stats is not None):
+                stats.nodes_visited += 1
+                if(not node.has_children):
+                    stats.points_tested += len(node.points)
+            if node.has_children:
+                for child in node.children:
+                    if child.size == 0:
+                        continue
+                    counter += 1
+                    heapq.heappush(queue, (child.area.min_distance_to_point(point), counter, child))
+                continue
+            for candidate in node.points:
+                dx = candidate.x - point.x
+                dy = candidate.y - point.y
+                candidate_distance = dx * dx + dy * dy
+                counter += 1
+                if len(best) < k:
+                    heapq.heappush(best, (-candidate_distance, counter, candidate))
+                elif candidate_distance < -best[0][0]:
+                    heapq.heapreplace(best, (-candidate_distance, counter, candidate))
+        return [((-distance) ** 0.5, candidate) for distance, _, candidate in sorted(best, reverse=True)]
+
+    def nearest_many(self: Self, points: list[Point], k: int = 1) -> list[list[tuple[float, Point]]]:
+        """Find the k nearest neighbours of every point of a batch.
+        
+        Args:
+            points: Points to search around
+            k: Number of neighbours to find
+            
+        Returns:
+            List with the result of nearest for every point
+        """
+        return [self.nearest(point, k) for point in points]
+
+    def find_points_in_areas(self: Self, areas: list[Area], return_ids: bool = True) -> tuple[np.ndarray, np.ndarray | list[Point]]:
+        """Find the points of a whole batch of areas in one traversal.
+        
+        The traversal runs over the flattened node arrays of the tree, see _flatten, which are
+        made once per mutation generation. The areas that can still reach a node are pushed down
+        the tree together and the node tests are vectorised over their bounds, so each node is
+        visited at most once for the whole batch. A node covered by an area reports its whole
+        range of the point array, and subtrees of at most BATCH_BLOCK_SIZE points are tested as
+        one block instead of node by node.
+        
+        Args:
+            areas: Areas to search for points
+            return_ids: Return the rows of the points, see ids, otherwise the points themselves
+            
+        Returns:
+            offsets: Array of length len(areas) + 1, the answer to areas[i] is found[offsets[i]:offsets[i+1]]
+            found: int64 array with the rows of the found points grouped by area, or a list of the points
+        """
+        query_count = len(areas)
+        query_bounds = areas_to_array(areas)
+        stats = self.stats
+        if(stats is not None):
+            # Every area counts as a query and the tests of a node as a visit for every area still reaching it
+            stats.queries += query_count
+        points, arrays = self._flatten()
+        # With every box written as (x_min, y_min, -x_max, -y_max), an area reaches a box (of a node or a point)
+        # when its key is at most (x_max, y_max, -x_min, -y_min) of the box and covers the box when its key is at
+        # most the key of the box, so each test is one comparison over the active areas
+        keys = query_bounds * (1, 1, -1, -1)
+        node_keys = arrays["bounds"] * (1, 1, -1, -1)
+        node_reach = node_keys[:, [2, 3, 0, 1]] * -1
+        point_keys = np.hstack([arrays["points"], -arrays["points"]])
+        first_child = arrays["first_child"]
+        ranges = arrays["ranges"]
+        found_queries = [np.empty(0, dtype=np.int64)]
+        found_positions = [np.empty(0, dtype=np.int64)]
+        stack = []
+        if(self.root.area is not None and query_count):
+            stack.append((0, np.flatnonzero(np.all(keys <= node_reach[0], axis=1))))
+        while stack:
+            node, active = stack.pop()
+            start, end = ranges[node].tolist()
+            active_keys = keys[active]
+            covered = np.all(active_keys <= node_keys[node], axis=1)
+            if(stats is not None):
+                stats.nodes_visited += len(active)
+            if(covered.any()):
+                accepted = active[covered]
+                if(stats is not None):
+                    stats.subtrees_accepted += len(accepted)
+                found_queries.append(np.repeat(accepted, end - start))
+                found_positions.append(np.tile(np.arange(start, end), len(accepted)))
+                active = active[~covered]
+                if(len(active) == 0):
+                    continue
+                active_keys = active_keys[~covered]
+            children = int(first_child[node])
+            # The root is searched node by node, its range also holds the points outside of its area
+            if(children < 0 or (node > 0 and end - start <= BATCH_BLOCK_SIZE)):
+                if(stats is not None):
+                    stats.points_tested += len(active) * (end - start)
+                queries, positions = np.nonzero(np.all(active_keys[:, None, :] <= point_keys[None, start:end, :], axis=2))
+                found_queries.append(active[queries])
+                found_positions.append(positions + start)
+                continue
+            reaches = np.all(active_keys[:, None, :] <= node_reach[None, children:children + 4, :], axis=2)
+            for quadrant in (3, 2, 1, 0):
+                child_active = active[reaches[:, quadrant]]
+                if(len(child_active) and ranges[children + quadrant, 1] > ranges[children + quadrant, 0]):
+                    stack.append((children + quadrant, child_active))
+        offsets, positions = group_by_query(np.concatenate(found_queries), np.concatenate(found_positions), query_count)
+        if(return_ids):
+            return offsets, arrays["ids"][positions]
+        return offsets, [points[position] for position in positions.tolist()]
             
     def _print_all_points(self: Self, node: QuadtreeNode, result: list[Point]) -> None:
         """Recursively collect all points in the quadtree.
@@ -152,9 +990,103 @@ class Quadtree:
         else:
             result.extend(node.points)
             
+    def shape(self: Self) -> dict:
+        """Measure the shape of the tree.
+        
+        Returns:
+            Dictionary with the height (number of levels), the number of nodes and leaves, the
+            leaf fill histogram (number of points -> number of leaves), the histograms of the
+            node depths and of the leaf depths, and the depth distribution of the points
+            (depth of the leaf -> number of points stored in leaves on that depth)
+        """
+        depths = []
+        leaf_depths = []
+        fills = []
+        point_depths = {}
+        for node, depth in self._iter_nodes():
+            depths.append(depth)
+            if(not node.has_children):
+                leaf_depths.append(depth)
+                fills.append(len(node.points))
+                point_depths[depth] = point_depths.get(depth, 0) + len(node.points)
+        return {"height": max(depths) + 1, "nodes": len(depths), "leaves": len(leaf_depths),
+                "leaf_fill": histogram(fills), "depths": histogram(depths), "leaf_depths": histogram(leaf_depths),
+                "point_depths": dict(sorted(point_depths.items()))}
+
+    def memory_footprint(self: Self) -> dict[str, int]:
+        """Measure the memory taken by the tree structure itself.
+        
+        Counts the node objects with their attribute dictionaries, point sets and child
+        lists. The Point objects are shared between nodes and are not included.
+        
+        Returns:
+            Dictionary with the number of nodes, the number of stored point references
+            and the total size in bytes
+        """
+        nodes = 0
+        references = 0
+        total = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            nodes += 1
+            references += len(node.points)
+            total += sys.getsizeof(node) + sys.getsizeof(node.__dict__)
+            total += sys.getsizeof(node.points) + sys.getsizeof(node.children)
+            if(node.has_children):
+                stack.extend(node.children)
+        return {"nodes": nodes, "point_references": references, "bytes": total}
+
     def print_all_points(self: Self) -> None:
         """Print all points stored in the quadtree."""
         result = []
         self._print_all_points(self.root, result)
         print(len(result))
-        print(result)
\ No newline at end of file
+        print(result)
+
+def tune_max_cardinality(array: np.ndarray, candidates: tuple[int, ...] = AUTO_CANDIDATES,
+                         sample_size: int = AUTO_SAMPLE_SIZE, query_fraction: float = AUTO_QUERY_FRACTION,
+                         queries: int = 64, max_depth: int = DEFAULT_MAX_DEPTH, leaf_only: bool = False,
+                         seed: int = 0) -> int:
+    """Pick the leaf capacity of a quadtree for a dataset from a sample of its points.
+    
+    A trial tree is built from the sample for every candidate and the same square queries,
+    centered on sample points so that they follow the distribution of the data, are run on
+    each of them with a TraversalStats collector attached. The cost of a query is the number
+    of visited nodes weighted by AUTO_NODE_COST plus the number of tested points, so the
+    result does not depend on the timing of the machine. Larger capacities build fewer nodes
+    and take less memory, so the largest candidate whose cost stays within AUTO_TOLERANCE of
+    the cheapest one is chosen.
+    
+    Args:
+        array: (n, 2) array of point coordinates
+        candidates: Capacities to try
+        sample_size: Maximal number of points the trial trees are built from
+        query_fraction: Fraction of the bounding area of the sample covered by a query
+        queries: Number of trial queries
+        max_depth: Depth limit of the trial trees
+        leaf_only: Whether the trial trees store points only in leaves
+        seed: Seed of the sampling, the same data always gives the same result
+        
+    Returns:
+        The chosen max_cardinality
+    """
+    array = np.asarray(array, dtype=np.float64).reshape(-1, 2)
+    candidates = sorted(candidates)
+    if(len(array) == 0):
+        return candidates[0]
+    rng = np.random.default_rng(seed)
+    sample = array[rng.choice(len(array), sample_size, replace=False)] if len(array) > sample_size else array
+    half = (sample.max(axis=0) - sample.min(axis=0)) * np.sqrt(query_fraction) / 2
+    areas = [Area.from_bounds(*(center - half).tolist(), *(center + half).tolist())
+             for center in sample[rng.integers(len(sample), size=queries)]]
+    costs = []
+    for candidate in candidates:
+        tree = Quadtree.from_array(sample, max_cardinality=candidate, leaf_only=leaf_only, max_depth=max_depth)
+        # Attached after the build, so only the queries are counted
+        tree.stats = TraversalStats()
+        for area in areas:
+            tree._search_area(area)
+        costs.append(AUTO_NODE_COST * tree.stats.nodes_visited + tree.stats.points_tested)
+    limit = min(costs) * (1 + AUTO_TOLERANCE)
+    return max(candidate for candidate, cost in zip(candidates, costs) if cost <= limit)
@@ -110,7 +110,7 @@ class QuadTreeVisualizer:
         if self.mode == 'point':
             # Create and insert new point
             new_point = Point(event.xdata, event.ydata)
-            self.qt.root.insert([new_point])
+            self.qt.insert([new_point])
         elif self.mode == 'area':
             if(len(self.area_points) == 0):
               while(len(self.area_plt_objects) > 0):
@@ -236,7 +236,7 @@ class QuadTreeVisualizer:
         ax.set_aspect('equal')
         
         # Draw points in the node
-        for point in qt.root.points:
+        for point in qt.root.all_points():
             ax.plot(point.x, point.y, '.', color='blue')
         # Initialise frames with root square
         frames = []
@@ -1,16 +1,32 @@
 from __future__ import annotations
-from typing import Self
+from typing import Self, Iterator
+import numpy as np
 
 class Point:
-    """Represents a 2D point with x and y coordinates.
+    """Represents an immutable 2D point with x and y coordinates.
+    
+    Points are hashed and kept in sets by the quadtree, so their coordinates can not
+    change after creation. The class uses __slots__ and carries no __dict__.
     
     Attributes:
         x: x-coordinate
         y: y-coordinate
     """
+    __slots__ = ("x", "y")
+
     def __init__(self, x: float, y: float) -> None:
-        self.x = x
-        self.y = y 
+        object.__setattr__(self, "x", x)
+        object.__setattr__(self, "y", y)
+
+    def __setattr__(self: Self, name: str, value) -> None:
+        raise AttributeError("Point is immutable")
+
+    def __delattr__(self: Self, name: str) -> None:
+        raise AttributeError("Point is immutable")
+
+    def __reduce__(self: Self) -> tuple:
+        # __setattr__ is blocked, so pickle and copy recreate the point through the constructor
+        return (self.__class__, (self.x, self.y))
 
     def __str__(self: Self) -> str:
         return f"({self.x}, {self.y})"
@@ -33,22 +49,20 @@ class Point:
     def __ge__(self: Self, other: Self) -> bool:
         return self.x >= other.x and self.y >= other.y
     
-    def __iter__(self: Self) -> tuple[float,float]:
-        return [self.x,self.y]
+    def __iter__(self: Self) -> Iterator[float]:
+        return iter((self.x, self.y))
     
     def __getitem__(self: Self,index: int) -> float:
-        match index:
-            case 0:
-                return self.x
-            case 1:
-                return self.y
-            case _:
-                raise ValueError("There is not such dimension")
+        if(index == 0):
+            return self.x
+        if(index == 1):
+            return self.y
+        raise ValueError("There is not such dimension")
     def __hash__(self):
         return hash((self.x,self.y))
               
 class Area:
-    """Represents a rectangular area in 2D space.
+    """Represents an immutable rectangular area in 2D space.
     
     Defined by two points: bottom-left and upper-right corners.
     
@@ -56,10 +70,26 @@ class Area:
         bottom_left: Point representing the bottom-left corner
         upper_right: Point representing the upper-right corner
     """
+    __slots__ = ("bottom_left", "upper_right")
+
     def __init__(self, bottom_left: Point, upper_right: Point) -> None:
-        self.bottom_left = bottom_left
-        self.upper_right = upper_right 
+        object.__setattr__(self, "bottom_left", bottom_left)
+        object.__setattr__(self, "upper_right", upper_right)
+
+    def __setattr__(self: Self, name: str, value) -> None:
+        raise AttributeError("Area is immutable")
+
+    def __delattr__(self: Self, name: str) -> None:
+        raise AttributeError("Area is immutable")
+
+    def __reduce__(self: Self) -> tuple:
+        return (self.__class__, (self.bottom_left, self.upper_right))
       
+    @classmethod
+    def from_bounds(cls, x_min: float, y_min: float, x_max: float, y_max: float) -> Area:
+        """Create an area from its coordinate bounds."""
+        return cls(Point(x_min, y_min), Point(x_max, y_max))
+
     def __str__(self: Self) -> str:
         return f"[{self.bottom_left}:{self.upper_right}]"
     def __repr__(self: Self) -> str:
@@ -95,6 +125,32 @@ class Area:
             area.bottom_left.y <= self.upper_right.y
         )
   
+    def min_distance_to_point(self: Self, point: Point) -> float:
+        """Calculate the squared distance from a point to the closest point of this area.
+        
+        Args:
+            point: Point to measure the distance from
+            
+        Returns:
+            Squared Euclidean distance, 0 if the point lies within this area
+        """
+        dx = max(self.bottom_left.x - point.x, 0, point.x - self.upper_right.x)
+        dy = max(self.bottom_left.y - point.y, 0, point.y - self.upper_right.y)
+        return dx * dx + dy * dy
+  
+    def max_distance_to_point(self: Self, point: Point) -> float:
+        """Calculate the squared distance from a point to the farthest corner of this area.
+        
+        Args:
+            point: Point to measure the distance from
+            
+        Returns:
+            Squared Euclidean distance
+        """
+        dx = max(point.x - self.bottom_left.x, self.upper_right.x - point.x)
+        dy = max(point.y - self.bottom_left.y, self.upper_right.y - point.y)
+        return dx * dx + dy * dy
+  
     def contains_point(self: Self, point: Point) -> bool:
         """Check if this area contains a point.
         
@@ -108,3 +164,67 @@ class Area:
             self.bottom_left.x <= point.x <= self.upper_right.x and
             self.bottom_left.y <= point.y <= self.upper_right.y
         )
+
+
+class PointArray:
+    """A read-only sequence of points backed by one (n, 2) float64 array.
+    
+    The whole point set is stored without per-point objects, a Point is created only
+    when a single element is accessed. It can be passed anywhere a list of points is
+    expected, while vectorised code can use the array directly. Slicing it, or indexing
+    it with an integer array or a boolean mask, gives another PointArray over the
+    selected rows, a view of the same array for slices.
+    
+    Attributes:
+        array: (n, 2) array of coordinates
+    """
+    __slots__ = ("array",)
+
+    def __init__(self, points: np.ndarray | list[Point]) -> None:
+        if(isinstance(points, np.ndarray)):
+            self.array = np.ascontiguousarray(points, dtype=np.float64).reshape(-1, 2)
+        else:
+            self.array = point_coordinates(points)
+
+    def __len__(self: Self) -> int:
+        return len(self.array)
+
+    def __getitem__(self: Self, index: int | slice | np.ndarray | list) -> Point | PointArray:
+        rows = self.array[index]
+        if(rows.ndim == 1):
+            x, y = rows.tolist()
+            return Point(x, y)
+        # The selected rows are wrapped as they are, a slice is not copied
+        result = PointArray.__new__(PointArray)
+        result.array = rows
+        return result
+
+    def __iter__(self: Self) -> Iterator[Point]:
+        return map(Point, self.array[:, 0].tolist(), self.array[:, 1].tolist())
+
+
+def point_coordinates(points: list[Point]) -> np.ndarray:
+    """Copy the coordinates of many points into one array.
+    
+    Args:
+        points: Points to convert
+        
+    Returns:
+        (n, 2) float64 array of coordinates
+    """
+    if(isinstance(points, PointArray)):
+        return points.array
+    return np.array([(point.x, point.y) for point in points], dtype=np.float64).reshape(-1, 2)
+
+
+def areas_to_array(areas: list[Area]) -> np.ndarray:
+    """Copy the bounds of many areas into one array.
+    
+    Args:
+        areas: Areas to convert
+        
+    Returns:
+        (n, 4) float64 array with rows (x_min, y_min, x_max, y_max)
+    """
+    return np.array([(area.bottom_left.x, area.bottom_left.y, area.upper_right.x, area.upper_right.y) for area in areas],
+                    dtype=np.float64).reshape(-1, 4)
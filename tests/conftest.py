@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The packages are imported from the repository root as src.kdtree, src.quadtree and src.common
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
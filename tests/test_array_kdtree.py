@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from src.kdtree.array_kdtree import ArrayKDTree, LEAF_SIZE, _build_ranges
+
+
+def in_rectangle(points, low, high):
+    return np.flatnonzero(np.all((points >= low) & (points <= high), axis=1))
+
+
+@pytest.mark.parametrize("n", [0, 1, LEAF_SIZE, LEAF_SIZE + 1, 1000])
+@pytest.mark.parametrize("k", [2, 3])
+def test_queries_match_brute_force(n, k):
+    rng = np.random.default_rng(n + k)
+    # Rounded coordinates give many ties on the split values
+    points = np.round(rng.random((n, k)) * 20)
+    tree = ArrayKDTree(K=k)
+    tree.build_tree(points)
+    for _ in range(20):
+        corners = np.round(rng.random((2, k)) * 20)
+        low, high = corners.min(axis=0), corners.max(axis=0)
+        expected = in_rectangle(points, low, high)
+        count, ids = tree.get_points_in_rectangle(low, high, return_ids=True)
+        assert count == len(expected)
+        assert np.array_equal(np.sort(ids), expected)
+        assert tree.count_in_rectangle(low, high) == len(expected)
+        center, radius = corners[0], 5.0
+        _, ids = tree.get_points_in_radius(center, radius, return_ids=True)
+        assert np.array_equal(np.sort(ids), np.flatnonzero(np.sum((points - center) ** 2, axis=1) <= radius * radius))
+        distances, _ = tree.nearest(center, k=5)
+        expected_distances = np.sort(np.sqrt(np.sum((points - center) ** 2, axis=1)))[:5]
+        assert np.allclose(distances[:len(expected_distances)], expected_distances)
+
+
+def test_build_partitions_down_to_leaf_size():
+    rng = np.random.default_rng(1)
+    points = rng.random((5000, 2))
+    tree = ArrayKDTree()
+    tree.build_tree(points)
+    assert np.array_equal(np.sort(tree.ids), np.arange(len(points)))
+    assert np.array_equal(tree.points, points[tree.ids])
+    # The children follow from the in-order layout, so no child arrays are stored
+    assert set(tree.to_arrays()) == {"points", "split_dims", "ids"}
+    # Every split node separates the points of its range by its split value
+    stack = [(0, len(points), 0)]
+    while stack:
+        lo, hi, depth = stack.pop()
+        if hi - lo <= LEAF_SIZE:
+            continue
+        node = (lo + hi) // 2
+        dimension = depth % 2
+        assert tree.split_dims[node] == dimension
+        value = tree.points[node, dimension]
+        assert np.all(tree.points[lo:node, dimension] <= value)
+        assert np.all(tree.points[node + 1:hi, dimension] >= value)
+        stack.extend([(lo, node, depth + 1), (node + 1, hi, depth + 1)])
+
+
+@pytest.mark.parametrize("processes", [3, 6])
+def test_top_split_gives_a_complete_level(processes):
+    n = 10000
+    data = np.random.default_rng(2).random((n, 2))
+    order = np.arange(n)
+    split_dims = np.zeros(n, dtype=np.int8)
+    ranges = _build_ranges(data, order, split_dims, [(0, n, 0)], 2, limit=processes)
+    assert len(ranges) >= processes
+    assert len({level for _, _, level in ranges}) == 1
+    assert max(hi - lo for lo, hi, _ in ranges) - min(hi - lo for lo, hi, _ in ranges) <= 1
+
+
+def test_parallel_build_matches_serial_build():
+    points = np.random.default_rng(4).random((120000, 2))
+    serial = ArrayKDTree()
+    serial.build_tree(points)
+    parallel = ArrayKDTree()
+    parallel.build_tree_parallel(points, processes=3)
+    assert np.array_equal(np.sort(parallel.ids), np.arange(len(points)))
+    low, high = np.array([0.3, 0.3]), np.array([0.4, 0.45])
+    _, ids = parallel.get_points_in_rectangle(low, high, return_ids=True)
+    assert np.array_equal(np.sort(ids), in_rectangle(points, low, high))
+    # Every range is partitioned the same way whichever process builds it
+    assert np.array_equal(parallel.ids, serial.ids)
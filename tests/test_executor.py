@@ -0,0 +1,52 @@
+import numpy as np
+
+from src.kdtree.array_kdtree import ArrayKDTree
+from src.kdtree.executor import QueryExecutor
+from src.quadtree.executor import QuadtreeQueryExecutor
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area
+
+
+def random_rectangles(rng, count):
+    corners = rng.integers(-2, 42, (count, 2, 2)).astype(np.float64)
+    return np.stack([corners.min(axis=1), corners.max(axis=1)], axis=1)
+
+
+def test_kdtree_pool_matches_in_process_batch():
+    rng = np.random.default_rng(0)
+    tree = ArrayKDTree()
+    tree.build_tree(rng.integers(0, 40, (3000, 2)).astype(np.float64))
+    rectangles = random_rectangles(rng, 200)
+    queries = rng.random((50, 2)) * 40
+    # A small chunk size spreads the batch over both workers
+    with QueryExecutor(tree, processes=2, chunk_size=16) as executor:
+        offsets, indices = executor.get_points_in_rectangles(rectangles)
+        counts = executor.count_in_rectangles(rectangles)
+        distances, neighbours = executor.nearest(queries, k=3)
+        assert executor.get_points_in_rectangles(rectangles[:0])[0].tolist() == [0]
+    expected_offsets, expected_indices = tree.get_points_in_rectangles(rectangles)
+    assert np.array_equal(offsets, expected_offsets)
+    assert np.array_equal(indices, expected_indices)
+    assert np.array_equal(counts, np.diff(expected_offsets))
+    expected_distances, expected_neighbours = tree.nearest(queries, 3)
+    assert np.array_equal(distances, expected_distances)
+    assert np.array_equal(neighbours, expected_neighbours)
+
+
+def test_quadtree_pool_matches_in_process_batch():
+    rng = np.random.default_rng(1)
+    tree = Quadtree.from_array(rng.integers(0, 40, (3000, 2)).astype(np.float64), max_cardinality=4)
+    areas = [Area.from_bounds(*low, *high) for low, high in random_rectangles(rng, 200).tolist()]
+    with QuadtreeQueryExecutor(tree, processes=2, chunk_size=16) as executor:
+        offsets, indices = executor.find_points_in_areas(areas)
+    snapshot = executor.snapshot
+    expected = [snapshot.find_indices_in_area(area) for area in areas]
+    assert np.array_equal(offsets, np.cumsum([0] + [len(found) for found in expected]))
+    assert np.array_equal(indices, np.concatenate(expected))
+    # The snapshot holds the same points as the tree
+    expected_offsets, points = tree.find_points_in_areas(areas, return_ids=False)
+    assert np.array_equal(offsets, expected_offsets)
+    for query in range(len(areas)):
+        found = indices[offsets[query]:offsets[query + 1]]
+        assert set(zip(snapshot.xs[found].tolist(), snapshot.ys[found].tolist())) == \
+            {(point.x, point.y) for point in points[offsets[query]:offsets[query + 1]]}
@@ -0,0 +1,90 @@
+import copy
+import pickle
+
+import numpy as np
+import pytest
+
+from src.kdtree.kdtree import KDTree
+from src.kdtree.util.geometry import Point
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point as QuadPoint, PointArray, point_coordinates
+
+
+@pytest.mark.parametrize("point", [Point(1.5, -2.0), Point(1, 2, 3), Point(1, 2, 3, [4, 5])])
+def test_kd_point_roundtrip(point):
+    for clone in (pickle.loads(pickle.dumps(point)), copy.copy(point), copy.deepcopy(point)):
+        assert clone == point
+        assert hash(clone) == hash(point)
+        assert clone.values == point.values
+
+
+def test_kd_point_is_immutable_and_indexable():
+    point = Point(1, 2, 3, [4])
+    with pytest.raises(AttributeError):
+        point.x = 5
+    assert (point[0], point[1], point[2], point[3], point[-1]) == (1, 2, 3, 4, 4)
+    assert point.dimensions == len(point) == 4
+    with pytest.raises(ValueError):
+        point[4]
+    assert not hasattr(Point(1, 2), "__dict__")
+
+
+def test_quad_point_and_area_roundtrip():
+    area = Area(QuadPoint(0, 1), QuadPoint(2, 3))
+    for clone in (pickle.loads(pickle.dumps(area)), copy.copy(area), copy.deepcopy(area)):
+        assert clone.bottom_left == area.bottom_left and clone.upper_right == area.upper_right
+    assert pickle.loads(pickle.dumps(QuadPoint(1, 2))) == QuadPoint(1, 2)
+
+
+def test_quad_point_and_area_are_immutable():
+    point = QuadPoint(1, 2)
+    area = Area(QuadPoint(0, 0), QuadPoint(1, 1))
+    with pytest.raises(AttributeError):
+        point.x = 3
+    with pytest.raises(AttributeError):
+        area.bottom_left = QuadPoint(-1, -1)
+    assert (point[0], point[1]) == (1, 2)
+    with pytest.raises(ValueError):
+        point[2]
+
+
+def test_trees_pickle():
+    rng = np.random.default_rng(0)
+    coordinates = rng.random((300, 2))
+    kdtree = KDTree()
+    kdtree.build_tree([Point(x, y) for x, y in coordinates.tolist()])
+    clone = pickle.loads(pickle.dumps(kdtree))
+    low, high = Point(0.2, 0.2), Point(0.7, 0.6)
+    assert sorted(clone.get_points_in_rectangle(low, high)[1]) == sorted(kdtree.get_points_in_rectangle(low, high)[1])
+
+    quadtree = Quadtree.from_array(coordinates, max_cardinality=4)
+    for clone in (pickle.loads(pickle.dumps(quadtree)), copy.deepcopy(quadtree)):
+        area = Area(QuadPoint(0.2, 0.2), QuadPoint(0.7, 0.6))
+        assert set(clone.find_points_in_area(area)) == set(quadtree.find_points_in_area(area))
+        assert sorted(clone.find_points_in_area(area, return_ids=True)) == sorted(quadtree.find_points_in_area(area, return_ids=True))
+
+
+def test_point_array_indexing():
+    coordinates = np.arange(12, dtype=np.float64).reshape(6, 2)
+    points = PointArray(coordinates)
+    assert points[1] == QuadPoint(2, 3) and points[-1] == QuadPoint(10, 11) and points[np.int64(2)] == QuadPoint(4, 5)
+    with pytest.raises(IndexError):
+        points[6]
+    # Slices are PointArray views of the same coordinates
+    sliced = points[1:5:2]
+    assert isinstance(sliced, PointArray) and np.shares_memory(sliced.array, points.array)
+    assert list(sliced) == [QuadPoint(2, 3), QuadPoint(6, 7)]
+    assert len(points[4:]) == 2 and len(points[10:]) == 0
+    selected = points[np.array([5, 0])]
+    assert isinstance(selected, PointArray) and list(selected) == [QuadPoint(10, 11), QuadPoint(0, 1)]
+    masked = points[coordinates[:, 0] > 5]
+    assert list(masked) == [QuadPoint(6, 7), QuadPoint(8, 9), QuadPoint(10, 11)]
+    assert list(points[[1, 1]]) == [QuadPoint(2, 3), QuadPoint(2, 3)]
+
+
+def test_point_coordinates():
+    points = [QuadPoint(1, 2), QuadPoint(3, 4)]
+    assert point_coordinates(points).tolist() == [[1, 2], [3, 4]]
+    assert point_coordinates([]).shape == (0, 2)
+    wrapped = PointArray(points)
+    assert point_coordinates(wrapped) is wrapped.array
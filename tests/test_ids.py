@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.kdtree.array_kdtree import ArrayKDTree
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 100])
+@pytest.mark.parametrize("extension", [".csv", ".npy"])
+def test_quadtree_file_rows_match_array_rows(tmp_path, chunk_size, extension):
+    rows = np.array([(1, 1), (2, 2), (1, 1), (3, 3), (2, 2), (4, 0)], dtype=np.float64)
+    path = str(tmp_path / ("points" + extension))
+    if(extension == ".npy"):
+        np.save(path, rows)
+    else:
+        np.savetxt(path, rows, delimiter=",")
+    from_file = Quadtree.from_file(path, chunk_size=chunk_size)
+    from_array = Quadtree.from_array(rows)
+    assert from_file.ids == from_array.ids == {Point(1, 1): 0, Point(2, 2): 1, Point(3, 3): 3, Point(4, 0): 5}
+    assert from_file.next_id == from_array.next_id == 6
+    area = Area(Point(2.5, 2.5), Point(3.5, 3.5))
+    assert from_file.find_points_in_area(area, return_ids=True).tolist() == [3]
+
+
+def test_array_kdtree_ids():
+    rng = np.random.default_rng(0)
+    points = rng.random((2000, 2))
+    tree = ArrayKDTree()
+    tree.build_tree(points)
+    low, high = np.array([0.2, 0.1]), np.array([0.5, 0.6])
+    _, ids = tree.get_points_in_rectangle(low, high, return_ids=True)
+    expected = np.flatnonzero(np.all((points >= low) & (points <= high), axis=1))
+    assert np.array_equal(np.sort(ids), expected)
+
+
+def test_batched_range_queries_return_ids():
+    from src.kdtree.kdtree import KDTree
+    from src.kdtree.util.geometry import Point as KDPoint
+    rng = np.random.default_rng(3)
+    points = rng.integers(0, 50, (3000, 2)).astype(np.float64)
+    lows = rng.uniform(-5, 50, (200, 2))
+    rectangles = np.stack([lows, lows + rng.uniform(0, 15, (200, 2))], axis=1)
+    inside = [np.flatnonzero(np.all((points >= low) & (points <= high), axis=1)) for low, high in rectangles]
+
+    kdtree = KDTree()
+    kdtree.build_tree([KDPoint(x, y) for x, y in points.tolist()])
+    offsets, ids = kdtree.get_points_in_rectangles(rectangles, return_ids=True)
+    _, found = kdtree.get_points_in_rectangles([(KDPoint(*low), KDPoint(*high)) for low, high in rectangles.tolist()])
+    assert ids.dtype == np.int64 and len(found) == len(ids)
+    for query, expected in enumerate(inside):
+        assert sorted(ids[offsets[query]:offsets[query + 1]].tolist()) == expected.tolist()
+        assert [tuple(point) for point in found[offsets[query]:offsets[query + 1]]] == [tuple(points[i]) for i in ids[offsets[query]:offsets[query + 1]]]
+    # The preorder arrays are made again after a mutation
+    kdtree.insert_point(KDPoint(20.5, 20.5))
+    offsets, ids = kdtree.get_points_in_rectangles(np.array([[[20, 20], [21, 21]]], dtype=np.float64), return_ids=True)
+    assert 3000 in ids.tolist()
+
+    quadtree = Quadtree.from_array(points, max_cardinality=8)
+    offsets, ids = quadtree.find_points_in_areas([Area.from_bounds(*low, *high) for low, high in rectangles.tolist()], return_ids=True)
+    for query, expected in enumerate(inside):
+        # Duplicates are stored once, with the row of their first occurrence
+        first_rows = {tuple(points[i]): i for i in expected[::-1]}
+        assert sorted(ids[offsets[query]:offsets[query + 1]].tolist()) == sorted(first_rows.values())
@@ -0,0 +1,93 @@
+from itertools import islice
+
+import numpy as np
+import pytest
+
+from src.common.stats import TraversalStats
+from src.kdtree.kdtree import KDTree
+from src.kdtree.util.geometry import Point as KDPoint
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point
+
+
+def random_rectangles(rng, count):
+    corners = rng.integers(-2, 42, (count, 2, 2)).astype(np.float64)
+    return corners.min(axis=1).tolist(), corners.max(axis=1).tolist()
+
+
+def grid_points(seed):
+    return np.random.default_rng(seed).integers(0, 40, (2000, 2)).astype(np.float64)
+
+
+def test_kdtree_generator_matches_brute_force_and_list_order():
+    points = grid_points(0)
+    tree = KDTree()
+    tree.build_tree([KDPoint(x, y) for x, y in points.tolist()])
+    for low, high in zip(*random_rectangles(np.random.default_rng(1), 100)):
+        found = list(tree.iter_points_in_area(KDPoint(*low), KDPoint(*high)))
+        assert found == tree.get_points_in_rectangle(KDPoint(*low), KDPoint(*high))[1]
+        inside = np.all((points >= low) & (points <= high), axis=1)
+        assert sorted(tuple(point) for point in found) == sorted(map(tuple, points[inside].tolist()))
+
+
+@pytest.mark.parametrize("leaf_only", [False, True])
+def test_quadtree_generator_matches_brute_force_and_list_order(leaf_only):
+    points = np.unique(grid_points(2), axis=0)
+    tree = Quadtree.from_array(points, max_cardinality=4, leaf_only=leaf_only)
+    for low, high in zip(*random_rectangles(np.random.default_rng(3), 100)):
+        area = Area.from_bounds(*low, *high)
+        found = list(tree.iter_points_in_area(area))
+        assert found == tree.find_points_in_area(area)
+        inside = np.all((points >= low) & (points <= high), axis=1)
+        assert sorted((point.x, point.y) for point in found) == sorted(map(tuple, points[inside].tolist()))
+
+
+def test_kdtree_generator_stops_early():
+    tree = KDTree(stats=TraversalStats())
+    tree.build_tree([KDPoint(x, y) for x, y in grid_points(4).tolist()])
+    low, high = KDPoint(-1, -1), KDPoint(50, 50)
+    tree.stats.reset()
+    iterator = tree.iter_points_in_area(low, high)
+    # Nothing is searched before the first point is asked for
+    assert tree.stats.nodes_visited == 0
+    assert len(list(islice(iterator, 3))) == 3
+    # The first points are the root and its leftmost descendants, found on a single path down the tree
+    assert tree.stats.nodes_visited <= 3
+    iterator.close()
+    assert tree.stats.nodes_visited <= 3
+    tree.stats.reset()
+    # Walking to the end visits every node
+    assert len(list(tree.iter_points_in_area(low, high))) == 2000
+    assert tree.stats.nodes_visited == 2000
+
+
+def test_quadtree_generator_stops_early():
+    tree = Quadtree.from_array(grid_points(5), max_cardinality=4)
+    tree.stats = TraversalStats()
+    area = Area.from_bounds(0.5, 0.5, 38.5, 38.5)
+    iterator = tree.iter_points_in_area(area)
+    assert tree.stats.nodes_visited == 0
+    first = next(iterator)
+    assert area.contains_point(first)
+    visited = tree.stats.nodes_visited
+    # Only the path to the first leaf is searched, not the whole tree
+    assert visited <= tree.shape()["height"] + 4
+    iterator.close()
+    assert tree.stats.nodes_visited == visited
+    tree.stats.reset()
+    list(tree.iter_points_in_area(area))
+    assert tree.stats.nodes_visited > 10 * visited
+
+
+def test_chain_shaped_trees_have_no_recursion_errors():
+    kdtree = KDTree()
+    # Deeper than the default recursion limit of 1000
+    for i in range(2000):
+        kdtree.insert_point(KDPoint(i, i))
+    assert list(kdtree.iter_points_in_area(KDPoint(1990, 1990), KDPoint(3000, 3000))) == [KDPoint(i, i) for i in range(1990, 2000)]
+    assert next(kdtree.iter_points_in_area(KDPoint(1999, 1999), KDPoint(1999, 1999))) == KDPoint(1999, 1999)
+    # Every point halves the distance to the origin, so the quadtree is a chain about 500 levels deep
+    quadtree = Quadtree.from_array([[2.0 ** -i, 2.0 ** -i] for i in range(500)], max_cardinality=1, max_depth=600)
+    found = list(quadtree.iter_points_in_area(Area.from_bounds(0, 0, 2.0 ** -480, 2.0 ** -480)))
+    assert sorted(point.x for point in found) == [2.0 ** -i for i in range(499, 479, -1)]
+    assert next(quadtree.iter_points_in_area(Area.from_bounds(0, 0, 2.0 ** -499, 2.0 ** -499))) == Point(2.0 ** -499, 2.0 ** -499)
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from src.kdtree.kdforest import KDForest
+
+
+def level_sizes(forest):
+    return [len(tree) if tree is not None else 0 for tree in forest.levels]
+
+
+def check_invariants(forest, count):
+    sizes = level_sizes(forest)
+    assert all(size <= 2 ** level for level, size in enumerate(sizes))
+    assert len(forest) == sum(sizes) == count
+    ids = np.concatenate([tree.ids for tree in forest.trees()]) if forest.trees() else np.empty(0, dtype=np.int64)
+    assert np.array_equal(np.sort(ids), np.arange(count))
+
+
+def test_single_inserts_fill_levels_like_a_binary_counter():
+    forest = KDForest()
+    for count in range(1, 40):
+        forest.insert_point((count, -count))
+        assert level_sizes(forest) == [(count >> level & 1) << level for level in range(len(forest.levels))]
+        check_invariants(forest, count)
+
+
+def test_batches_merge_the_levels_below_the_first_that_fits():
+    forest = KDForest()
+    forest.insert_points(np.zeros((5, 2)))
+    assert level_sizes(forest) == [0, 0, 0, 5]
+    forest.insert_point((1, 1))
+    assert level_sizes(forest) == [1, 0, 0, 5]
+    forest.insert_points(np.ones((3, 2)))
+    assert level_sizes(forest) == [0, 0, 4, 5]
+    forest.insert_points(np.ones((4, 2)))
+    assert level_sizes(forest) == [0, 0, 0, 0, 13]
+    check_invariants(forest, 13)
+
+
+def brute_force_forest(seed):
+    rng = np.random.default_rng(seed)
+    forest = KDForest()
+    inserted = []
+    # Interleaved single points and batches of different sizes, with many duplicate coordinates
+    for step in range(60):
+        size = 1 if step % 3 else int(rng.integers(0, 40))
+        batch = rng.integers(0, 30, (size, 2)).astype(np.float64)
+        if size == 1:
+            forest.insert_point(batch[0])
+        else:
+            forest.insert_points(batch)
+        inserted.append(batch)
+    return forest, np.concatenate(inserted), rng
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_queries_match_brute_force_after_interleaved_inserts(seed):
+    forest, points, rng = brute_force_forest(seed)
+    check_invariants(forest, len(points))
+    for _ in range(30):
+        corners = rng.integers(-2, 32, (2, 2)).astype(np.float64)
+        low, high = corners.min(axis=0), corners.max(axis=0)
+        expected = np.flatnonzero(np.all((points >= low) & (points <= high), axis=1))
+        count, ids = forest.get_points_in_rectangle(low, high, return_ids=True)
+        assert count == len(expected) and np.array_equal(np.sort(ids), expected)
+        _, coordinates = forest.get_points_in_rectangle(low, high)
+        assert np.array_equal(coordinates[np.lexsort(coordinates.T)], points[expected][np.lexsort(points[expected].T)])
+        assert forest.count_in_rectangle(low, high) == len(expected)
+        center, radius = corners[0], float(rng.uniform(0, 6))
+        distances = np.sqrt(np.sum((points - center) ** 2, axis=1))
+        _, ids = forest.get_points_in_radius(center, radius, return_ids=True)
+        assert np.array_equal(np.sort(ids), np.flatnonzero(distances <= radius))
+        found_distances, found_ids = forest.nearest(center, 7, return_ids=True)
+        assert np.allclose(found_distances, np.sort(distances)[:7])
+        assert np.allclose(distances[found_ids], found_distances)
+
+
+def test_nearest_pads_when_there_are_fewer_points_than_k():
+    forest = KDForest()
+    forest.insert_points(np.array([[0, 0], [3, 4]], dtype=np.float64))
+    forest.insert_point((1, 0))
+    distances, ids = forest.nearest((0, 0), 5, return_ids=True)
+    assert distances.tolist() == [0, 1, 5, np.inf, np.inf]
+    assert ids.tolist() == [0, 2, 1, -1, -1]
+    distances, coordinates = forest.nearest((0, 0), 4)
+    assert coordinates[:3].tolist() == [[0, 0], [1, 0], [3, 4]] and np.isnan(coordinates[3]).all()
+
+
+def test_empty_forest():
+    forest = KDForest()
+    assert forest.get_points_in_rectangle((0, 0), (1, 1))[0] == 0
+    assert forest.get_points_in_rectangle((0, 0), (1, 1))[1].shape == (0, 2)
+    assert forest.count_in_rectangle((0, 0), (1, 1)) == 0
+    assert forest.nearest((0, 0), 2, return_ids=True)[1].tolist() == [-1, -1]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_insert_file_numbers_points_by_row(tmp_path, chunk_size):
+    rows = np.random.default_rng(2).integers(0, 20, (50, 2)).astype(np.float64)
+    path = str(tmp_path / "points.csv")
+    np.savetxt(path, rows, delimiter=",")
+    forest = KDForest()
+    forest.insert_point((100, 100))
+    forest.insert_file(path, chunk_size=chunk_size)
+    check_invariants(forest, 51)
+    low, high = np.array([5.0, 5.0]), np.array([12.0, 15.0])
+    _, ids = forest.get_points_in_rectangle(low, high, return_ids=True)
+    expected = np.flatnonzero(np.all((rows >= low) & (rows <= high), axis=1)) + 1
+    assert np.array_equal(np.sort(ids), expected)
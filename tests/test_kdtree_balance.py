@@ -0,0 +1,74 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.kdtree.kdtree import KDTree
+from src.kdtree.util.geometry import Point
+
+
+def unbalanced_nodes(tree):
+    nodes = []
+    stack = [tree.root] if tree.root is not None else []
+    while stack:
+        node = stack.pop()
+        heavier = max(node.left.size if node.left else 0, node.right.size if node.right else 0)
+        if heavier > tree.balance * node.size:
+            nodes.append(node)
+        stack.extend(child for child in (node.left, node.right) if child is not None)
+    return nodes
+
+
+def height_bound(n, balance):
+    # Every step down keeps at most balance of the points
+    return math.floor(math.log(n) / math.log(1 / balance)) + 1
+
+
+STREAMS = {
+    "sorted": lambda n: [Point(i, i) for i in range(n)],
+    "reversed": lambda n: [Point(-i, i) for i in range(n)],
+    "random": lambda n: [Point(*p) for p in np.random.default_rng(0).random((n, 2)).tolist()],
+    "ties": lambda n: [Point(*p) for p in np.random.default_rng(1).integers(0, 5, (n, 2)).tolist()],
+}
+
+
+@pytest.mark.parametrize("stream", STREAMS)
+@pytest.mark.parametrize("balance", [0.6, 0.75, 0.9])
+def test_invariant_holds_after_every_insert(stream, balance):
+    tree = KDTree(balance=balance)
+    points = STREAMS[stream](300)
+    for count, point in enumerate(points, 1):
+        tree.insert_point(point)
+        assert tree.root.size == count
+        assert not unbalanced_nodes(tree)
+    assert tree.shape()["height"] <= height_bound(len(points), balance)
+    assert tree.get_points_in_rectangle(Point(-np.inf, -np.inf), Point(np.inf, np.inf))[0] == len(points)
+
+
+@pytest.mark.parametrize("stream", ["sorted", "reversed"])
+def test_sorted_stream_stays_logarithmic(stream):
+    n = 20000
+    tree = KDTree(balance=0.75)
+    points = STREAMS[stream](n)
+    for point in points:
+        tree.insert_point(point)
+    assert not unbalanced_nodes(tree)
+    # A plain tree would be a chain of n nodes here
+    assert tree.shape()["height"] <= height_bound(n, 0.75)
+    assert tree.get_points_in_rectangle(Point(100, 0), Point(199, n))[0] == (100 if stream == "sorted" else 0)
+    assert tree.count_in_rectangle(Point(-n, 0), Point(n, n)) == n
+    assert tree.nearest(Point(-n, n), 1)[0][1] == min(points, key=lambda point: (point[0] + n) ** 2 + (point[1] - n) ** 2)
+
+
+def test_plain_mode_degenerates_without_recursion_errors():
+    tree = KDTree()
+    for point in STREAMS["sorted"](5000):
+        tree.insert_point(point)
+    assert tree.shape()["height"] == 5000
+    assert tree.count_in_rectangle(Point(0, 0), Point(4999, 4999)) == 5000
+
+
+def test_balance_has_to_be_between_half_and_one():
+    for balance in (0.5, 1, 0.2):
+        with pytest.raises(ValueError):
+            KDTree(balance=balance)
@@ -0,0 +1,66 @@
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from src.kdtree.kdtree import KDTree
+from src.kdtree.util.geometry import Point
+
+
+def stored(tree):
+    points = []
+    if tree.root is not None:
+        tree._collect_subtree(tree.root, points)
+    return Counter(points)
+
+
+def check_sizes(tree):
+    stack = [tree.root] if tree.root is not None else []
+    while stack:
+        node = stack.pop()
+        assert node.size == 1 + (node.left.size if node.left else 0) + (node.right.size if node.right else 0)
+        stack.extend(child for child in (node.left, node.right) if child is not None)
+
+
+def test_delete_from_degenerate_tree():
+    tree = KDTree()
+    for i in range(3000):
+        tree.insert_point(Point(i, i))
+    assert tree.delete_point(Point(0, 0))
+    assert tree.delete_point(Point(1500, 1500))
+    assert tree.delete_point(Point(2999, 2999))
+    assert not tree.delete_point(Point(0, 0))
+    assert tree.root.size == 2997
+    check_sizes(tree)
+    assert tree.get_points_in_rectangle(Point(1499, 1499), Point(1501, 1501))[0] == 2
+
+
+@pytest.mark.parametrize("method", ["sort", "select"])
+def test_delete_with_ties(method):
+    # Few distinct values, so many points equal the split value of their ancestors
+    rng = np.random.default_rng(1)
+    points = [Point(x, y) for x, y in rng.integers(0, 4, (400, 2)).tolist()]
+    tree = KDTree()
+    tree.build_tree(points, method=method)
+    expected = Counter(points)
+    for point in points[::3] + [Point(7, 7)]:
+        assert tree.delete_point(point) == (expected[point] > 0)
+        expected[point] -= 1
+    assert stored(tree) == +expected
+    check_sizes(tree)
+    low, high = Point(1, 0), Point(2, 3)
+    count, _ = tree.get_points_in_rectangle(low, high)
+    assert count == sum(n for point, n in expected.items() if 1 <= point.x <= 2 and 0 <= point.y <= 3)
+
+
+@pytest.mark.parametrize("fraction", [0.1, 0.5])
+@pytest.mark.parametrize("balance", [None, 0.7])
+def test_delete_points(fraction, balance):
+    rng = np.random.default_rng(2)
+    points = [Point(x, y) for x, y in rng.integers(0, 30, (1000, 2)).tolist()]
+    tree = KDTree(balance=balance)
+    tree.build_tree(points)
+    doomed = points[:int(fraction * len(points))] + [Point(-1, -1)]
+    assert tree.delete_points(doomed) == len(doomed) - 1
+    assert stored(tree) == Counter(points[len(doomed) - 1:])
+    check_sizes(tree)
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from src.quadtree.linear_quadtree import LinearQuadtree
+from src.quadtree.util.Geometry import Area
+
+
+def brute_force(points, bounds):
+    left, bottom, right, top = bounds
+    inside = (points[:, 0] >= left) & (points[:, 0] <= right) & (points[:, 1] >= bottom) & (points[:, 1] <= top)
+    return sorted(map(tuple, points[inside].tolist()))
+
+
+def found(tree, bounds):
+    indices = tree.find_indices_in_area(Area.from_bounds(*bounds))
+    return sorted(zip(tree.xs[indices].tolist(), tree.ys[indices].tolist()))
+
+
+@pytest.mark.parametrize("bits", [1, 3, 16])
+def test_random_areas_match_brute_force(bits):
+    rng = np.random.default_rng(bits)
+    # Integer coordinates put many points on the borders of the areas and of the grid cells
+    points = np.unique(rng.integers(0, 64, (3000, 2)).astype(np.float64), axis=0)
+    tree = LinearQuadtree.from_array(points, bits=bits)
+    for _ in range(300):
+        corners = rng.integers(-5, 70, (2, 2)).astype(np.float64)
+        low, high = corners.min(axis=0), corners.max(axis=0)
+        bounds = (*low.tolist(), *high.tolist())
+        assert found(tree, bounds) == brute_force(points, bounds)
+
+
+def test_cell_borders_and_grid_edges():
+    # With 3 bits the grid over [0, 8] has cells of width 1, the points lie on the cell corners
+    points = np.array([(x, y) for x in range(9) for y in range(9)], dtype=np.float64)
+    tree = LinearQuadtree.from_array(points, bits=3)
+    queries = [
+        (0, 0, 8, 8),          # the whole grid, points on the upper edge are clamped into the last cells
+        (7, 7, 8, 8),          # only the last cells
+        (8, 8, 8, 8),          # the upper corner alone
+        (0, 0, 0, 0),          # the lower corner alone
+        (2, 3, 2, 6),          # a zero width area along a cell border
+        (1.5, 1.5, 2.5, 2.5),  # inside one cell
+        (3, 3, 5, 5),          # area edges on cell borders
+        (2.999, 3.001, 5.001, 4.999),
+        (-10, -10, 100, 100),  # beyond the grid on every side
+        (-np.inf, 4, np.inf, 4),
+        (8, -5, 20, 20),       # touches the grid only on its upper x edge
+        (9, 0, 10, 8),         # right of the grid
+    ]
+    for bounds in queries:
+        assert found(tree, bounds) == brute_force(points, bounds), bounds
+
+
+def test_fractional_cells():
+    # The cell width 1000 / 2**16 is not representable, points close to cell borders are quantised by rounding
+    rng = np.random.default_rng(5)
+    points = rng.random((5000, 2)) * 1000
+    tree = LinearQuadtree.from_array(points)
+    width = 1000 / 2 ** 16
+    for point in points[:200]:
+        for offset in (0, width, -width, 1e-9):
+            # Areas whose edges go exactly through points
+            bounds = (point[0] + offset, point[1] - offset, point[0] + 3 * width, point[1] + 5)
+            assert found(tree, bounds) == brute_force(points, bounds)
+
+
+def test_flat_and_tiny_datasets():
+    # All points on one vertical line, the grid has no width
+    line = np.array([(2.0, y) for y in range(10)])
+    tree = LinearQuadtree.from_array(line, bits=4)
+    for bounds in [(2, 3, 2, 5), (1, -1, 3, 4.5), (2.5, 0, 3, 9)]:
+        assert found(tree, bounds) == brute_force(line, bounds)
+    single = LinearQuadtree.from_array(np.array([[1.0, 1.0]]))
+    assert found(single, (1, 1, 1, 1)) == [(1.0, 1.0)]
+    assert found(single, (0, 0, 0.5, 2)) == []
+    assert len(LinearQuadtree.from_array(np.empty((0, 2))).find_indices_in_area(Area.from_bounds(0, 0, 1, 1))) == 0
+
+
+def test_ids_are_rows_of_the_input():
+    points = np.array([[3, 3], [1, 1], [3, 3], [2, 2], [1, 1]], dtype=np.float64)
+    tree = LinearQuadtree.from_array(points)
+    assert sorted(tree.find_points_in_area(Area.from_bounds(0, 0, 5, 5), return_ids=True).tolist()) == [0, 1, 3]
+    assert tree.find_points_in_area(Area.from_bounds(1.5, 1.5, 2.5, 2.5), return_ids=True).tolist() == [3]
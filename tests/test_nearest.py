@@ -0,0 +1,73 @@
+import math
+
+import numpy as np
+import pytest
+
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Point
+
+
+def distance(a, b):
+    return math.hypot(a.x - b.x, a.y - b.y)
+
+
+def check_neighbours(result, points, query, k):
+    expected = sorted(distance(point, query) for point in points)[:k]
+    assert [found for found, _ in result] == pytest.approx(expected)
+    # Ties at the k-th distance may be broken either way, but every returned point is a distinct stored point at its distance
+    assert len({point for _, point in result}) == len(result)
+    assert all(point in points and found == pytest.approx(distance(point, query)) for found, point in result)
+
+
+@pytest.mark.parametrize("leaf_only", [False, True])
+@pytest.mark.parametrize("max_cardinality", [1, 4])
+def test_nearest_matches_brute_force(leaf_only, max_cardinality):
+    rng = np.random.default_rng(max_cardinality)
+    # A coarse grid gives many points at the same distance from a query
+    points = {Point(x, y) for x, y in rng.integers(0, 20, (300, 2)).tolist()}
+    tree = Quadtree(list(points), max_cardinality=max_cardinality, leaf_only=leaf_only)
+    queries = [Point(x, y) for x, y in (rng.integers(-4, 48, (40, 2)) / 2).tolist()]
+    for k in (1, 4, 9):
+        for query in queries:
+            check_neighbours(tree.nearest(query, k), points, query, k)
+        for query, result in zip(queries, tree.nearest_many(queries, k)):
+            check_neighbours(result, points, query, k)
+
+
+def test_ties_at_the_kth_distance():
+    # The four points around the query are all at distance 1
+    points = [Point(1, 0), Point(0, 1), Point(-1, 0), Point(0, -1), Point(2, 2)]
+    tree = Quadtree(points, max_cardinality=1)
+    result = tree.nearest(Point(0, 0), 2)
+    assert [found for found, _ in result] == [1, 1]
+    assert {point for _, point in result} < set(points[:4])
+    assert [found for found, _ in tree.nearest(Point(0, 0), 5)] == pytest.approx([1, 1, 1, 1, math.sqrt(8)])
+
+
+def test_more_neighbours_than_points():
+    points = [Point(0, 0), Point(3, 4), Point(1, 0)]
+    tree = Quadtree(points)
+    assert tree.nearest(Point(0, 0), 10) == [(0.0, Point(0, 0)), (1.0, Point(1, 0)), (5.0, Point(3, 4))]
+    distances, ids = tree.nearest(Point(0, 0), 5, return_ids=True)
+    assert distances.tolist() == [0, 1, 5, np.inf, np.inf]
+    assert ids.tolist() == [0, 2, 1, -1, -1]
+    assert tree.nearest(Point(0, 0), 0) == []
+    assert Quadtree([]).nearest(Point(0, 0), 3) == []
+    assert Quadtree([]).nearest_many([Point(0, 0)], 3) == [[]]
+
+
+def test_query_outside_of_the_root_area():
+    points = [Point(x, y) for x in range(5) for y in range(5)]
+    tree = Quadtree(points, max_cardinality=2)
+    for query in (Point(-10, 2), Point(100, 100), Point(2, 4.5)):
+        check_neighbours(tree.nearest(query, 3), points, query, 3)
+
+
+def test_deep_tree_has_no_recursion_errors():
+    # Every point halves the distance to the origin, so the tree is a chain about 500 levels deep
+    coordinates = [[2.0 ** -i, 2.0 ** -i] for i in range(500)] + [[0, 0]]
+    tree = Quadtree.from_array(coordinates, max_cardinality=1, max_depth=600)
+    assert tree.shape()["height"] > 490
+    points = [Point(x, y) for x, y in coordinates]
+    check_neighbours(tree.nearest(Point(0, 0), 3), points, Point(0, 0), 3)
+    check_neighbours(tree.nearest(Point(1, 1), 3), points, Point(1, 1), 3)
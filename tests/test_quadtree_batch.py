@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point
+
+
+def random_areas(rng, count, low=-5, high=50, side=15):
+    lows = rng.integers(low, high, (count, 2)).astype(np.float64)
+    return [Area.from_bounds(*corner, *(corner + rng.integers(0, side, 2))) for corner in lows.tolist()]
+
+
+@pytest.mark.parametrize("leaf_only", [False, True])
+@pytest.mark.parametrize("max_cardinality", [1, 8])
+def test_batch_matches_single_queries(leaf_only, max_cardinality):
+    rng = np.random.default_rng(max_cardinality)
+    # Integer coordinates put many points on split lines and on the borders of the areas
+    points = rng.integers(0, 40, (2000, 2)).astype(np.float64)
+    tree = Quadtree.from_array(points, max_cardinality=max_cardinality, leaf_only=leaf_only, max_depth=6)
+    areas = random_areas(rng, 300) + [Area.from_bounds(-100, -100, 100, 100), Area.from_bounds(60, 60, 70, 70)]
+    offsets, ids = tree.find_points_in_areas(areas)
+    _, found = tree.find_points_in_areas(areas, return_ids=False)
+    assert ids.dtype == np.int64 and len(offsets) == len(areas) + 1
+    for query, area in enumerate(areas):
+        expected = tree.find_points_in_area(area)
+        assert sorted(ids[offsets[query]:offsets[query + 1]].tolist()) == sorted(tree.ids[point] for point in expected)
+        assert set(found[offsets[query]:offsets[query + 1]]) == set(expected)
+
+
+def test_batch_follows_mutations():
+    tree = Quadtree([Point(x, y) for x in range(10) for y in range(10)], max_cardinality=2)
+    area = Area.from_bounds(2, 2, 3, 3)
+    offsets, ids = tree.find_points_in_areas([area])
+    assert sorted(ids.tolist()) == [22, 23, 32, 33]
+    tree.insert([Point(2.5, 2.5)])
+    tree.remove(Point(2, 2))
+    offsets, ids = tree.find_points_in_areas([area, area])
+    assert offsets.tolist() == [0, 4, 8]
+    assert sorted(ids[:4].tolist()) == [23, 32, 33, 100]
+
+
+def test_batch_on_empty_tree_and_empty_batch():
+    tree = Quadtree([])
+    offsets, ids = tree.find_points_in_areas([Area.from_bounds(0, 0, 1, 1)])
+    assert offsets.tolist() == [0, 0] and len(ids) == 0
+    tree = Quadtree([Point(0, 0)])
+    offsets, ids = tree.find_points_in_areas([])
+    assert offsets.tolist() == [0] and len(ids) == 0
+
+
+def test_points_outside_of_the_default_area():
+    # The root keeps points outside of its area, a single query reports them only when the area covers the root
+    points = [Point(x, y) for x in range(4) for y in range(4)] + [Point(10, 10)]
+    tree = Quadtree(points, max_cardinality=2, default_area=Area.from_bounds(0, 0, 3, 3))
+    areas = [Area.from_bounds(-1, -1, 4, 4), Area.from_bounds(0, 0, 1, 1), Area.from_bounds(9, 9, 11, 11)]
+    offsets, found = tree.find_points_in_areas(areas, return_ids=False)
+    for query, area in enumerate(areas):
+        assert set(found[offsets[query]:offsets[query + 1]]) == set(tree.find_points_in_area(area))
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from src.quadtree.quadtree import AUTO_CANDIDATES, Quadtree, tune_max_cardinality
+from src.quadtree.util.Geometry import Area, Point
+
+MAX_DEPTH = 6
+# Distinct points closer together than any cell at MAX_DEPTH, without the depth limit they would split about 40 levels deep
+CLUSTER = [Point(0.3 + i * 1e-12, 0.3 + i * 1e-12) for i in range(50)]
+CORNERS = [Point(0, 0), Point(1, 1)]
+UNIT = Area.from_bounds(0, 0, 1, 1)
+
+
+def as_array(points):
+    return np.array([(point.x, point.y) for point in points], dtype=np.float64)
+
+
+def check_cluster_leaf(tree, cluster_size=len(CLUSTER)):
+    shape = tree.shape()
+    assert shape["height"] == MAX_DEPTH + 1
+    # The whole cluster overflows one leaf at the depth limit
+    assert shape["leaf_fill"][cluster_size] == 1
+    assert shape["point_depths"][MAX_DEPTH] == cluster_size
+    assert len(tree.find_points_in_area(Area.from_bounds(0.29, 0.29, 0.31, 0.31))) == cluster_size
+
+
+@pytest.mark.parametrize("leaf_only", [False, True])
+def test_cluster_stops_at_max_depth(tmp_path, leaf_only):
+    points = CORNERS + CLUSTER
+    built = Quadtree(points, max_cardinality=1, default_area=UNIT, leaf_only=leaf_only, max_depth=MAX_DEPTH)
+    inserted = Quadtree(CORNERS, max_cardinality=1, default_area=UNIT, leaf_only=leaf_only, max_depth=MAX_DEPTH)
+    inserted.insert(CLUSTER)
+    from_array = Quadtree.from_array(as_array(points), max_cardinality=1, leaf_only=leaf_only, max_depth=MAX_DEPTH)
+    path = str(tmp_path / "tree.bin")
+    from_array.save(path)
+    loaded = Quadtree.load(path)
+    for tree in (built, inserted, from_array, loaded):
+        check_cluster_leaf(tree)
+    assert loaded.max_depth == MAX_DEPTH
+    assert loaded.shape() == from_array.shape()
+    # The restored depth limit also holds for later inserts
+    loaded.insert([Point(0.3 + 50e-12, 0.3 + 50e-12)])
+    check_cluster_leaf(loaded, len(CLUSTER) + 1)
+
+
+def test_max_depth_zero_keeps_everything_in_the_root(tmp_path):
+    tree = Quadtree.from_array(as_array(CORNERS + CLUSTER), max_cardinality=1, max_depth=0)
+    assert tree.shape()["nodes"] == 1
+    path = str(tmp_path / "tree.bin")
+    tree.save(path)
+    assert Quadtree.load(path).max_depth == 0
+
+
+def test_negative_max_depth_is_rejected():
+    with pytest.raises(ValueError):
+        Quadtree([], max_depth=-1)
+
+
+def clustered_points(seed):
+    rng = np.random.default_rng(seed)
+    centers = rng.random((5, 2))
+    return np.concatenate([center + rng.normal(0, 0.01, (400, 2)) for center in centers])
+
+
+def test_tuning_picks_a_candidate_deterministically():
+    points = clustered_points(0)
+    chosen = tune_max_cardinality(points)
+    assert chosen in AUTO_CANDIDATES
+    assert tune_max_cardinality(points) == chosen
+    assert all(tune_max_cardinality(points, seed=seed) in AUTO_CANDIDATES for seed in range(3))
+    assert tune_max_cardinality(points, candidates=(5, 3)) in (3, 5)
+    assert tune_max_cardinality(points, candidates=(7,)) == 7
+    # An empty dataset gives the smallest candidate
+    assert tune_max_cardinality(np.empty((0, 2)), candidates=(8, 2)) == 2
+
+
+def test_auto_capacity_in_the_constructors(tmp_path):
+    points = clustered_points(1)
+    expected = tune_max_cardinality(points)
+    from_array = Quadtree.from_array(points, max_cardinality="auto")
+    assert from_array.max_cardinality == expected
+    assert Quadtree([Point(x, y) for x, y in points.tolist()], max_cardinality="auto").max_cardinality == expected
+    path = str(tmp_path / "points.csv")
+    np.savetxt(path, points, delimiter=",")
+    # from_file tunes on the first chunk, which is the whole file here
+    assert Quadtree.from_file(path, max_cardinality="auto").max_cardinality == expected
+    saved = str(tmp_path / "tree.bin")
+    from_array.save(saved)
+    assert Quadtree.load(saved).max_cardinality == expected
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point
+
+
+def nodes(tree):
+    # Every node in preorder with its depth, bounds, size, stored points and whether it is split
+    result = []
+    stack = [(tree.root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        bounds = (node.area.bottom_left.x, node.area.bottom_left.y, node.area.upper_right.x, node.area.upper_right.y)
+        result.append((depth, bounds, node.size, frozenset(node.points), node.has_children))
+        if(node.has_children):
+            stack.extend((child, depth + 1) for child in reversed(node.children))
+    return result
+
+
+@pytest.mark.parametrize("default_area", [None, Area.from_bounds(0, 0, 16, 16), Area.from_bounds(2, 2, 10, 10)])
+@pytest.mark.parametrize("leaf_only", [False, True])
+@pytest.mark.parametrize("max_cardinality", [1, 3])
+def test_same_tree_as_the_constructor(default_area, leaf_only, max_cardinality):
+    # Integer coordinates on a 16 x 16 grid give many duplicates and points on every split line,
+    # the smallest default area leaves points outside of the root
+    array = np.random.default_rng(max_cardinality).integers(0, 17, (400, 2)).astype(np.float64)
+    built = Quadtree([Point(x, y) for x, y in array.tolist()], max_cardinality=max_cardinality,
+                     default_area=default_area, leaf_only=leaf_only)
+    bulk = Quadtree.from_array(array, max_cardinality=max_cardinality, default_area=default_area, leaf_only=leaf_only)
+    assert bulk.shape() == built.shape()
+    assert nodes(bulk) == nodes(built)
+    assert bulk.ids == built.ids and bulk.next_id == built.next_id == len(array)
+
+
+def test_split_line_points_go_to_the_first_matching_quadrant():
+    # The root over [0, 2]^2 splits at 1, the points on the lines go to SW, then NW, then SE
+    array = np.array([[1, 1], [0, 1], [1, 0], [1, 2], [2, 1], [2, 2]], dtype=np.float64)
+    built = Quadtree([Point(x, y) for x, y in array.tolist()], max_cardinality=2)
+    bulk = Quadtree.from_array(array, max_cardinality=2)
+    assert nodes(bulk) == nodes(built)
+    south_west, north_west, south_east, north_east = bulk.root.children
+    assert south_west.size == 3 and Point(1, 1) in south_west.all_points()
+    assert set(north_west.all_points()) == {Point(1, 2)}
+    assert set(south_east.all_points()) == {Point(2, 1)}
+    assert set(north_east.all_points()) == {Point(2, 2)}
+
+
+def test_duplicates_keep_the_row_of_their_first_occurrence():
+    array = np.array([[3, 3], [1, 1], [3, 3], [2, 2], [1, 1]], dtype=np.float64)
+    tree = Quadtree.from_array(array)
+    assert tree.root.size == 3
+    assert tree.ids == {Point(3, 3): 0, Point(1, 1): 1, Point(2, 2): 3}
+    assert tree.next_id == 5
+    tree.insert([Point(5, 5)])
+    assert tree.ids[Point(5, 5)] == 5
+
+
+def test_empty_and_single_point_arrays():
+    assert nodes(Quadtree.from_array(np.empty((0, 2)), default_area=Area.from_bounds(0, 0, 1, 1))) == \
+        nodes(Quadtree([], default_area=Area.from_bounds(0, 0, 1, 1)))
+    tree = Quadtree.from_array(np.array([[1.0, 2.0]]))
+    assert tree.find_points_in_area(Area.from_bounds(0, 0, 3, 3)) == [Point(1, 2)]
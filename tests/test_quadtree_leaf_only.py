@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point
+
+
+def walk(tree):
+    stack = [tree.root]
+    while stack:
+        node = stack.pop()
+        yield node
+        if(node.has_children):
+            stack.extend(node.children)
+
+
+def check_leaf_only(tree):
+    for node in walk(tree):
+        if(node.has_children):
+            assert node.points == set()
+            assert node.size == sum(child.size for child in node.children)
+        else:
+            assert node.size == len(node.points)
+    assert tree.root.size == sum(len(node.points) for node in walk(tree))
+
+
+def grid(seed, count=600):
+    # Integer coordinates give duplicates and points on the split lines
+    return np.random.default_rng(seed).integers(0, 32, (count, 2)).astype(np.float64)
+
+
+@pytest.mark.parametrize("max_cardinality", [1, 4])
+def test_internal_nodes_hold_no_points(tmp_path, max_cardinality):
+    array = grid(max_cardinality)
+    points = [Point(x, y) for x, y in array.tolist()]
+    built = Quadtree(points, max_cardinality=max_cardinality, leaf_only=True)
+    bulk = Quadtree.from_array(array, max_cardinality=max_cardinality, leaf_only=True)
+    path = str(tmp_path / "tree.bin")
+    bulk.save(path)
+    loaded = Quadtree.load(path)
+    for tree in (built, bulk, loaded):
+        assert tree.shape()["nodes"] > 1
+        check_leaf_only(tree)
+    rng = np.random.default_rng(7)
+    for point in rng.choice(len(points), 200, replace=False).tolist():
+        built.remove(points[point])
+        check_leaf_only(built)
+    built.insert([Point(x, y) for x, y in (rng.random((100, 2)) * 32).tolist()])
+    check_leaf_only(built)
+    stored = sorted(built.root.all_points(), key=lambda point: (point.x, point.y))
+    for old, new in zip(stored[:50], (rng.random((50, 2)) * 32).tolist()):
+        assert built.move(old, Point(*new))
+        check_leaf_only(built)
+
+
+@pytest.mark.parametrize("max_cardinality", [1, 4])
+def test_queries_agree_between_the_modes(max_cardinality):
+    array = grid(10 + max_cardinality)
+    default = Quadtree.from_array(array, max_cardinality=max_cardinality)
+    leaf_only = Quadtree.from_array(array, max_cardinality=max_cardinality, leaf_only=True)
+    # The splits do not depend on the mode, only where the points are kept
+    assert leaf_only.shape() == default.shape()
+    rng = np.random.default_rng(max_cardinality)
+    for _ in range(100):
+        corners = rng.integers(-2, 34, (2, 2)).astype(np.float64)
+        area = Area.from_bounds(*corners.min(axis=0).tolist(), *corners.max(axis=0).tolist())
+        assert set(leaf_only.find_points_in_area(area)) == set(default.find_points_in_area(area))
+        assert leaf_only.count_in_rectangle(area) == default.count_in_rectangle(area)
+        center = Point(*corners[0].tolist())
+        assert set(leaf_only.find_points_in_radius(center, 4)) == set(default.find_points_in_radius(center, 4))
+        assert [distance for distance, _ in leaf_only.nearest(center, 5)] == [distance for distance, _ in default.nearest(center, 5)]
+
+
+def test_memory_footprint_differs_between_the_modes():
+    array = grid(20, 2000)
+    default = Quadtree.from_array(array, max_cardinality=2)
+    leaf_only = Quadtree.from_array(array, max_cardinality=2, leaf_only=True)
+    distinct = len(np.unique(array, axis=0))
+    default_footprint = default.memory_footprint()
+    leaf_only_footprint = leaf_only.memory_footprint()
+    assert default_footprint["nodes"] == leaf_only_footprint["nodes"]
+    # Every point is referenced once per level of its path by default, but only by its leaf in the leaf-only mode
+    assert leaf_only_footprint["point_references"] == distinct
+    assert default_footprint["point_references"] == sum(count * (depth + 1)
+                                                        for depth, count in default.shape()["point_depths"].items())
+    assert leaf_only_footprint["bytes"] < default_footprint["bytes"]
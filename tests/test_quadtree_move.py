@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point
+
+
+def grid_tree(leaf_only):
+    return Quadtree.from_array(np.array([(x, y) for x in range(5) for y in range(5)], dtype=np.float64),
+                               leaf_only=leaf_only)
+
+
+@pytest.mark.parametrize("leaf_only", [False, True])
+def test_move_outside_of_root_area(leaf_only):
+    tree = grid_tree(leaf_only)
+    assert tree.move(Point(0, 0), Point(10, 10))
+    area = Area(Point(5, 5), Point(20, 20))
+    assert tree.find_points_in_area(area) == [Point(10, 10)]
+    assert tree.count_in_rectangle(area) == 1
+    assert tree.nearest(Point(9, 9), 1)[0][1] == Point(10, 10)
+    assert tree.root.area.contains_point(Point(10, 10))
+    assert tree.root.size == 25
+    # The moved point keeps its row
+    assert tree.find_points_in_area(area, return_ids=True).tolist() == [0]
+    assert tree.find_points_in_area(Area(Point(0, 0), Point(0, 0))) == []
+    assert tree.remove(Point(10, 10))
+    assert tree.count_in_rectangle(Area(Point(-100, -100), Point(100, 100))) == 24
+
+
+@pytest.mark.parametrize("leaf_only", [False, True])
+def test_move_points_in_every_direction(leaf_only):
+    tree = grid_tree(leaf_only)
+    moves = [(Point(0, 0), Point(-7, 2)), (Point(1, 1), Point(3, -9.5)), (Point(2, 2), Point(-30, 40)), (Point(4, 4), Point(4, 4.5))]
+    assert tree.move_points(moves) == 4
+    everything = Area(Point(-100, -100), Point(100, 100))
+    stored = set(tree.find_points_in_area(everything))
+    assert len(stored) == 25
+    assert {new for _, new in moves} <= stored
+    for _, new in moves:
+        assert tree.find_points_in_area(Area(new, new)) == [new]
+        assert tree.nearest(new, 1)[0] == (0.0, new)
+
+
+def test_insert_into_single_point_tree():
+    tree = Quadtree([Point(1, 1)], leaf_only=True)
+    tree.insert([Point(3, 1), Point(1, -2)])
+    assert set(tree.find_points_in_area(Area(Point(-5, -5), Point(5, 5)))) == {Point(1, 1), Point(3, 1), Point(1, -2)}
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from src.common.querycache import QueryCache
+from src.kdtree.kdtree import KDTree
+from src.kdtree.util.geometry import Point as KDPoint
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point
+
+
+def test_hits_misses_and_generations():
+    cache = QueryCache(max_size=4)
+    assert cache.get("a", 0) is None
+    cache.put("a", 0, [1])
+    assert cache.get("a", 0) == [1]
+    assert (cache.hits, cache.misses) == (1, 1)
+    # A result of an older generation is a miss and is dropped
+    assert cache.get("a", 1) is None
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = QueryCache(max_size=2)
+    cache.put("a", 0, 1)
+    cache.put("b", 0, 2)
+    assert cache.get("a", 0) == 1
+    cache.put("c", 0, 3)
+    assert len(cache) == 2
+    assert cache.evictions == 1
+    assert cache.get("b", 0) is None
+    assert cache.get("a", 0) == 1
+    assert cache.get("c", 0) == 3
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.evictions == 1
+
+
+def test_max_size_has_to_be_positive():
+    with pytest.raises(ValueError):
+        QueryCache(max_size=0)
+
+
+def test_kdtree_results_are_copies():
+    tree = KDTree(cache=QueryCache())
+    tree.build_tree([KDPoint(x, y) for x in range(5) for y in range(5)])
+    low, high = KDPoint(1, 1), KDPoint(2, 2)
+    count, points = tree.get_points_in_rectangle(low, high)
+    points.clear()
+    assert tree.get_points_in_rectangle(low, high)[0] == count == 4
+    assert len(tree.get_points_in_rectangle(low, high)[1]) == 4
+    assert tree.cache.hits == 2
+
+
+def test_kdtree_mutations_invalidate_results():
+    tree = KDTree(cache=QueryCache())
+    tree.build_tree([KDPoint(x, y) for x in range(5) for y in range(5)])
+    low, high = KDPoint(1, 1), KDPoint(2, 2)
+    assert tree.get_points_in_rectangle(low, high)[0] == 4
+    tree.insert_point(KDPoint(1.5, 1.5))
+    assert tree.get_points_in_rectangle(low, high)[0] == 5
+    assert tree.delete_point(KDPoint(1, 1))
+    assert tree.get_points_in_rectangle(low, high)[0] == 4
+    # A failed delete does not change the tree, so the result stays cached
+    hits = tree.cache.hits
+    assert not tree.delete_point(KDPoint(9, 9))
+    assert tree.get_points_in_rectangle(low, high)[0] == 4
+    assert tree.cache.hits == hits + 1
+    tree.delete_points([KDPoint(x, y) for x in range(5) for y in range(5)])
+    assert tree.get_points_in_rectangle(low, high)[1] == [KDPoint(1.5, 1.5)]
+
+
+def test_kdtree_ids_and_points_are_cached_separately():
+    tree = KDTree(cache=QueryCache())
+    tree.build_tree([KDPoint(x, 0) for x in range(5)])
+    low, high = KDPoint(1, 0), KDPoint(2, 0)
+    assert sorted(tree.get_points_in_rectangle(low, high, return_ids=True)[1].tolist()) == [1, 2]
+    assert sorted(tree.get_points_in_rectangle(low, high)[1]) == [KDPoint(1, 0), KDPoint(2, 0)]
+
+
+def test_quadtree_mutations_invalidate_results():
+    tree = Quadtree([Point(x, y) for x in range(5) for y in range(5)], cache=QueryCache())
+    area = Area(Point(1, 1), Point(2, 2))
+    assert len(tree.find_points_in_area(area)) == 4
+    result = tree.find_points_in_area(area)
+    result.clear()
+    assert tree.cache.hits == 1
+    tree.insert([Point(1.5, 1.5)])
+    assert len(tree.find_points_in_area(area)) == 5
+    assert tree.remove(Point(1, 1))
+    assert len(tree.find_points_in_area(area)) == 4
+    assert tree.move(Point(2, 2), Point(4, 4))
+    assert set(tree.find_points_in_area(area)) == {Point(1.5, 1.5), Point(1, 2), Point(2, 1)}
+    assert tree.cache.hits == 1
+
+
+def test_quadtree_bulk_constructors_take_a_cache(tmp_path):
+    rows = np.array([(x, y) for x in range(5) for y in range(5)], dtype=np.float64)
+    csv = str(tmp_path / "points.csv")
+    np.savetxt(csv, rows, delimiter=",")
+    saved = str(tmp_path / "tree.bin")
+    Quadtree.from_array(rows).save(saved)
+    area = Area(Point(1, 1), Point(2, 2))
+    for tree in (Quadtree.from_array(rows, cache=QueryCache()), Quadtree.from_file(csv, cache=QueryCache()),
+                 Quadtree.load(saved, cache=QueryCache())):
+        assert sorted(tree.find_points_in_area(area, return_ids=True).tolist()) == [6, 7, 11, 12]
+        assert sorted(tree.find_points_in_area(area, return_ids=True).tolist()) == [6, 7, 11, 12]
+        assert (tree.cache.hits, tree.cache.misses) == (1, 1)
+        tree.insert([Point(1.5, 1.5)])
+        assert sorted(tree.find_points_in_area(area, return_ids=True).tolist()) == [6, 7, 11, 12, 25]
+
+
+def test_kdtree_load_takes_a_cache(tmp_path):
+    path = str(tmp_path / "tree.bin")
+    tree = KDTree()
+    tree.build_tree([KDPoint(x, y) for x in range(5) for y in range(5)])
+    tree.save(path)
+    loaded = KDTree.load(path, cache=QueryCache())
+    low, high = KDPoint(1, 1), KDPoint(2, 2)
+    assert loaded.get_points_in_rectangle(low, high)[0] == loaded.get_points_in_rectangle(low, high)[0] == 4
+    assert (loaded.cache.hits, loaded.cache.misses) == (1, 1)
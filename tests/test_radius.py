@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from src.kdtree.array_kdtree import ArrayKDTree
+from src.kdtree.kdtree import KDTree
+from src.kdtree.util.geometry import Point as KDPoint
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Point
+
+
+def in_radius(points, center, radius):
+    return np.flatnonzero(np.sum((points - center) ** 2, axis=1) <= radius * radius)
+
+
+def radius_queries(rng):
+    # Integer centers and radii 5, 10 and 13 put grid points exactly on the circles, e.g. (3, 4) at distance 5
+    centers = rng.integers(-5, 45, (30, 2)).astype(np.float64)
+    radii = [0.0, 1.0, 5.0, 10.0, 13.0, 2.5, 100.0]
+    return [(center, radius) for center in centers for radius in radii]
+
+
+def grid_points(seed):
+    return np.unique(np.random.default_rng(seed).integers(0, 40, (1500, 2)).astype(np.float64), axis=0)
+
+
+@pytest.mark.parametrize("leaf_only", [False, True])
+@pytest.mark.parametrize("max_cardinality", [1, 8])
+def test_quadtree_matches_brute_force(leaf_only, max_cardinality):
+    points = grid_points(max_cardinality)
+    tree = Quadtree.from_array(points, max_cardinality=max_cardinality, leaf_only=leaf_only)
+    for center, radius in radius_queries(np.random.default_rng(0)):
+        expected = in_radius(points, center, radius)
+        ids = tree.find_points_in_radius(Point(*center.tolist()), radius, return_ids=True)
+        assert sorted(ids.tolist()) == expected.tolist()
+        found = tree.find_points_in_radius(Point(*center.tolist()), radius)
+        assert sorted((point.x, point.y) for point in found) == sorted(map(tuple, points[expected].tolist()))
+
+
+@pytest.mark.parametrize("method", ["sort", "select"])
+def test_kdtree_matches_brute_force(method):
+    points = grid_points(3)
+    tree = KDTree()
+    tree.build_tree([KDPoint(x, y) for x, y in points.tolist()], method=method)
+    for center, radius in radius_queries(np.random.default_rng(1)):
+        expected = in_radius(points, center, radius)
+        count, ids = tree.get_points_in_radius(KDPoint(*center.tolist()), radius, return_ids=True)
+        assert count == len(expected) and sorted(ids.tolist()) == expected.tolist()
+        count, found = tree.get_points_in_radius(KDPoint(*center.tolist()), radius)
+        assert sorted(tuple(point) for point in found) == sorted(map(tuple, points[expected].tolist()))
+
+
+@pytest.mark.parametrize("k", [2, 3])
+def test_array_kdtree_matches_brute_force(k):
+    rng = np.random.default_rng(k)
+    points = rng.integers(0, 40, (3000, k)).astype(np.float64)
+    tree = ArrayKDTree(K=k)
+    tree.build_tree(points)
+    for _ in range(100):
+        center = rng.integers(-5, 45, k).astype(np.float64)
+        radius = float(rng.choice([0, 1, 5, 13, 2.5]))
+        count, ids = tree.get_points_in_radius(center, radius, return_ids=True)
+        expected = in_radius(points, center, radius)
+        assert count == len(expected) and np.array_equal(np.sort(ids), expected)
+        _, found = tree.get_points_in_radius(center, radius)
+        assert np.array_equal(found[np.lexsort(found.T)], points[expected][np.lexsort(points[expected].T)])
+
+
+def test_points_exactly_on_the_circle():
+    circle = [(5, 0), (3, 4), (0, 5), (-4, 3), (-5, 0), (-3, -4), (0, -5), (4, -3)]
+    outside = [(4, 4), (5, 1), (-6, 0)]
+    coordinates = circle + outside
+    quadtree = Quadtree([Point(x, y) for x, y in coordinates], max_cardinality=1)
+    assert set(quadtree.find_points_in_radius(Point(0, 0), 5)) == {Point(x, y) for x, y in circle}
+    kdtree = KDTree()
+    kdtree.build_tree([KDPoint(x, y) for x, y in coordinates])
+    assert kdtree.get_points_in_radius(KDPoint(0, 0), 5)[0] == len(circle)
+    array_tree = ArrayKDTree()
+    array_tree.build_tree(np.array(coordinates, dtype=np.float64))
+    assert sorted(array_tree.get_points_in_radius(np.zeros(2), 5, return_ids=True)[1].tolist()) == list(range(len(circle)))
+
+
+def test_empty_trees():
+    assert Quadtree([]).find_points_in_radius(Point(0, 0), 1) == []
+    assert KDTree().get_points_in_radius(KDPoint(0, 0), 1) == (0, [])
+    tree = ArrayKDTree()
+    tree.build_tree(np.empty((0, 2)))
+    assert tree.get_points_in_radius(np.zeros(2), 1)[0] == 0
+
+
+def test_chain_shaped_kdtree_has_no_recursion_errors():
+    tree = KDTree()
+    # Deeper than the default recursion limit of 1000
+    for i in range(2000):
+        tree.insert_point(KDPoint(i, i))
+    assert tree.shape()["height"] == 2000
+    count, ids = tree.get_points_in_radius(KDPoint(1500, 1500), 10 * 2 ** 0.5, return_ids=True)
+    assert count == 21 and sorted(ids.tolist()) == list(range(1490, 1511))
+    # The whole chain lies inside the circle and is collected without recursion
+    assert tree.get_points_in_radius(KDPoint(1000, 1000), 1e6)[0] == 2000
@@ -0,0 +1,104 @@
+import numpy as np
+
+from src.common.stats import TraversalStats, histogram
+from src.kdtree.kdtree import KDTree
+from src.kdtree.util.geometry import Point as KDPoint
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point
+
+
+def counters(stats):
+    return {name: value for name, value in stats.as_dict().items() if value}
+
+
+def line_kdtree():
+    # x = 3 at the root, then the y splits (all ties) pick 1 and 5, the leaves are 0, 2, 4 and 6
+    tree = KDTree(stats=TraversalStats())
+    tree.build_tree([KDPoint(x, 0) for x in range(7)])
+    return tree
+
+
+def square_quadtree():
+    # The root over [0, 1]^2 is split once, every quadrant holds one corner
+    return Quadtree([Point(0, 0), Point(1, 0), Point(0, 1), Point(1, 1)], stats=TraversalStats())
+
+
+def test_histogram():
+    assert histogram([3, 1, 3, 2, 3]) == {1: 1, 2: 1, 3: 3}
+    assert list(histogram([2, 0, 1])) == [0, 1, 2]
+
+
+def test_kdtree_build_and_insert_counters():
+    tree = line_kdtree()
+    assert counters(tree.stats) == {"builds": 1, "nodes_visited": 7}
+    tree.stats.reset()
+    # The path of (2.5, 0) is 3, 1 and 2
+    tree.insert_point(KDPoint(2.5, 0))
+    assert counters(tree.stats) == {"inserts": 1, "nodes_visited": 3}
+
+
+def test_kdtree_query_counters():
+    tree = line_kdtree()
+    tree.stats.reset()
+    count, points = tree.get_points_in_rectangle(KDPoint(2, 0), KDPoint(4, 0))
+    assert sorted(points) == [KDPoint(2, 0), KDPoint(3, 0), KDPoint(4, 0)]
+    # Leaf 0 lies left and leaf 6 right of the rectangle, so their points are not tested
+    assert counters(tree.stats) == {"queries": 1, "nodes_visited": 7, "points_tested": 5}
+    tree.stats.reset()
+    assert tree.count_in_rectangle(KDPoint(-np.inf, -np.inf), KDPoint(np.inf, np.inf)) == 7
+    assert counters(tree.stats) == {"queries": 1, "nodes_visited": 1, "subtrees_accepted": 1}
+    tree.stats.reset()
+    assert tree.get_points_in_radius(KDPoint(0, 0), 0.5)[1] == [KDPoint(0, 0)]
+    # The right subtree of the root is visited and pruned, its points are not tested
+    assert counters(tree.stats) == {"queries": 1, "nodes_visited": 5, "points_tested": 4}
+    tree.stats.reset()
+    assert tree.nearest(KDPoint(0, 0), 1) == [(0.0, KDPoint(0, 0))]
+    assert counters(tree.stats) == {"queries": 1, "nodes_visited": 4, "points_tested": 4}
+    tree.stats.reset()
+    # The whole tree is smaller than one block, so every rectangle tests its 7 points at once
+    tree.get_points_in_rectangles(np.array([[[0, 0], [1, 0]], [[5, 0], [9, 0]]], dtype=np.float64))
+    assert counters(tree.stats) == {"queries": 2, "nodes_visited": 2, "points_tested": 14}
+
+
+def test_kdtree_shape():
+    assert line_kdtree().shape() == {"height": 3, "nodes": 7, "leaves": 4, "depths": {0: 1, 1: 2, 2: 4},
+                                     "leaf_depths": {2: 4}}
+    assert KDTree().shape() == {"height": 0, "nodes": 0, "leaves": 0, "depths": {}, "leaf_depths": {}}
+
+
+def test_quadtree_build_and_insert_counters():
+    tree = square_quadtree()
+    assert counters(tree.stats) == {"builds": 1, "nodes_visited": 5}
+    tree.stats.reset()
+    tree.insert([Point(0.75, 0.75)])
+    # The path of the point is the root, the NE quadrant and the new child of NE holding it
+    assert counters(tree.stats) == {"inserts": 1, "nodes_visited": 3}
+
+
+def test_quadtree_query_counters():
+    tree = square_quadtree()
+    area = Area.from_bounds(0, 0, 0.5, 1)
+    for query in (tree.find_points_in_area, lambda area: tree.find_points_in_areas([area], return_ids=False)[1]):
+        tree.stats.reset()
+        assert set(query(area)) == {Point(0, 0), Point(0, 1)}
+        # The western quadrants are accepted whole, the eastern ones only touch the area and test their point
+        assert counters(tree.stats) == {"queries": 1, "nodes_visited": 5, "subtrees_accepted": 2, "points_tested": 2}
+    tree.stats.reset()
+    assert tree.count_in_rectangle(area) == 2
+    assert counters(tree.stats) == {"queries": 1, "nodes_visited": 5, "subtrees_accepted": 2, "points_tested": 2}
+    tree.stats.reset()
+    assert tree.find_points_in_radius(Point(0, 0), 0.1) == [Point(0, 0)]
+    assert counters(tree.stats) == {"queries": 1, "nodes_visited": 5, "points_tested": 1}
+    tree.stats.reset()
+    assert tree.nearest(Point(0, 0), 1) == [(0.0, Point(0, 0))]
+    # After the SW quadrant the closest remaining quadrant is farther than the found point
+    assert counters(tree.stats) == {"queries": 1, "nodes_visited": 2, "points_tested": 1}
+
+
+def test_quadtree_shape():
+    tree = Quadtree([Point(0, 0), Point(0.1, 0.1), Point(0.2, 0.1), Point(0.9, 0.9), Point(1, 1)], max_cardinality=2)
+    # SW is split twice more until (0, 0) and (0.1, 0.1) share a leaf and (0.2, 0.1) gets its own
+    assert tree.shape() == {"height": 4, "nodes": 13, "leaves": 10, "leaf_fill": {0: 7, 1: 1, 2: 2},
+                            "depths": {0: 1, 1: 4, 2: 4, 3: 4}, "leaf_depths": {1: 3, 2: 3, 3: 4},
+                            "point_depths": {1: 2, 2: 0, 3: 3}}
+    assert square_quadtree().shape()["leaf_fill"] == {1: 4}
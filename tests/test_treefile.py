@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from src.kdtree.array_kdtree import ArrayKDTree
+from src.kdtree.kdtree import KDTree
+from src.kdtree.util.geometry import Point
+from src.common.treefile import read_tree_file, write_tree_file
+from src.quadtree.linear_quadtree import LinearQuadtree
+from src.quadtree.quadtree import Quadtree
+from src.quadtree.util.Geometry import Area, Point as QuadPoint
+
+LOW, HIGH = (0.2, 0.1), (0.7, 0.5)
+
+
+@pytest.fixture(params=[0, 1, 500])
+def coordinates(request):
+    return np.random.default_rng(request.param).random((request.param, 2))
+
+
+def test_array_kdtree_roundtrip(tmp_path, coordinates):
+    tree = ArrayKDTree()
+    tree.build_tree(coordinates)
+    path = str(tmp_path / "tree")
+    tree.save(path)
+    for mmap in (True, False):
+        loaded = ArrayKDTree.load(path, mmap=mmap)
+        assert len(loaded) == len(tree)
+        for return_ids in (False, True):
+            expected = tree.get_points_in_rectangle(np.array(LOW), np.array(HIGH), return_ids=return_ids)
+            result = loaded.get_points_in_rectangle(np.array(LOW), np.array(HIGH), return_ids=return_ids)
+            assert result[0] == expected[0] and np.array_equal(result[1], expected[1])
+
+
+def test_kdtree_roundtrip(tmp_path, coordinates):
+    tree = KDTree(balance=0.7)
+    tree.build_tree([Point(x, y) for x, y in coordinates.tolist()])
+    path = str(tmp_path / "tree")
+    tree.save(path)
+    loaded = KDTree.load(path)
+    assert loaded.balance == tree.balance and loaded.next_id == tree.next_id
+    expected = tree.get_points_in_rectangle(Point(*LOW), Point(*HIGH), return_ids=True)
+    result = loaded.get_points_in_rectangle(Point(*LOW), Point(*HIGH), return_ids=True)
+    assert result[0] == expected[0] and np.array_equal(result[1], expected[1])
+    loaded.insert_point(Point(0.3, 0.3))
+    assert loaded.get_points_in_rectangle(Point(*LOW), Point(*HIGH))[0] == expected[0] + 1
+
+
+@pytest.mark.parametrize("leaf_only", [False, True])
+def test_quadtree_roundtrip(tmp_path, coordinates, leaf_only):
+    tree = Quadtree.from_array(coordinates, max_cardinality=4, leaf_only=leaf_only)
+    path = str(tmp_path / "tree")
+    tree.save(path)
+    loaded = Quadtree.load(path)
+    assert loaded.shape() == tree.shape()
+    assert loaded.ids == tree.ids and loaded.next_id == tree.next_id
+    area = Area(QuadPoint(*LOW), QuadPoint(*HIGH))
+    assert set(loaded.find_points_in_area(area)) == set(tree.find_points_in_area(area))
+    assert loaded.count_in_rectangle(area) == tree.count_in_rectangle(area)
+
+
+def test_linear_quadtree_roundtrip(tmp_path, coordinates):
+    tree = LinearQuadtree.from_array(coordinates)
+    path = str(tmp_path / "tree")
+    tree.save(path)
+    area = Area(QuadPoint(*LOW), QuadPoint(*HIGH))
+    for mmap in (True, False):
+        loaded = LinearQuadtree.load(path, mmap=mmap)
+        assert len(loaded) == len(tree)
+        assert loaded.find_points_in_area(area) == tree.find_points_in_area(area)
+        assert np.array_equal(loaded.find_points_in_area(area, return_ids=True), tree.find_points_in_area(area, return_ids=True))
+
+
+def test_file_checks(tmp_path):
+    path = str(tmp_path / "tree")
+    write_tree_file(path, "Example", {"values": np.arange(5, dtype=np.int32), "empty": np.empty((0, 2))}, {"answer": 42})
+    kind, arrays, meta = read_tree_file(path)
+    assert kind == "Example" and meta == {"answer": 42}
+    assert np.array_equal(arrays["values"], np.arange(5)) and arrays["empty"].shape == (0, 2)
+    with pytest.raises(ValueError):
+        read_tree_file(path, "Quadtree")
+    with pytest.raises(ValueError):
+        KDTree.load(path)
+    with open(path, "r+b") as f:
+        f.write(b"NOTATREE")
+    with pytest.raises(ValueError):
+        read_tree_file(path)